@@ -1,8 +1,12 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
+import json
 import time
 from ai.ai_checker import check_code, analyze_output, chat_with_ai, review_success
+from compiler.jit import DEFAULT_JIT_PROFILE
 from execution.runner import (
+    benchmark_profiles,
     run_with_compiler,
+    stream_with_compiler,
     get_debug_info,
     start_process,
     read_output,
@@ -26,9 +30,19 @@ def run():
     ai_mode = bool(data.get("ai_mode"))
     ai_precheck = check_code(code) if ai_mode else None
 
+    profile = data.get("profile", DEFAULT_JIT_PROFILE)
+    threshold = data.get("threshold")
+    max_instructions = data.get("max_instructions")
+    timeout = data.get("timeout")
+
     try:
+        if data.get("benchmark"):
+            return jsonify({"benchmark": benchmark_profiles(
+                code, data.get("repeat", 3), max_instructions=max_instructions, timeout=timeout,
+            )})
+
         start_time = time.perf_counter()
-        result = run_with_compiler(code, True)
+        result = run_with_compiler(code, True, profile, threshold, max_instructions, timeout)
         runtime_seconds = time.perf_counter() - start_time
         result["runtime_seconds"] = runtime_seconds
         if ai_precheck is not None:
@@ -55,6 +69,22 @@ def run():
         return jsonify({"error": str(e)})
 
 
+@app.route("/run/stream", methods=["POST"])
+def run_stream():
+
+    data = request.json
+    code = data.get("code", "")
+
+    max_instructions = data.get("max_instructions")
+    timeout = data.get("timeout")
+
+    def generate():
+        for event in stream_with_compiler(code, max_instructions=max_instructions, timeout=timeout):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
 @app.route("/start", methods=["POST"])
 def start():
     data = request.json
@@ -0,0 +1,70 @@
+"""Shared helpers for the VM micro-benchmarks.
+
+Run any benchmark from the project root, e.g.::
+
+    python -m benchmarks.bench_dispatch
+"""
+import time
+
+import compiler.vm as vm_module
+from compiler.lexer import tokenize
+from compiler.parser import Parser
+from compiler.semantic import SemanticAnalyzer
+from compiler.optimizer import Optimizer
+from compiler.bytecode import BytecodeGenerator
+
+
+def compile_source(code):
+    """Run the front end of the pipeline and return the bytecode list."""
+    ast = Parser(tokenize(code)).parse()
+    SemanticAnalyzer().visit(ast)
+    ast = Optimizer().visit(ast)
+    return BytecodeGenerator().generate(ast)
+
+
+def best_of(fn, repeat=5):
+    """Return the fastest wall time of `repeat` calls to fn()."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def count_dispatches(fn, engine=vm_module):
+    """Run fn() with every VM opcode handler counted; return the dispatch total.
+
+    Covers top-level code, function bodies and sub-VMs alike, since they all
+    dispatch through the module-level handler table.  ``engine`` is the
+    module holding that table, e.g. compiler.register_vm.
+    """
+    original = engine._HANDLERS
+    count = [0]
+
+    def counted(handler):
+        def wrapper(*args):
+            count[0] += 1
+            return handler(*args)
+        return wrapper
+
+    engine._HANDLERS = tuple(counted(h) for h in original)
+    try:
+        fn()
+    finally:
+        engine._HANDLERS = original
+    return count[0]
+
+
+def print_table(headers, rows):
+    widths = [
+        max(len(str(h)), *(len(str(r[i])) for r in rows))
+        for i, h in enumerate(headers)
+    ]
+    line = "  ".join(str(h).ljust(w) for h, w in zip(headers, widths))
+    print(line)
+    print("-" * len(line))
+    for row in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)))
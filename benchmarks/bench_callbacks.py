@@ -0,0 +1,105 @@
+"""User code called back from builtins.
+
+Programs whose time goes into user functions called by ``map``,
+``filter``, ``sorted(key=...)`` and ``max(key=...)``, into lambdas, and
+into constructors, which the VM calls the same way.  Each runs with the
+JIT off (the ``interpreter`` profile) two ways: with every callback on a
+sub-VM of its own, as the VM ran them before ``VirtualMachine.call``,
+and on the calling VM's own frame stack.
+
+    python -m benchmarks.bench_callbacks
+"""
+from benchmarks._common import compile_source, best_of, print_table
+from compiler.vm import VirtualMachine
+
+
+PROGRAMS = {
+    "map": """
+def square(v):
+    return v * v
+
+total = 0
+for i in range(200):
+    total += sum(map(square, [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]))
+print(total)
+""",
+    "filter": """
+def odd(v):
+    return v % 2 == 1
+
+values = [n for n in range(2000)]
+count = 0
+for i in range(10):
+    count += len(filter(odd, values))
+print(count)
+""",
+    "sorted key": """
+def distance(v):
+    return abs(v - 500)
+
+values = [(n * 7919) % 1000 for n in range(1000)]
+ordered = values
+for i in range(10):
+    ordered = sorted(values, key=distance)
+print(ordered[0], ordered[-1])
+""",
+    "max key": """
+def weight(v):
+    return (v * 31) % 97
+
+best = 0
+for i in range(100):
+    best += max([n + i for n in range(20)], key=weight)
+print(best)
+""",
+    "lambda": """
+scale = lambda v: v * 3 + 1
+total = 0
+for i in range(2000):
+    total += scale(i)
+print(total)
+""",
+    "constructors": """
+class Point:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+total = 0
+for i in range(2000):
+    p = Point(i, i + 1)
+    total += p.x + p.y
+print(total)
+""",
+}
+
+
+class SubVMCallbacks(VirtualMachine):
+    """Runs every callback on a sub-VM of its own."""
+
+    def _run_frame(self, frame, code):
+        sub = self._spawn(code, frame)
+        sub.run()
+        return sub.stack[-1] if sub.stack else None
+
+
+def main():
+    rows = []
+    for name, code in PROGRAMS.items():
+        instructions = compile_source(code)
+        times = [
+            best_of(lambda: vm_class(list(instructions), jit_profile="interpreter").run(),
+                    repeat=3)
+            for vm_class in (SubVMCallbacks, VirtualMachine)
+        ]
+        rows.append((
+            name,
+            f"{times[0] * 1000:.1f} ms",
+            f"{times[1] * 1000:.1f} ms",
+            f"{times[0] / times[1]:.1f}x",
+        ))
+    print_table(("program", "sub-VM per call", "VirtualMachine.call", "speedup"), rows)
+
+
+if __name__ == "__main__":
+    main()
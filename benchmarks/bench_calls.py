@@ -0,0 +1,105 @@
+"""Call and return overhead of the interpreter.
+
+Recursive programs whose time goes almost entirely into calls: plain
+recursion, recursion with several arguments, deep recursion, keyword
+calls, methods and constructors.  Each runs with the JIT off (the
+``interpreter`` profile), so every call goes through the VM's own call
+sequence.  The table shows the calls made (counted in a separate run with
+``collect_stats``), the best wall time and calls per second.
+
+    python -m benchmarks.bench_calls
+"""
+from benchmarks._common import compile_source, best_of, print_table
+from compiler.vm import VirtualMachine
+
+
+PROGRAMS = {
+    "fib": """
+def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+
+print(fib(24))
+""",
+    "tak": """
+def tak(x, y, z):
+    if y < x:
+        return tak(tak(x - 1, y, z), tak(y - 1, z, x), tak(z - 1, x, y))
+    return z
+
+print(tak(18, 12, 6))
+""",
+    "deep": """
+def depth(n):
+    if n == 0:
+        return 0
+    return depth(n - 1) + 1
+
+total = 0
+for i in range(50):
+    total += depth(2000)
+print(total)
+""",
+    "keywords": """
+def count(n, acc=0):
+    if n == 0:
+        return acc
+    return count(n=n - 1, acc=acc + 1)
+
+total = 0
+for i in range(200):
+    total += count(n=300)
+print(total)
+""",
+    "methods": """
+class Tree:
+    def __init__(self, depth):
+        self.depth = depth
+
+    def size(self, depth):
+        if depth == 0:
+            return 1
+        return 1 + self.size(depth - 1) + self.size(depth - 1)
+
+print(Tree(0).size(15))
+""",
+    "constructors": """
+class Node:
+    def __init__(self, value, next):
+        self.value = value
+        self.next = next
+
+head = None
+for i in range(20000):
+    head = Node(i, head)
+total = 0
+while head is not None:
+    total += head.value
+    head = head.next
+print(total)
+""",
+}
+
+
+def main():
+    rows = []
+    for name, code in PROGRAMS.items():
+        instructions = compile_source(code)
+        counter = VirtualMachine(list(instructions), collect_stats=True, jit_profile="interpreter")
+        counter.run()
+        calls = sum(counter.report()["calls"].values())
+        elapsed = best_of(lambda: VirtualMachine(
+            list(instructions), jit_profile="interpreter",
+        ).run(), repeat=3)
+        rows.append((
+            name,
+            f"{calls:,}",
+            f"{elapsed * 1000:.0f} ms",
+            f"{calls / elapsed / 1e6:.2f} M",
+        ))
+    print_table(("program", "calls", "best time", "calls/sec"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Loading a stored code object against compiling the source again.
+
+For each program from bench_jit, plus ``all`` (every one of them in a
+single source), the table compares what it takes to get the module code
+and every function, method and lambda body ready to run: compiling from
+source (the front end plus ``code_object.assemble``) or loading the
+stored CodeObject, with ``code_object.loads`` or with pickle.  Both load
+columns include rebuilding the decoded instruction lists.
+
+    python -m benchmarks.bench_code_format
+"""
+import pickle
+
+from benchmarks._common import compile_source, best_of, print_table
+from benchmarks.bench_jit import PROGRAMS
+from compiler.code_object import assemble, dumps, loads
+
+
+def compile_all(code):
+    return assemble(compile_source(code))
+
+
+def ready(code_object):
+    return code_object.instructions(), code_object.bodies()
+
+
+def main():
+    programs = dict(PROGRAMS)
+    programs["all"] = "\n".join(PROGRAMS.values())
+    rows = []
+    for name, code in programs.items():
+        code_object = compile_all(code)
+        data = dumps(code_object)
+        pickled = pickle.dumps(code_object, protocol=pickle.HIGHEST_PROTOCOL)
+        compile_t = best_of(lambda: ready(compile_all(code)))
+        load_t = best_of(lambda: ready(loads(data)))
+        pickle_t = best_of(lambda: ready(pickle.loads(pickled)))
+        rows.append((
+            name,
+            f"{len(data):,}",
+            f"{len(pickled):,}",
+            f"{compile_t * 1000:.2f} ms",
+            f"{load_t * 1000:.2f} ms",
+            f"{pickle_t * 1000:.2f} ms",
+        ))
+    print_table(
+        ("program", "bytes", "pickle bytes", "compile", "load", "pickle load"),
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
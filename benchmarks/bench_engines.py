@@ -0,0 +1,104 @@
+"""The stack VM against the register VM on arithmetic-heavy programs.
+
+Every program runs on VirtualMachine with the JIT off (the ``interpreter``
+profile) and on RegisterVM, which executes the three-address IR of the
+same AST.  The table shows executed instructions and best wall time for
+both engines; each time includes building the VM from its input
+(peephole pass and decoding, or lowering the IR to register code).
+
+    python -m benchmarks.bench_engines
+"""
+import compiler.register_vm as register_vm_module
+from benchmarks._common import best_of, count_dispatches, print_table
+from benchmarks.bench_dispatch import PROGRAMS as DISPATCH_PROGRAMS
+from compiler.bytecode import BytecodeGenerator
+from compiler.lexer import tokenize
+from compiler.optimizer import Optimizer
+from compiler.parser import Parser
+from compiler.register_vm import RegisterVM, generate_ir
+from compiler.semantic import SemanticAnalyzer
+from compiler.vm import VirtualMachine
+
+
+PROGRAMS = dict(DISPATCH_PROGRAMS)
+PROGRAMS["primes"] = """
+count = 0
+n = 2
+while n < 6000:
+    d = 2
+    prime = True
+    while d * d <= n:
+        if n % d == 0:
+            prime = False
+            break
+        d += 1
+    if prime:
+        count += 1
+    n += 1
+print(count)
+"""
+PROGRAMS["collatz"] = """
+def steps(n):
+    count = 0
+    while n != 1:
+        if n % 2 == 0:
+            n = n // 2
+        else:
+            n = 3 * n + 1
+        count += 1
+    return count
+
+longest = 0
+for start in range(1, 3000):
+    s = steps(start)
+    if s > longest:
+        longest = s
+print(longest)
+"""
+PROGRAMS["fib"] = """
+def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+
+print(fib(20))
+"""
+
+
+def main():
+    rows = []
+    for name, code in PROGRAMS.items():
+        ast = Parser(tokenize(code)).parse()
+        SemanticAnalyzer().visit(ast)
+        ast = Optimizer().visit(ast)
+        instructions = BytecodeGenerator().generate(ast)
+        ir = generate_ir(ast.statements)
+
+        def stack():
+            return VirtualMachine(list(instructions), jit_profile="interpreter").run()
+
+        def register():
+            return RegisterVM(ir).run()
+
+        if stack() != register():
+            raise AssertionError(f"{name}: the engines printed different output")
+        stack_n = count_dispatches(stack)
+        register_n = count_dispatches(register, register_vm_module)
+        stack_t = best_of(stack, repeat=3)
+        register_t = best_of(register, repeat=3)
+        rows.append((
+            name,
+            f"{stack_n:,}",
+            f"{register_n:,}",
+            f"{stack_t * 1000:.0f} ms",
+            f"{register_t * 1000:.0f} ms",
+            f"{stack_t / register_t:.1f}x",
+        ))
+    print_table(
+        ("program", "stack instrs", "register instrs", "stack time", "register time", "speedup"),
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
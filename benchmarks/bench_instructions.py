@@ -0,0 +1,147 @@
+"""Memory held by the instruction stream of a large program.
+
+Generates a program of 10,000 lines (functions with loops and calls, and
+module-level code using them), compiles it with every function body,
+and rebuilds the whole instruction stream three ways: ``__dict__``
+instructions that each own their operands (the layout Instruction had
+before), ``__slots__`` Instructions that still own their operands, and
+Instructions as the compiler builds them now, with interned operands.
+Each row shows traced bytes per instruction and the build time.  A
+second table shows the memory kept by compiling the program, from
+source text to instructions, with the current layout.
+
+    python -m benchmarks.bench_instructions
+"""
+import gc
+import time
+import tracemalloc
+
+from benchmarks._common import compile_source, print_table
+from compiler.bytecode import Instruction
+from compiler.code_object import assemble
+
+
+N_LINES = 10_000
+
+CHUNK = """
+def step{i}(values, scale):
+    total = 0
+    for k in range(len(values)):
+        if values[k] % 3 == 0:
+            total += values[k] * scale
+        else:
+            total -= 1
+    return total + len(str(scale))
+data{i} = [n * {i} for n in range(8)]
+result = step{i}(data{i}, {i} + 1000)
+count = count + 1
+print("step", {i}, result, count)
+"""
+
+
+def make_program(lines=N_LINES):
+    chunk_lines = CHUNK.count("\n")
+    return "count = 0\n" + "".join(CHUNK.format(i=i) for i in range(lines // chunk_lines))
+
+
+class DictInstruction:
+    handler = None
+    cache = None
+    loop = None
+
+    def __init__(self, opcode, argument=None):
+        self.opcode = opcode
+        self.argument = argument
+
+
+def own_operand(value):
+    """A copy of ``value`` sharing nothing, as the lexer hands out a new
+    string for every occurrence of a name."""
+    if type(value) is str:
+        return value.encode().decode()
+    if type(value) is int:
+        return int(str(value))
+    if type(value) is tuple:
+        return tuple(own_operand(item) for item in value)
+    return value
+
+
+def dict_layout(instr):
+    # Attributes are set in the order the peephole pass and decode() set
+    # them, loop only on loop jumps.
+    copy = DictInstruction(instr.opcode, own_operand(instr.argument))
+    copy.handler = instr.handler
+    if instr.loop is not None:
+        copy.loop = instr.loop
+    copy.opnum = instr.opnum
+    return copy
+
+
+def slots_layout(instr):
+    copy = Instruction(instr.opcode)
+    copy.argument = own_operand(instr.argument)
+    copy.opnum = instr.opnum
+    return copy
+
+
+def interned_layout(instr):
+    copy = Instruction(instr.opcode, own_operand(instr.argument))
+    copy.opnum = instr.opnum
+    return copy
+
+
+def measure(build, stream):
+    """(bytes per instruction, seconds) to build and hold a copy of ``stream``."""
+    holder = [None] * len(stream)
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for i, instr in enumerate(stream):
+        holder[i] = build(instr)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / len(stream), elapsed
+
+
+def compiled_stream(source):
+    code = assemble(compile_source(source))
+    stream = code.instructions()
+    for body in code.bodies().values():
+        stream.extend(body)
+    return stream
+
+
+def main():
+    source = make_program()
+    stream = compiled_stream(source)
+    rows = []
+    for name, build in (
+        ("__dict__, own operands", dict_layout),
+        ("__slots__, own operands", slots_layout),
+        ("__slots__, interned operands", interned_layout),
+    ):
+        per_instr, seconds = measure(build, stream)
+        rows.append((name, f"{len(stream):,}", f"{per_instr:.0f} B", f"{seconds * 1000:.0f} ms"))
+    print_table(("layout", "instructions", "bytes/instr", "build time"), rows)
+    print()
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    stream = compiled_stream(source)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print_table(
+        ("program", "lines", "instructions", "kept", "kept/instr", "peak", "compile time"),
+        [("generated", f"{source.count(chr(10)):,}", f"{len(stream):,}",
+          f"{current / 1e6:.1f} MB", f"{current / len(stream):.0f} B",
+          f"{peak / 1e6:.1f} MB", f"{elapsed:.2f} s")],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Interpreter against the tiered JIT.
+
+Every program runs with the JIT disabled (``threshold = inf``) and with
+the default threshold, compiling synchronously and on the background
+worker.  A background compile leaves the code interpreted until the worker
+is done, which costs more than it saves in programs this short; the
+"compile" column is the translation time the synchronous run spent at the
+calls that crossed the threshold.  The remaining columns, from the
+synchronous run, show which tier each hot function ended in and how many
+guard failures (bailouts) it took; the
+``polymorphic`` program changes argument types half-way to force a
+deoptimization, ``classes`` spends its time in constructors, methods,
+keyword calls and lambdas, ``call_graph`` has a caller that gets hot
+before its callee, and ``top_level`` is a single module-level loop that
+only on-stack replacement can compile.
+
+    python -m benchmarks.bench_jit
+"""
+from benchmarks._common import compile_source, best_of, print_table
+from compiler.vm import VirtualMachine
+
+
+PROGRAMS = {
+    "fib": """
+def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+
+print(fib(22))
+""",
+    "int_loop": """
+def total(n):
+    t = 0
+    for i in range(n):
+        if i % 3 == 0:
+            t += i
+    return t
+
+k = 0
+s = 0
+while k < 200:
+    s += total(2000)
+    k += 1
+print(s)
+""",
+    "strings": """
+def label(name, n):
+    return name.upper() + ":" + str(n)
+
+k = 0
+while k < 20000:
+    label("item", k)
+    k += 1
+print(label("done", k))
+""",
+    "polymorphic": """
+def add(a, b):
+    return a + b
+
+k = 0
+while k < 20000:
+    add(k, 1)
+    add(k, 0.5)
+    k += 1
+print(add(1, 2))
+""",
+    "classes": """
+class Point:
+    def __init__(self, x, y=0):
+        self.x = x
+        self.y = y
+
+    def moved(self, dx, dy=0):
+        return Point(self.x + dx, y=self.y + dy)
+
+    def norm1(self):
+        return abs(self.x) + abs(self.y)
+
+step = lambda k: k % 7 - 3
+p = Point(0)
+total = 0
+k = 0
+while k < 20000:
+    p = p.moved(step(k), dy=1)
+    total += p.norm1()
+    k += 1
+print(total)
+""",
+    "call_graph": """
+def leaf(n):
+    return n % 7 + 1
+
+def step(n):
+    if n % 50 == 0:
+        return leaf(n)
+    return n % 3
+
+def walk(n):
+    t = 0
+    for i in range(n):
+        t += step(i)
+    return t
+
+k = 0
+s = 0
+while k < 200:
+    s += walk(1000)
+    k += 1
+print(s)
+""",
+    "top_level": """
+total = 0
+evens = 0
+i = 0
+while i < 300000:
+    if i % 2 == 0:
+        evens += 1
+    total = total + i * 3 % 11
+    i += 1
+print(total, evens)
+""",
+}
+
+
+def run(instructions, threshold, background=False):
+    vm = VirtualMachine(list(instructions))
+    vm.jit.threshold = threshold
+    vm.jit.background = background
+    if threshold == float("inf"):
+        vm.jit.osr_threshold = threshold
+    vm.run()
+    return vm
+
+
+def main():
+    rows = []
+    for name, code in PROGRAMS.items():
+        instructions = compile_source(code)
+        interp = best_of(lambda: run(instructions, float("inf")), repeat=3)
+        jitted = best_of(lambda: run(instructions, 10), repeat=3)
+        threaded = best_of(lambda: run(instructions, 10, background=True), repeat=3)
+        stats = run(instructions, 10).jit.stats
+        tiers = ", ".join(
+            [f"{f}:{t}" for f, t in stats["tiers"].items()] + [f"{f}:osr" for f in stats["osr"]]
+        ) or "-"
+        bailouts = sum(stats["bailouts"].values())
+        rows.append((
+            name,
+            f"{interp * 1000:.0f} ms",
+            f"{jitted * 1000:.0f} ms",
+            f"{interp / jitted:.1f}x",
+            f"{threaded * 1000:.0f} ms",
+            f"{sum(stats['compile_seconds'].values()) * 1000:.1f} ms",
+            tiers,
+            bailouts,
+            len(stats["deoptimized"]),
+        ))
+    print_table(
+        ("program", "interpreter", "jit", "speedup", "background", "compile",
+         "tiers", "bailouts", "deopts"),
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Effect of the bytecode peephole pass on dispatch count and run time.
+
+Every program runs twice, with ``VirtualMachine(peephole=False)`` and with
+the default ``peephole=True``; the table shows executed instructions and
+best wall time for both.
+
+    python -m benchmarks.bench_peephole
+"""
+from benchmarks._common import compile_source, best_of, count_dispatches, print_table
+from benchmarks.bench_dispatch import PROGRAMS as DISPATCH_PROGRAMS
+from compiler.vm import VirtualMachine
+
+
+PROGRAMS = dict(DISPATCH_PROGRAMS)
+PROGRAMS["function_loop"] = """
+def count_multiples(n, k):
+    hits = 0
+    i = 0
+    while i < n:
+        if i % k == 0:
+            hits += 1
+        i += 1
+    return hits
+
+print(count_multiples(200000, 7))
+"""
+
+
+def main():
+    rows = []
+    for name, code in PROGRAMS.items():
+        instructions = compile_source(code)
+        results = []
+        for peephole in (False, True):
+            def run():
+                vm = VirtualMachine(list(instructions), peephole=peephole)
+                vm.jit.threshold = float("inf")
+                vm.jit.osr_threshold = float("inf")
+                vm.run()
+            results.append((count_dispatches(run), best_of(run, repeat=3)))
+        (base_n, base_t), (opt_n, opt_t) = results
+        rows.append((
+            name,
+            f"{base_n:,}",
+            f"{opt_n:,}",
+            f"{100 * (base_n - opt_n) / base_n:.0f}%",
+            f"{base_t * 1000:.0f} ms",
+            f"{opt_t * 1000:.0f} ms",
+        ))
+    print_table(
+        ("program", "dispatches off", "dispatches on", "saved", "time off", "time on"),
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Execution profiles compared, for choosing the default JIT policy.
+
+Each program from bench_jit runs under every profile of
+``execution.runner.BENCHMARK_PROFILES``: the interpreter alone, the tiered
+JIT at several thresholds and eager compilation.  The table shows the best
+wall time per profile and its speedup over the interpreter; the last row
+is the geometric mean of the speedups.
+
+    python -m benchmarks.bench_profiles
+"""
+import math
+
+from benchmarks._common import compile_source, best_of, print_table
+from benchmarks.bench_jit import PROGRAMS
+from compiler.vm import VirtualMachine
+from execution.runner import BENCHMARK_PROFILES
+
+
+def label(profile, threshold):
+    return profile if threshold is None else f"{profile}:{threshold}"
+
+
+def main():
+    rows = []
+    speedups = [[] for _ in BENCHMARK_PROFILES]
+    for name, code in PROGRAMS.items():
+        instructions = compile_source(code)
+        times = [
+            best_of(lambda: VirtualMachine(
+                list(instructions), jit_profile=profile, jit_threshold=threshold,
+            ).run(), repeat=3)
+            for profile, threshold in BENCHMARK_PROFILES
+        ]
+        row = [name]
+        for i, elapsed in enumerate(times):
+            speedups[i].append(times[0] / elapsed)
+            row.append(f"{elapsed * 1000:.0f} ms ({times[0] / elapsed:.1f}x)")
+        rows.append(row)
+    rows.append(["geomean"] + [
+        f"{math.exp(sum(map(math.log, s)) / len(s)):.1f}x" for s in speedups
+    ])
+    print_table(["program"] + [label(*p) for p in BENCHMARK_PROFILES], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -106,6 +106,15 @@ class FunctionDef(ASTNode):
         self.kwarg = kwarg              
         self.kwonly_params = kwonly_params or []  
         self.annotations = annotations or {}     
+        # Filled in by SemanticAnalyzer: local name -> frame slot index, or
+        # None when the body must keep name-based (dict) variable access.
+        self.local_slots = None
+        # The names of local_slots in slot order, grown with it.
+        self.slot_names = []
+        self.global_names = set()
+        # Set by SemanticAnalyzer when the body contains ``yield``; calling
+        # the function then returns a generator instead of running it.
+        self.is_generator = False
 
 
 class Return(ASTNode):
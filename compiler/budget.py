@@ -0,0 +1,68 @@
+import time
+
+
+class BudgetExceeded(BaseException):
+    """Raised at a checkpoint once a run has used up its ExecutionBudget."""
+
+    def __init__(self, kind, limit, instructions, seconds):
+        what = f"instruction limit of {limit}" if kind == "instructions" else f"time limit of {limit}s"
+        super().__init__(f"Execution stopped: {what} exceeded")
+        self.kind         = kind
+        self.limit        = limit
+        self.instructions = instructions
+        self.seconds      = seconds
+
+    def as_dict(self):
+        return {
+            "kind":         self.kind,
+            "limit":        self.limit,
+            "instructions": self.instructions,
+            "seconds":      self.seconds,
+        }
+
+
+class ExecutionBudget:
+    """Instruction and wall-clock limits for one run of a VirtualMachine.
+
+    Nothing is counted per instruction.  The VM charges the budget at its
+    checkpoints instead: every backward jump is charged the length of the
+    code it jumps back over, every interpreted call the length of the
+    callee's bytecode.  JIT-compiled code charges the size of a function's
+    or loop body's AST on entry and for every iteration, in batches of
+    about JIT_TICK_BATCH when the body cannot call out.  ``used`` is thus
+    an estimate erring on the high side, not an exact count of the
+    instructions executed.
+
+    The clock runs from the first ``start()`` and is read at every
+    checkpoint, so a loop with a slow body stops within one iteration of
+    the deadline.  Either limit may be None for no limit.
+    """
+
+    def __init__(self, max_instructions=None, seconds=None):
+        self.max_instructions = max_instructions
+        self.seconds  = seconds
+        self.used     = 0
+        self._limit   = float("inf") if max_instructions is None else max_instructions
+        self._deadline = float("inf")
+        self._started = None
+
+    def start(self):
+        """Start the clock; later calls leave it running."""
+        if self._started is None:
+            self._started = time.monotonic()
+            if self.seconds is not None:
+                self._deadline = self._started + self.seconds
+
+    def elapsed(self):
+        return 0.0 if self._started is None else time.monotonic() - self._started
+
+    def charge(self, instructions):
+        """Count ``instructions``; raises BudgetExceeded once a limit is passed."""
+        self.used += instructions
+        if self.used > self._limit:
+            raise self._exceeded("instructions", self.max_instructions)
+        if time.monotonic() > self._deadline:
+            raise self._exceeded("time", self.seconds)
+
+    def _exceeded(self, kind, limit):
+        return BudgetExceeded(kind, limit, self.used, self.elapsed())
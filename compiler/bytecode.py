@@ -1,21 +1,151 @@
+import sys
+
 from compiler.ast_nodes import *
 
 
+# Every opcode the VM understands.  The position in this tuple is the
+# opcode's integer id; VirtualMachine indexes its handler table with it.
+OPCODES = (
+    "NOP",
+    "LOAD_CONST", "LOAD_VAR", "STORE_VAR",
+    "LOAD_FAST", "STORE_FAST", "LOAD_GLOBAL", "STORE_GLOBAL",
+    "BUILD_LIST", "BUILD_TUPLE", "UNPACK_SEQUENCE", "LIST_APPEND",
+    "LOAD_INDEX", "STORE_INDEX", "POP_TOP", "PRINT",
+    "ADD", "SUB", "MUL", "DIV", "MOD", "FLOORDIV", "POW",
+    "UNARY_NEG", "UNARY_NOT", "COMPARE",
+    "JUMP_IF_FALSE", "JUMP_IF_TRUE", "JUMP",
+    "JUMP_IF_FALSE_OR_POP", "JUMP_IF_TRUE_OR_POP",
+    "DEFINE_FUNCTION", "CALL_FUNCTION", "RETURN_VALUE",
+    "DEFINE_CLASS", "LOAD_ATTR", "STORE_ATTR",
+    "CALL_METHOD", "CALL_METHOD_KW", "CALL_SUPER_METHOD",
+    "DUP_TOP",
+    "BITWISE_AND", "BITWISE_OR", "BITWISE_XOR",
+    "BITWISE_LSHIFT", "BITWISE_RSHIFT", "UNARY_BITNOT",
+    "BUILD_DICT", "DICT_SPREAD", "DICT_SET_ITEM", "BUILD_SET", "SET_ADD",
+    "BUILD_SLICE", "UNPACK_STARRED",
+    "IMPORT_MODULE", "IMPORT_FROM", "DECLARE_GLOBAL", "DECLARE_NONLOCAL",
+    "DELETE_VAR", "RAISE_EXCEPTION", "RAISE_ASSERTION",
+    "MATCH_EXCEPTION", "EXEC_WITH", "GET_ITER", "FOR_ITER", "YIELD_VALUE", "MAKE_LAMBDA",
+    "APPLY_DECORATOR", "CALL_FUNCTION_KW", "MAKE_GENERATOR",
+    # Superinstructions produced by compiler.peephole.
+    "INC_VAR", "INC_FAST", "COMPARE_JUMP",
+)
+
+OPCODE_IDS = {name: i for i, name in enumerate(OPCODES)}
+
+
+# Operands shared between instructions.  Strings go through sys.intern;
+# ints and tuples of strings and ints (call signatures, INC_VAR and
+# COMPARE_JUMP arguments) through this table, so the many instructions
+# naming ("print", 1) hold one tuple.  It is emptied when it reaches
+# OPERAND_TABLE_MAX entries rather than grow with every program run.
+_OPERANDS = {}
+OPERAND_TABLE_MAX = 1 << 16
+
+
+def intern_operand(argument):
+    """The shared copy of ``argument``, or ``argument`` itself."""
+    t = type(argument)
+    if t is str:
+        return sys.intern(argument)
+    if t is tuple:
+        for item in argument:
+            if type(item) is not str and type(item) is not int:
+                return argument
+        argument = tuple([sys.intern(item) if type(item) is str else item for item in argument])
+    elif t is not int or -5 <= argument <= 256:
+        # Small ints are shared by Python already.
+        return argument
+    # Only exact str and int values get here, so equal means identical
+    # in type as well: 1 never stands in for True or 1.0.
+    shared = _OPERANDS.get(argument)
+    if shared is None:
+        if len(_OPERANDS) >= OPERAND_TABLE_MAX:
+            _OPERANDS.clear()
+        shared = _OPERANDS[argument] = argument
+    return shared
+
+
 class Instruction:
+    # A program and every body compiled at run time allocate one of these
+    # per instruction, so they have slots rather than a __dict__.
+    __slots__ = ("opcode", "argument", "opnum", "handler", "cache", "loop")
+
     def __init__(self, opcode, argument=None):
         self.opcode = opcode
-        self.argument = argument
+        self.argument = intern_operand(argument)
+        # (handler index, stack depth) of the exception handler covering
+        # this instruction, or None.
+        # Filled in by BytecodeGenerator for code inside a try statement;
+        # the VM only reads it while unwinding.
+        self.handler = None
+        # Inline cache for the call opcodes that resolve methods on user
+        # classes, and the back-edge counter of loop JUMPs; owned and
+        # validated by the VM.
+        self.cache = None
+        # The WhileLoop / ForInLoop node whose backward JUMP this is; the
+        # VM counts these back-edges for on-stack replacement.
+        self.loop = None
+        # ``opnum`` is set by decode().
+
+    def __getstate__(self):
+        # Inline caches hold runtime objects (shapes, compiled code) and
+        # are rebuilt on first use; everything else is the program itself.
+        # Unset and None slots are left out; __setstate__ restores them.
+        state = {}
+        for name in self.__slots__:
+            value = getattr(self, name, None)
+            if value is not None and name != "cache":
+                state[name] = value
+        return state
+
+    def __setstate__(self, state):
+        self.argument = self.handler = self.cache = self.loop = None
+        for name, value in state.items():
+            setattr(self, name, value)
 
     def __repr__(self):
         return f"{self.opcode}({self.argument!r})"
 
 
+def decode(instructions):
+    """Stamp each instruction with its integer opcode id (``opnum``).
+
+    Unknown opcodes decode to NOP, matching the VM's historic behaviour of
+    skipping instructions it does not recognise.
+    """
+    nop = OPCODE_IDS["NOP"]
+    for instr in instructions:
+        instr.opnum = OPCODE_IDS.get(instr.opcode, nop)
+    return instructions
+
+
 class BytecodeGenerator:
-    def __init__(self):
+    def __init__(self, local_slots=None, global_names=(), slot_names=None):
         self.instructions = []
         self.break_targets = []     
         self.continue_targets = []  
         self._counter = 0           
+        # When compiling a function body with slot-assigned locals
+        # (see semantic.assign_local_slots), names are accessed through
+        # LOAD_FAST/STORE_FAST and LOAD_GLOBAL/STORE_GLOBAL instead of
+        # the name-based LOAD_VAR/STORE_VAR.  ``slot_names`` lists the
+        # names of ``local_slots`` in slot order and grows with it.
+        self.local_slots  = local_slots
+        self.global_names = global_names
+        self.slot_names   = slot_names
+        # (start, end, handler, depth) ranges, innermost try first.
+        self.exception_table = []
+        # finally bodies of the enclosing try statements, each paired with
+        # the loop depth it was entered at, so break/continue/return can
+        # run them before leaving the protected block.
+        self._finally_stack = []
+        # Hidden variables holding the exception being handled, so a bare
+        # ``raise`` inside an except block re-raises it.
+        self._exc_vars = []
+        # Number of for-loop iterators currently on the operand stack.
+        # Exception handlers record it so unwinding keeps them.
+        self._iter_depth = 0
 
 
     def generate(self, node):
@@ -32,6 +162,27 @@ class BytecodeGenerator:
         self._counter += 1
         return self._counter
 
+    def _emit_load(self, name):
+        if self.local_slots is None:
+            self.instructions.append(Instruction("LOAD_VAR", name))
+        elif name in self.local_slots:
+            self.instructions.append(Instruction("LOAD_FAST", self.local_slots[name]))
+        else:
+            self.instructions.append(Instruction("LOAD_GLOBAL", name))
+
+    def _emit_store(self, name):
+        if self.local_slots is None:
+            self.instructions.append(Instruction("STORE_VAR", name))
+        elif name in self.global_names:
+            self.instructions.append(Instruction("STORE_GLOBAL", name))
+        else:
+            # Compiler temporaries (__iter_1__ etc.) get a slot on first store.
+            slot = self.local_slots.get(name)
+            if slot is None:
+                slot = self.local_slots[name] = len(self.local_slots)
+                self.slot_names.append(name)
+            self.instructions.append(Instruction("STORE_FAST", slot))
+
     def visit_Program(self, node):
         for stmt in node.statements:
             self.generate(stmt)
@@ -53,14 +204,14 @@ class BytecodeGenerator:
         self.instructions.append(Instruction("LOAD_CONST", None))
 
     def visit_Variable(self, node):
-        self.instructions.append(Instruction("LOAD_VAR", node.name))
+        self._emit_load(node.name)
 
     def visit_Assignment(self, node):
         self.generate(node.value)
-        self.instructions.append(Instruction("STORE_VAR", node.name))
+        self._emit_store(node.name)
 
     def visit_AttributeAssignment(self, node):
-        self.instructions.append(Instruction("LOAD_VAR", node.obj))
+        self._emit_load(node.obj)
         self.generate(node.value)
         self.instructions.append(Instruction("STORE_ATTR", node.attr))
 
@@ -86,12 +237,14 @@ class BytecodeGenerator:
             self.instructions.append(Instruction("UNARY_NOT"))
 
     def visit_BoolOp(self, node):
+        # The right operand only runs when the left one does not decide
+        # the result, which stays on the stack as the expression's value.
         self.generate(node.left)
+        jump = len(self.instructions)
+        opcode = "JUMP_IF_FALSE_OR_POP" if node.operator == "and" else "JUMP_IF_TRUE_OR_POP"
+        self.instructions.append(Instruction(opcode, None))
         self.generate(node.right)
-        if node.operator == "and":
-            self.instructions.append(Instruction("BINARY_AND"))
-        else:
-            self.instructions.append(Instruction("BINARY_OR"))
+        self.instructions[jump].argument = len(self.instructions)
 
     def visit_Compare(self, node):
         self.generate(node.left)
@@ -141,7 +294,7 @@ class BytecodeGenerator:
         for idx in self.continue_targets.pop():
             self.instructions[idx].argument = continue_target
 
-        self.instructions.append(Instruction("JUMP", loop_start))
+        self._emit_back_edge(loop_start, node)
         self.instructions[jump_false].argument = len(self.instructions)
 
         for idx in self.break_targets.pop():
@@ -150,24 +303,52 @@ class BytecodeGenerator:
     def visit_Pass(self, node):
         pass  
 
+    def _protect(self, start, end, handler):
+        """Route exceptions raised in instructions[start:end] to ``handler``.
+
+        Each covered instruction gets ``(handler, depth)``, where depth is
+        the number of loop iterators the handler expects to find on the
+        stack.  Instructions already claimed by an inner try statement keep
+        their own handler.
+        """
+        entry = (handler, self._iter_depth)
+        self.exception_table.append((start, end) + entry)
+        for instr in self.instructions[start:end]:
+            if instr.handler is None:
+                instr.handler = entry
+
+    def _emit_pending_finally(self, loop_depth):
+        """Inline the finally bodies of try statements entered at or inside
+        loop depth ``loop_depth``, innermost first."""
+        saved = self._finally_stack
+        i = len(saved)
+        while i and saved[i - 1][1] >= loop_depth:
+            i -= 1
+            self._finally_stack = saved[:i]
+            for stmt in saved[i][0]:
+                self.generate(stmt)
+        self._finally_stack = saved
+
     def visit_Break(self, node):
         if not self.break_targets:
             raise SyntaxError("'break' outside loop")
+        self._emit_pending_finally(len(self.break_targets))
         self.break_targets[-1].append(len(self.instructions))
         self.instructions.append(Instruction("JUMP", None))  
 
     def visit_Continue(self, node):
         if not self.continue_targets:
             raise SyntaxError("'continue' outside loop")
+        self._emit_pending_finally(len(self.continue_targets))
         self.continue_targets[-1].append(len(self.instructions))
         self.instructions.append(Instruction("JUMP", None))  
 
     def visit_ForLoop(self, node):
         self.generate(node.start)
-        self.instructions.append(Instruction("STORE_VAR", node.var_name))
+        self._emit_store(node.var_name)
 
         loop_start = len(self.instructions)
-        self.instructions.append(Instruction("LOAD_VAR", node.var_name))
+        self._emit_load(node.var_name)
         self.generate(node.end)
         self.instructions.append(Instruction("COMPARE", "<"))
 
@@ -184,10 +365,10 @@ class BytecodeGenerator:
         for idx in self.continue_targets.pop():
             self.instructions[idx].argument = continue_target
 
-        self.instructions.append(Instruction("LOAD_VAR", node.var_name))
+        self._emit_load(node.var_name)
         self.instructions.append(Instruction("LOAD_CONST", 1))
         self.instructions.append(Instruction("ADD"))
-        self.instructions.append(Instruction("STORE_VAR", node.var_name))
+        self._emit_store(node.var_name)
         self.instructions.append(Instruction("JUMP", loop_start))
 
         self.instructions[jump_false].argument = len(self.instructions)
@@ -195,138 +376,101 @@ class BytecodeGenerator:
             self.instructions[idx].argument = len(self.instructions)
 
     def visit_ForInLoop(self, node):
-        uid = self._fresh()
-        iter_var = f"__iter_{uid}__"
-        idx_var  = f"__idx_{uid}__"
-
-        if isinstance(node.iterable, RangeExpr):
-            self._emit_range_for(node, iter_var, idx_var, uid)
-        else:
-            self.generate(node.iterable)
-            self.instructions.append(Instruction("STORE_VAR", iter_var))
-            self._emit_index_loop(node.var_name, iter_var, idx_var, node.body)
-
-    def _emit_range_for(self, node, iter_var, idx_var, uid):
-        r = node.iterable
-        self.generate(r.start)
-        self.generate(r.stop)
-        if r.step is not None:
-            self.generate(r.step)
-            self.instructions.append(Instruction("CALL_FUNCTION", ("range", 3)))
-        else:
-            self.instructions.append(Instruction("CALL_FUNCTION", ("range", 2)))
-        self.instructions.append(Instruction("STORE_VAR", iter_var))
-        self._emit_index_loop(node.var_name, iter_var, idx_var, node.body)
-
-    def _emit_index_loop(self, var_name, iter_var, idx_var, body):
-        self.instructions.append(Instruction("LOAD_CONST", 0))
-        self.instructions.append(Instruction("STORE_VAR", idx_var))
-
-        loop_start = len(self.instructions)
-
-        self.instructions.append(Instruction("LOAD_VAR", idx_var))
-        self.instructions.append(Instruction("LOAD_VAR", iter_var))
-        self.instructions.append(Instruction("CALL_FUNCTION", ("len", 1)))
-        self.instructions.append(Instruction("COMPARE", "<"))
-
-        jump_false = len(self.instructions)
-        self.instructions.append(Instruction("JUMP_IF_FALSE", None))
-
-        self.instructions.append(Instruction("LOAD_VAR", iter_var))
-        self.instructions.append(Instruction("LOAD_VAR", idx_var))
-        self.instructions.append(Instruction("LOAD_INDEX"))
-
-        if isinstance(var_name, list):
-            self.instructions.append(Instruction("UNPACK_SEQUENCE", len(var_name)))
-            for vn in var_name:
-                self.instructions.append(Instruction("STORE_VAR", vn))
-        else:
-            self.instructions.append(Instruction("STORE_VAR", var_name))
+        # The iterator lives on the operand stack for the whole loop;
+        # FOR_ITER either pushes the next item or pops the exhausted
+        # iterator and jumps past the loop.
+        self._emit_iter(node.iterable)
+        loop_start = self._emit_for_iter(node.var_name)
 
         self.break_targets.append([])
         self.continue_targets.append([])
+        self._iter_depth += 1
 
-        for stmt in body:
+        for stmt in node.body:
             self.generate(stmt)
 
-        continue_target = len(self.instructions)
+        self._iter_depth -= 1
         for idx in self.continue_targets.pop():
-            self.instructions[idx].argument = continue_target
-
-        self.instructions.append(Instruction("LOAD_VAR", idx_var))
-        self.instructions.append(Instruction("LOAD_CONST", 1))
-        self.instructions.append(Instruction("ADD"))
-        self.instructions.append(Instruction("STORE_VAR", idx_var))
-        self.instructions.append(Instruction("JUMP", loop_start))
-
-        self.instructions[jump_false].argument = len(self.instructions)
-        for idx in self.break_targets.pop():
-            self.instructions[idx].argument = len(self.instructions)
-
-    def visit_ListComprehension(self, node):
-        uid = self._fresh()
-        result_var = f"__comp_{uid}__"
-        iter_var   = f"__citer_{uid}__"
-        idx_var    = f"__cidx_{uid}__"
-
-        self.instructions.append(Instruction("BUILD_LIST", 0))
-        self.instructions.append(Instruction("STORE_VAR", result_var))
-
-        if isinstance(node.iterable, RangeExpr):
-            r = node.iterable
-            self.generate(r.start)
-            self.generate(r.stop)
-            if r.step is not None:
-                self.generate(r.step)
+            self.instructions[idx].argument = loop_start
+        self._emit_back_edge(loop_start, node)
+
+        breaks = self.break_targets.pop()
+        if breaks:
+            # break leaves the iterator behind; drop it on the way out.
+            for idx in breaks:
+                self.instructions[idx].argument = len(self.instructions)
+            self.instructions.append(Instruction("POP_TOP"))
+        self.instructions[loop_start].argument = len(self.instructions)
+
+    def _emit_back_edge(self, loop_start, node):
+        jump = Instruction("JUMP", loop_start)
+        jump.loop = node
+        self.instructions.append(jump)
+
+    def _emit_iter(self, iterable):
+        """Push an iterator over ``iterable``."""
+        if isinstance(iterable, RangeExpr):
+            self.generate(iterable.start)
+            self.generate(iterable.stop)
+            if iterable.step is not None:
+                self.generate(iterable.step)
                 self.instructions.append(Instruction("CALL_FUNCTION", ("range", 3)))
             else:
                 self.instructions.append(Instruction("CALL_FUNCTION", ("range", 2)))
         else:
-            self.generate(node.iterable)
-        self.instructions.append(Instruction("STORE_VAR", iter_var))
-
-        self.instructions.append(Instruction("LOAD_CONST", 0))
-        self.instructions.append(Instruction("STORE_VAR", idx_var))
+            self.generate(iterable)
+        self.instructions.append(Instruction("GET_ITER"))
 
+    def _emit_for_iter(self, var_name):
+        """Emit FOR_ITER (exit target left for the caller to patch) and the
+        store of each item into ``var_name``.  Returns the FOR_ITER index."""
         loop_start = len(self.instructions)
-
-        self.instructions.append(Instruction("LOAD_VAR", idx_var))
-        self.instructions.append(Instruction("LOAD_VAR", iter_var))
-        self.instructions.append(Instruction("CALL_FUNCTION", ("len", 1)))
-        self.instructions.append(Instruction("COMPARE", "<"))
-
-        jump_false = len(self.instructions)
+        self.instructions.append(Instruction("FOR_ITER", None))
+        if isinstance(var_name, list):
+            self.instructions.append(Instruction("UNPACK_SEQUENCE", len(var_name)))
+            for vn in var_name:
+                self._emit_store(vn)
+        else:
+            self._emit_store(var_name)
+        return loop_start
+
+    def _emit_filter(self, node):
+        """Emit a comprehension's ``if`` test, if any, and return the index
+        of its JUMP_IF_FALSE for the caller to patch.
+
+        Skipped items go through the loop's backward JUMP like kept ones,
+        since that is where the VM charges its ExecutionBudget.
+        """
+        if node.condition is None:
+            return None
+        self.generate(node.condition)
         self.instructions.append(Instruction("JUMP_IF_FALSE", None))
+        return len(self.instructions) - 1
 
-        self.instructions.append(Instruction("LOAD_VAR", iter_var))
-        self.instructions.append(Instruction("LOAD_VAR", idx_var))
-        self.instructions.append(Instruction("LOAD_INDEX"))
-        self.instructions.append(Instruction("STORE_VAR", node.var_name))
-
-        if node.condition is not None:
-            self.generate(node.condition)
-            skip_jump = len(self.instructions)
-            self.instructions.append(Instruction("JUMP_IF_FALSE", None))
+    def _emit_comprehension(self, node, build_op, result_var, emit_item):
+        """Shared loop for list/set/dict comprehensions; ``emit_item`` emits
+        the element and the instruction that adds it to the result."""
+        self.instructions.append(Instruction(build_op, 0))
+        self._emit_store(result_var)
 
-            self.instructions.append(Instruction("LOAD_VAR", result_var))
-            self.generate(node.expr)
-            self.instructions.append(Instruction("LIST_APPEND"))
+        self._emit_iter(node.iterable)
+        loop_start = self._emit_for_iter(node.var_name)
 
-            self.instructions[skip_jump].argument = len(self.instructions)
-        else:
-            self.instructions.append(Instruction("LOAD_VAR", result_var))
-            self.generate(node.expr)
-            self.instructions.append(Instruction("LIST_APPEND"))
-
-        self.instructions.append(Instruction("LOAD_VAR", idx_var))
-        self.instructions.append(Instruction("LOAD_CONST", 1))
-        self.instructions.append(Instruction("ADD"))
-        self.instructions.append(Instruction("STORE_VAR", idx_var))
+        skip = self._emit_filter(node)
+        self._emit_load(result_var)
+        emit_item()
+        if skip is not None:
+            self.instructions[skip].argument = len(self.instructions)
         self.instructions.append(Instruction("JUMP", loop_start))
 
-        self.instructions[jump_false].argument = len(self.instructions)
+        self.instructions[loop_start].argument = len(self.instructions)
+        self._emit_load(result_var)
 
-        self.instructions.append(Instruction("LOAD_VAR", result_var))
+    def visit_ListComprehension(self, node):
+        def emit_item():
+            self.generate(node.expr)
+            self.instructions.append(Instruction("LIST_APPEND"))
+        self._emit_comprehension(node, "BUILD_LIST", f"__comp_{self._fresh()}__", emit_item)
 
     def visit_FunctionDef(self, node):
         self.instructions.append(Instruction("DEFINE_FUNCTION", node))
@@ -433,6 +577,7 @@ class BytecodeGenerator:
 
     def visit_Return(self, node):
         self.generate(node.value)
+        self._emit_pending_finally(0)
         self.instructions.append(Instruction("RETURN_VALUE"))
 
     def visit_ExprStatement(self, node):
@@ -442,21 +587,21 @@ class BytecodeGenerator:
     _AUG_OP_MAP = {"+": "ADD", "-": "SUB", "*": "MUL", "/": "DIV", "%": "MOD", "**": "POW", "//": "FLOORDIV"}
 
     def visit_AugmentedAssignment(self, node):
-        self.instructions.append(Instruction("LOAD_VAR", node.name))
+        self._emit_load(node.name)
         self.generate(node.value)
         self.instructions.append(Instruction(self._AUG_OP_MAP[node.operator]))
-        self.instructions.append(Instruction("STORE_VAR", node.name))
+        self._emit_store(node.name)
 
     def visit_AttributeAugAssignment(self, node):
         uid = self._fresh()
         tmp_val = f"__augattr_{uid}__"
-        self.instructions.append(Instruction("LOAD_VAR", node.obj))
+        self._emit_load(node.obj)
         self.instructions.append(Instruction("LOAD_ATTR", node.attr))
         self.generate(node.value)
         self.instructions.append(Instruction(self._AUG_OP_MAP[node.operator]))
-        self.instructions.append(Instruction("STORE_VAR", tmp_val))
-        self.instructions.append(Instruction("LOAD_VAR", node.obj))
-        self.instructions.append(Instruction("LOAD_VAR", tmp_val))
+        self._emit_store(tmp_val)
+        self._emit_load(node.obj)
+        self._emit_load(tmp_val)
         self.instructions.append(Instruction("STORE_ATTR", node.attr))
 
     def visit_IndexAugAssignment(self, node):
@@ -464,16 +609,16 @@ class BytecodeGenerator:
         tmp_idx = f"__augidx_{uid}__"
         tmp_val = f"__augval_{uid}__"
         self.generate(node.index)
-        self.instructions.append(Instruction("STORE_VAR", tmp_idx))
-        self.instructions.append(Instruction("LOAD_VAR", node.name))
-        self.instructions.append(Instruction("LOAD_VAR", tmp_idx))
+        self._emit_store(tmp_idx)
+        self._emit_load(node.name)
+        self._emit_load(tmp_idx)
         self.instructions.append(Instruction("LOAD_INDEX"))
         self.generate(node.value)
         self.instructions.append(Instruction(self._AUG_OP_MAP[node.operator]))
-        self.instructions.append(Instruction("STORE_VAR", tmp_val))
-        self.instructions.append(Instruction("LOAD_VAR", node.name))
-        self.instructions.append(Instruction("LOAD_VAR", tmp_idx))
-        self.instructions.append(Instruction("LOAD_VAR", tmp_val))
+        self._emit_store(tmp_val)
+        self._emit_load(node.name)
+        self._emit_load(tmp_idx)
+        self._emit_load(tmp_val)
         self.instructions.append(Instruction("STORE_INDEX"))
 
     def visit_ListLiteral(self, node):
@@ -482,12 +627,12 @@ class BytecodeGenerator:
         self.instructions.append(Instruction("BUILD_LIST", len(node.elements)))
 
     def visit_ListAccess(self, node):
-        self.instructions.append(Instruction("LOAD_VAR", node.name))
+        self._emit_load(node.name)
         self.generate(node.index)
         self.instructions.append(Instruction("LOAD_INDEX"))
 
     def visit_IndexAssignment(self, node):
-        self.instructions.append(Instruction("LOAD_VAR", node.name))
+        self._emit_load(node.name)
         self.generate(node.index)
         self.generate(node.value)
         self.instructions.append(Instruction("STORE_INDEX"))
@@ -496,11 +641,11 @@ class BytecodeGenerator:
         self.instructions.append(Instruction("DEFINE_CLASS", node))
 
     def visit_AttributeAccess(self, node):
-        self.instructions.append(Instruction("LOAD_VAR", node.obj))
+        self._emit_load(node.obj)
         self.instructions.append(Instruction("LOAD_ATTR", node.attr))
 
     def visit_MethodCall(self, node):
-        self.instructions.append(Instruction("LOAD_VAR", node.obj))
+        self._emit_load(node.obj)
         has_special = any(
             type(a).__name__ in ("KeywordArg", "Starred", "DoubleStarred")
             for a in node.args
@@ -554,10 +699,10 @@ class BytecodeGenerator:
         self.generate(node.value)
         self.instructions.append(Instruction("UNPACK_SEQUENCE", len(node.names)))
         for name in node.names:
-            self.instructions.append(Instruction("STORE_VAR", name))
+            self._emit_store(name)
 
     def visit_ChainedIndexAssignment(self, node):
-        self.instructions.append(Instruction("LOAD_VAR", node.name))
+        self._emit_load(node.name)
         for idx in node.indices[:-1]:
             self.generate(idx)
             self.instructions.append(Instruction("LOAD_INDEX"))
@@ -592,7 +737,7 @@ class BytecodeGenerator:
     def visit_WalrusExpr(self, node):
         self.generate(node.value)
         self.instructions.append(Instruction("DUP_TOP"))
-        self.instructions.append(Instruction("STORE_VAR", node.name))
+        self._emit_store(node.name)
 
     def visit_IfExpr(self, node):
         self.generate(node.condition)
@@ -627,6 +772,8 @@ class BytecodeGenerator:
     def visit_RaiseStatement(self, node):
         if node.exc is not None:
             self.generate(node.exc)
+        elif self._exc_vars:
+            self._emit_load(self._exc_vars[-1])
         else:
             self.instructions.append(Instruction("LOAD_CONST", None))
         self.instructions.append(Instruction("RAISE_EXCEPTION"))
@@ -643,7 +790,80 @@ class BytecodeGenerator:
         self.instructions[jump_ok].argument = len(self.instructions)
 
     def visit_TryExcept(self, node):
-        self.instructions.append(Instruction("EXEC_TRY", node))
+        # try/except/else/finally is compiled inline.  No instruction marks
+        # entry into the block; instead every instruction of the protected
+        # range carries the index of its handler (see _protect), and the VM
+        # consults it only when an exception is actually raised.  On entry
+        # to a handler the VM has unwound the stack to the frame's base and
+        # pushed the exception object.
+        uid = self._fresh()
+        exc_var = f"__exc_{uid}__"
+        if node.finally_body:
+            self._finally_stack.append((node.finally_body, len(self.break_targets)))
+
+        body_start = len(self.instructions)
+        for stmt in node.body:
+            self.generate(stmt)
+        body_end = len(self.instructions)
+        for stmt in node.else_body:
+            self.generate(stmt)
+        done_jumps = [len(self.instructions)]
+        self.instructions.append(Instruction("JUMP", None))
+
+        handler_start = len(self.instructions)
+        if node.handlers:
+            self._emit_store(exc_var)
+            self._exc_vars.append(exc_var)
+            for handler in node.handlers:
+                skip_jump = None
+                if handler.exc_type is not None:
+                    self._emit_load(exc_var)
+                    self.instructions.append(Instruction("MATCH_EXCEPTION", handler.exc_type))
+                    skip_jump = len(self.instructions)
+                    self.instructions.append(Instruction("JUMP_IF_FALSE", None))
+                if handler.var_name:
+                    self._emit_load(exc_var)
+                    self._emit_store(handler.var_name)
+                for stmt in handler.body:
+                    self.generate(stmt)
+                done_jumps.append(len(self.instructions))
+                self.instructions.append(Instruction("JUMP", None))
+                if skip_jump is not None:
+                    self.instructions[skip_jump].argument = len(self.instructions)
+            self._exc_vars.pop()
+            # No clause matched: propagate.
+            self._emit_load(exc_var)
+            self.instructions.append(Instruction("RAISE_EXCEPTION"))
+        handlers_end = len(self.instructions)
+
+        for pos in done_jumps:
+            self.instructions[pos].argument = len(self.instructions)
+
+        if not node.finally_body:
+            self._protect(body_start, body_end, handler_start)
+            return
+
+        self._finally_stack.pop()
+        for stmt in node.finally_body:
+            self.generate(stmt)
+        end_jump = len(self.instructions)
+        self.instructions.append(Instruction("JUMP", None))
+
+        # Exceptional path: run the finally body, then re-raise.
+        finally_start = len(self.instructions)
+        fin_var = f"__fin_{uid}__"
+        self._emit_store(fin_var)
+        for stmt in node.finally_body:
+            self.generate(stmt)
+        self._emit_load(fin_var)
+        self.instructions.append(Instruction("RAISE_EXCEPTION"))
+        self.instructions[end_jump].argument = len(self.instructions)
+
+        if node.handlers:
+            self._protect(body_start, body_end, handler_start)
+            self._protect(body_end, handlers_end, finally_start)
+        else:
+            self._protect(body_start, handlers_end, finally_start)
 
     def visit_WithStatement(self, node):
         self.instructions.append(Instruction("EXEC_WITH", node))
@@ -659,10 +879,13 @@ class BytecodeGenerator:
         self.instructions.append(Instruction("MAKE_LAMBDA", node))
 
     def visit_Decorated(self, node):
+        name = node.node.name
         self.generate(node.node)
+        self._emit_load(name)
         for dec in reversed(node.decorators):
             self.generate(dec)
-            self.instructions.append(Instruction("APPLY_DECORATOR"))
+            self.instructions.append(Instruction("APPLY_DECORATOR", name))
+        self._emit_store(name)
 
     def visit_DictLiteral(self, node):
         for k, v in zip(node.keys, node.values):
@@ -705,180 +928,44 @@ class BytecodeGenerator:
         self.generate(node.value)
 
     def visit_DictComprehension(self, node):
-        uid = self._fresh()
-        result_var = f"__dcomp_{uid}__"
-        iter_var   = f"__dciter_{uid}__"
-        idx_var    = f"__dcidx_{uid}__"
-
-        self.instructions.append(Instruction("BUILD_DICT", 0))
-        self.instructions.append(Instruction("STORE_VAR", result_var))
-
-        if isinstance(node.iterable, RangeExpr):
-            r = node.iterable
-            self.generate(r.start)
-            self.generate(r.stop)
-            if r.step is not None:
-                self.generate(r.step)
-                self.instructions.append(Instruction("CALL_FUNCTION", ("range", 3)))
-            else:
-                self.instructions.append(Instruction("CALL_FUNCTION", ("range", 2)))
-        else:
-            self.generate(node.iterable)
-        self.instructions.append(Instruction("STORE_VAR", iter_var))
-        self.instructions.append(Instruction("LOAD_CONST", 0))
-        self.instructions.append(Instruction("STORE_VAR", idx_var))
-
-        loop_start = len(self.instructions)
-        self.instructions.append(Instruction("LOAD_VAR", idx_var))
-        self.instructions.append(Instruction("LOAD_VAR", iter_var))
-        self.instructions.append(Instruction("CALL_FUNCTION", ("len", 1)))
-        self.instructions.append(Instruction("COMPARE", "<"))
-        jump_false = len(self.instructions)
-        self.instructions.append(Instruction("JUMP_IF_FALSE", None))
-
-        self.instructions.append(Instruction("LOAD_VAR", iter_var))
-        self.instructions.append(Instruction("LOAD_VAR", idx_var))
-        self.instructions.append(Instruction("LOAD_INDEX"))
-        self.instructions.append(Instruction("STORE_VAR", node.var_name))
-
-        if node.condition is not None:
-            self.generate(node.condition)
-            skip = len(self.instructions)
-            self.instructions.append(Instruction("JUMP_IF_FALSE", None))
-            self.instructions.append(Instruction("LOAD_VAR", result_var))
-            self.generate(node.key_expr)
-            self.generate(node.val_expr)
-            self.instructions.append(Instruction("DICT_SET_ITEM"))
-            self.instructions[skip].argument = len(self.instructions)
-        else:
-            self.instructions.append(Instruction("LOAD_VAR", result_var))
+        def emit_item():
             self.generate(node.key_expr)
             self.generate(node.val_expr)
             self.instructions.append(Instruction("DICT_SET_ITEM"))
-
-        self.instructions.append(Instruction("LOAD_VAR", idx_var))
-        self.instructions.append(Instruction("LOAD_CONST", 1))
-        self.instructions.append(Instruction("ADD"))
-        self.instructions.append(Instruction("STORE_VAR", idx_var))
-        self.instructions.append(Instruction("JUMP", loop_start))
-        self.instructions[jump_false].argument = len(self.instructions)
-        self.instructions.append(Instruction("LOAD_VAR", result_var))
+            self.instructions.append(Instruction("POP_TOP"))
+        self._emit_comprehension(node, "BUILD_DICT", f"__dcomp_{self._fresh()}__", emit_item)
 
     def visit_SetComprehension(self, node):
-        uid = self._fresh()
-        result_var = f"__scomp_{uid}__"
-        iter_var   = f"__sciter_{uid}__"
-        idx_var    = f"__scidx_{uid}__"
-
-        self.instructions.append(Instruction("BUILD_SET", 0))
-        self.instructions.append(Instruction("STORE_VAR", result_var))
-
-        if isinstance(node.iterable, RangeExpr):
-            r = node.iterable
-            self.generate(r.start)
-            self.generate(r.stop)
-            if r.step is not None:
-                self.generate(r.step)
-                self.instructions.append(Instruction("CALL_FUNCTION", ("range", 3)))
-            else:
-                self.instructions.append(Instruction("CALL_FUNCTION", ("range", 2)))
-        else:
-            self.generate(node.iterable)
-        self.instructions.append(Instruction("STORE_VAR", iter_var))
-        self.instructions.append(Instruction("LOAD_CONST", 0))
-        self.instructions.append(Instruction("STORE_VAR", idx_var))
-
-        loop_start = len(self.instructions)
-        self.instructions.append(Instruction("LOAD_VAR", idx_var))
-        self.instructions.append(Instruction("LOAD_VAR", iter_var))
-        self.instructions.append(Instruction("CALL_FUNCTION", ("len", 1)))
-        self.instructions.append(Instruction("COMPARE", "<"))
-        jump_false = len(self.instructions)
-        self.instructions.append(Instruction("JUMP_IF_FALSE", None))
-
-        self.instructions.append(Instruction("LOAD_VAR", iter_var))
-        self.instructions.append(Instruction("LOAD_VAR", idx_var))
-        self.instructions.append(Instruction("LOAD_INDEX"))
-        self.instructions.append(Instruction("STORE_VAR", node.var_name))
-
-        if node.condition is not None:
-            self.generate(node.condition)
-            skip = len(self.instructions)
-            self.instructions.append(Instruction("JUMP_IF_FALSE", None))
-            self.instructions.append(Instruction("LOAD_VAR", result_var))
-            self.generate(node.expr)
-            self.instructions.append(Instruction("SET_ADD"))
-            self.instructions[skip].argument = len(self.instructions)
-        else:
-            self.instructions.append(Instruction("LOAD_VAR", result_var))
+        def emit_item():
             self.generate(node.expr)
             self.instructions.append(Instruction("SET_ADD"))
-
-        self.instructions.append(Instruction("LOAD_VAR", idx_var))
-        self.instructions.append(Instruction("LOAD_CONST", 1))
-        self.instructions.append(Instruction("ADD"))
-        self.instructions.append(Instruction("STORE_VAR", idx_var))
-        self.instructions.append(Instruction("JUMP", loop_start))
-        self.instructions[jump_false].argument = len(self.instructions)
-        self.instructions.append(Instruction("LOAD_VAR", result_var))
+            self.instructions.append(Instruction("POP_TOP"))
+        self._emit_comprehension(node, "BUILD_SET", f"__scomp_{self._fresh()}__", emit_item)
 
     def visit_GeneratorExpr(self, node):
-        uid = self._fresh()
-        result_var = f"__gexpr_{uid}__"
-        iter_var   = f"__giter_{uid}__"
-        idx_var    = f"__gidx_{uid}__"
-
-        self.instructions.append(Instruction("BUILD_LIST", 0))
-        self.instructions.append(Instruction("STORE_VAR", result_var))
-
-        if isinstance(node.iterable, RangeExpr):
-            r = node.iterable
-            self.generate(r.start)
-            self.generate(r.stop)
-            if r.step is not None:
-                self.generate(r.step)
-                self.instructions.append(Instruction("CALL_FUNCTION", ("range", 3)))
-            else:
-                self.instructions.append(Instruction("CALL_FUNCTION", ("range", 2)))
-        else:
-            self.generate(node.iterable)
-        self.instructions.append(Instruction("STORE_VAR", iter_var))
-        self.instructions.append(Instruction("LOAD_CONST", 0))
-        self.instructions.append(Instruction("STORE_VAR", idx_var))
-
-        loop_start = len(self.instructions)
-        self.instructions.append(Instruction("LOAD_VAR", idx_var))
-        self.instructions.append(Instruction("LOAD_VAR", iter_var))
-        self.instructions.append(Instruction("CALL_FUNCTION", ("len", 1)))
-        self.instructions.append(Instruction("COMPARE", "<"))
-        jump_false = len(self.instructions)
-        self.instructions.append(Instruction("JUMP_IF_FALSE", None))
-
-        self.instructions.append(Instruction("LOAD_VAR", iter_var))
-        self.instructions.append(Instruction("LOAD_VAR", idx_var))
-        self.instructions.append(Instruction("LOAD_INDEX"))
-        self.instructions.append(Instruction("STORE_VAR", node.var_name))
-
-        if node.condition is not None:
-            self.generate(node.condition)
-            skip = len(self.instructions)
-            self.instructions.append(Instruction("JUMP_IF_FALSE", None))
-            self.instructions.append(Instruction("LOAD_VAR", result_var))
-            self.generate(node.expr)
-            self.instructions.append(Instruction("LIST_APPEND"))
+        # Only the outermost iterable is evaluated here, as in Python; the
+        # VM runs the body from generate_genexpr() lazily on a generator.
+        self._emit_iter(node.iterable)
+        self.instructions.append(Instruction("MAKE_GENERATOR", node))
+
+    def generate_genexpr(self, node):
+        """Code for the body of generator expression ``node``.
+
+        The code starts with the iterator over the outermost iterable on the
+        stack and yields one element per matching item.
+        """
+        loop_start = self._emit_for_iter(node.var_name)
+        skip = self._emit_filter(node)
+        self.generate(node.expr)
+        self.instructions.append(Instruction("YIELD_VALUE"))
+        self.instructions.append(Instruction("POP_TOP"))
+        if skip is not None:
             self.instructions[skip].argument = len(self.instructions)
-        else:
-            self.instructions.append(Instruction("LOAD_VAR", result_var))
-            self.generate(node.expr)
-            self.instructions.append(Instruction("LIST_APPEND"))
-
-        self.instructions.append(Instruction("LOAD_VAR", idx_var))
-        self.instructions.append(Instruction("LOAD_CONST", 1))
-        self.instructions.append(Instruction("ADD"))
-        self.instructions.append(Instruction("STORE_VAR", idx_var))
         self.instructions.append(Instruction("JUMP", loop_start))
-        self.instructions[jump_false].argument = len(self.instructions)
-        self.instructions.append(Instruction("LOAD_VAR", result_var))
+        self.instructions[loop_start].argument = len(self.instructions)
+        self.instructions.append(Instruction("LOAD_CONST", None))
+        self.instructions.append(Instruction("RETURN_VALUE"))
+        return self.instructions
 
 
 
@@ -1,3 +1,6 @@
+from compiler.class_layout import build_class_layout
+
+
 class CFGNode:
     def __init__(self, label, scope="main"):
         self.label = label
@@ -8,6 +11,7 @@ class CFGBuilder:
     def __init__(self):
         self.nodes = []
         self.counter = 0
+        self.class_layouts = {}
 
     def new_node(self, label, scope="main"):
         node = CFGNode(f"{self.counter}:{label}", scope=scope)
@@ -59,6 +63,10 @@ class CFGBuilder:
                 current_prevs = [node]
 
             elif stmt_type == "ClassDef":
+                try:
+                    self.class_layouts[stmt_name] = build_class_layout(stmt, self.class_layouts)
+                except TypeError:
+                    pass
                 cls_scope = f"class:{stmt_name or '?'}"
                 self._build_block(stmt.body, [node], scope=cls_scope)
                 current_prevs = [node]
@@ -109,6 +117,15 @@ class CFGBuilder:
                 lines.append(f"\n=== Function: {scope[3:]} ===")
             elif scope.startswith("class:"):
                 lines.append(f"\n=== Class: {scope[6:]} ===")
+                layout = self.class_layouts.get(scope[6:])
+                if layout is not None and len(layout.mro) > 1:
+                    lines.append(f"MRO: {' -> '.join(layout.mro)}")
+                    inherited = [
+                        f"{m} (from {owner})"
+                        for m, (_, owner) in layout.methods.items() if owner != layout.name
+                    ]
+                    if inherited:
+                        lines.append(f"Inherited: {', '.join(inherited)}")
             else:
                 lines.append(f"\n=== {scope} ===")
             lines.extend(edges)
@@ -0,0 +1,112 @@
+class Shape:
+    """Hidden class for VM instances: attribute name -> index into the value list.
+
+    Every instance of a class starts at the class's root shape; adding an
+    attribute moves it along a transition to the child shape for that name.
+    Instances whose attributes were assigned in the same order share one
+    shape, so a shape check plus a list index replaces a dict lookup.
+    """
+
+    __slots__ = ("offsets", "transitions")
+
+    def __init__(self, offsets=None):
+        self.offsets     = offsets or {}
+        self.transitions = {}
+
+    def with_attribute(self, name):
+        """The shape reached from this one by adding attribute ``name``."""
+        child = self.transitions.get(name)
+        if child is None:
+            offsets = dict(self.offsets)
+            offsets[name] = len(offsets)
+            child = self.transitions[name] = Shape(offsets)
+        return child
+
+
+class ClassLayout:
+    """Flattened method-resolution data for one class, built once at definition.
+
+    ``mro`` is the C3 linearisation of the class and its bases (as names),
+    ``methods`` maps every method name reachable through the MRO to the
+    (method node, defining class name) pair that wins, and ``ancestors`` is
+    the set of names ``isinstance`` accepts.  ``root_shape`` is the empty
+    attribute shape new instances start from.  Base layouts are captured when
+    the class is defined, so rebinding a base name later does not change an
+    existing subclass — the same as Python.
+    """
+
+    def __init__(self, node, bases):
+        self.node  = node
+        self.name  = node.name
+        self.bases = tuple(bases)
+        self.root_shape = Shape()
+        self.own_methods = {}
+        for stmt in node.body:
+            if hasattr(stmt, "name"):
+                self.own_methods.setdefault(stmt.name, (stmt, self.name))
+
+        linearised = _c3_merge(
+            [list(base._mro_layouts) for base in self.bases] + [list(self.bases)]
+        )
+        if linearised is None:
+            raise TypeError(
+                f"Cannot create a consistent method resolution order (MRO) "
+                f"for bases {', '.join(b.name for b in self.bases)}"
+            )
+        self._mro_layouts = (self,) + tuple(linearised)
+        self.mro       = tuple(layout.name for layout in self._mro_layouts)
+        self.ancestors = frozenset(self.mro)
+        self.methods   = self._merge_methods(self._mro_layouts)
+        self._next     = {}
+
+    @staticmethod
+    def _merge_methods(layouts):
+        methods = {}
+        for layout in layouts:
+            for name, entry in layout.own_methods.items():
+                methods.setdefault(name, entry)
+        return methods
+
+    def lookup(self, method_name):
+        """(method node, defining class) for ``method_name``, or (None, None)."""
+        return self.methods.get(method_name, (None, None))
+
+    def next_method(self, after, method_name):
+        """Resolve ``method_name`` past class ``after`` in this MRO — ``super()``.
+
+        The per-``after`` tables are built on first use and kept.
+        """
+        table = self._next.get(after)
+        if table is None:
+            index = self.mro.index(after) if after in self.mro else 0
+            table = self._next[after] = self._merge_methods(self._mro_layouts[index + 1:])
+        return table.get(method_name, (None, None))
+
+
+def _c3_merge(sequences):
+    """C3 merge of lists of layouts; None if no consistent order exists."""
+    sequences = [seq for seq in sequences if seq]
+    result = []
+    while sequences:
+        for seq in sequences:
+            head = seq[0]
+            if not any(head in other[1:] for other in sequences):
+                break
+        else:
+            return None
+        result.append(head)
+        sequences = [
+            [layout for layout in seq if layout is not head] for seq in sequences
+        ]
+        sequences = [seq for seq in sequences if seq]
+    return result
+
+
+def build_class_layout(class_node, layouts):
+    """Build the layout for ``class_node`` from the already-defined ``layouts``.
+
+    Base names with no layout (undefined, or not a user class) are ignored,
+    as the interpreter has always done.
+    """
+    bases = [layouts[name] for name in (class_node.bases or []) if name in layouts]
+    return ClassLayout(class_node, bases)
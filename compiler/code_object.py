@@ -0,0 +1,421 @@
+import struct
+import zlib
+
+from compiler import ast_nodes
+from compiler.ast_nodes import ASTNode, ClassDef, FunctionDef, GeneratorExpr, LambdaExpr
+from compiler.bytecode import OPCODE_IDS, OPCODES, Instruction, decode
+
+
+# Bump whenever the encoding below changes; data in another format is
+# refused rather than misread.
+CODE_FORMAT = 1
+CODE_MAGIC = b"PFXC"
+# Opcodes are stored by integer id, so data is only valid for the opcode
+# table it was written with.
+_OPCODE_TABLE = zlib.crc32(",".join(OPCODES).encode())
+
+# Opcodes whose argument is an identifier, kept in a code object's
+# ``names`` table; every other argument goes into ``consts``.
+NAME_OPCODES = frozenset({
+    "LOAD_VAR", "STORE_VAR", "DELETE_VAR", "LOAD_GLOBAL", "STORE_GLOBAL",
+    "LOAD_ATTR", "STORE_ATTR", "MATCH_EXCEPTION",
+})
+
+_NOP = OPCODE_IDS["NOP"]
+
+# Type tags of the value encoding.
+_NONE, _TRUE, _FALSE, _INT, _FLOAT, _STR = b"NTFIDS"
+_TUPLE, _LIST, _DICT, _SET, _FROZENSET = b"ULMEZ"
+_NODE, _CODE, _REF = b"ACR"
+
+
+class CodeFormatError(ValueError):
+    """Raised for code that cannot be stored, or data that is not a valid code object."""
+
+
+class CodeObject:
+    """One compiled body in storable form: the module, a function, a lambda...
+
+    ``code`` holds an (opcode id, oparg) pair per instruction.  For the
+    opcodes in NAME_OPCODES oparg indexes ``names``, for the others it
+    indexes ``consts``; -1 stands for no argument.  ``handlers`` and
+    ``loops`` map instruction indices to the exception handler entry and
+    the loop node of that instruction.
+
+    ``children`` maps each AST node in ``consts`` whose body the VM
+    compiles separately (FunctionDef, LambdaExpr, GeneratorExpr) to that
+    body's CodeObject.  A ClassDef's CodeObject has no code of its own,
+    only its methods as children.
+    """
+
+    def __init__(self, name, code, consts, names, handlers=None, loops=None, children=None):
+        self.name     = name
+        self.code     = code
+        self.consts   = consts
+        self.names    = names
+        self.handlers = handlers or {}
+        self.loops    = loops or {}
+        self.children = children or {}
+
+    def instructions(self):
+        """A fresh, decoded instruction list; each VM needs its own inline caches."""
+        instructions = []
+        for i, (opnum, oparg) in enumerate(self.code):
+            if oparg < 0:
+                argument = None
+            elif OPCODES[opnum] in NAME_OPCODES:
+                argument = self.names[oparg]
+            else:
+                argument = self.consts[oparg]
+            instr = Instruction(OPCODES[opnum], argument)
+            handler = self.handlers.get(i)
+            if handler is not None:
+                instr.handler = handler
+            loop = self.loops.get(i)
+            if loop is not None:
+                instr.loop = loop
+            instructions.append(instr)
+        return decode(instructions)
+
+    def bodies(self):
+        """Every nested body's instructions keyed like the VM's CodeCache."""
+        bodies = {}
+        for node, child in self.children.items():
+            if child.code:
+                bodies[node] = child.instructions()
+            bodies.update(child.bodies())
+        return bodies
+
+    def install(self, vm):
+        """Give ``vm`` the nested bodies, so it never compiles them itself."""
+        vm.code_cache.preload(self.bodies())
+
+
+def assemble(instructions, name="<module>", peephole=True):
+    """The CodeObject of a program, with all its nested bodies compiled.
+
+    ``instructions`` are the program as VirtualMachine takes them, e.g.
+    BytecodeGenerator output; they are stored unchanged.  The bodies of
+    functions, methods, lambdas and generator expressions are compiled
+    as a VirtualMachine with the same ``peephole`` setting would at run
+    time.  Bodies the VM compiles from other statements (``with``
+    blocks, default values) are left to run time.
+    """
+    from compiler.vm import VirtualMachine
+    compiler = VirtualMachine([], peephole=peephole, jit_profile="interpreter")
+    return _assemble(compiler, name, instructions)
+
+
+def _assemble(vm, name, instructions):
+    consts, names, code = [], [], []
+    const_index, name_index = {}, {}
+    handlers, loops, children = {}, {}, {}
+    for i, instr in enumerate(instructions):
+        argument = instr.argument
+        if argument is None:
+            oparg = -1
+        elif instr.opcode in NAME_OPCODES:
+            if type(argument) is not str:
+                raise CodeFormatError(f"{instr.opcode} argument {argument!r} is not a name")
+            oparg = name_index.get(argument)
+            if oparg is None:
+                oparg = name_index[argument] = len(names)
+                names.append(argument)
+        else:
+            key = _const_key(argument)
+            oparg = const_index.get(key) if key is not None else None
+            if oparg is None:
+                oparg = len(consts)
+                consts.append(argument)
+                if key is not None:
+                    const_index[key] = oparg
+            if isinstance(argument, ASTNode) and argument not in children:
+                child = _assemble_node(vm, argument)
+                if child is not None:
+                    children[argument] = child
+        code.append((OPCODE_IDS.get(instr.opcode, _NOP), oparg))
+        if instr.handler is not None:
+            handlers[i] = instr.handler
+        if instr.loop is not None:
+            loops[i] = instr.loop
+    return CodeObject(name, code, consts, names, handlers, loops, children)
+
+
+def _assemble_node(vm, node):
+    if isinstance(node, FunctionDef):
+        return _assemble(vm, node.name, vm._compile_function(node))
+    if isinstance(node, LambdaExpr):
+        return _assemble(vm, "<lambda>", vm._lambda_code(node))
+    if isinstance(node, GeneratorExpr):
+        return _assemble(vm, "<genexpr>", vm._compile_genexpr(node))
+    if isinstance(node, ClassDef):
+        methods = {
+            stmt: _assemble(vm, f"{node.name}.{stmt.name}", vm._compile_function(stmt))
+            for stmt in node.body if isinstance(stmt, FunctionDef)
+        }
+        return CodeObject(node.name, [], [], [], children=methods)
+    return None
+
+
+def _const_key(value):
+    """Key under which equal constants share a ``consts`` entry, or None.
+
+    Type and repr tell apart values Python considers equal, such as 1,
+    1.0 and True or 0.0 and -0.0.  AST nodes are shared by identity.
+    """
+    if isinstance(value, ASTNode):
+        return ("node", id(value))
+    try:
+        hash(value)
+        return (type(value), repr(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def dumps(code):
+    """``code`` as bytes; CodeFormatError if it holds a value that cannot be stored.
+
+    The encoding is tagged and compact: integers are varints, every
+    string is stored once in a table at the front, and AST nodes and
+    code objects referenced more than once are stored once, so loading
+    gives back the very same sharing.  Nodes are rebuilt by class name
+    from compiler.ast_nodes; loading never runs any other code.
+    """
+    writer = _Writer()
+    try:
+        writer.value(code)
+    except RecursionError:
+        raise CodeFormatError("code is nested too deeply to store") from None
+    header = _Writer()
+    header.out += CODE_MAGIC
+    header.uint(CODE_FORMAT)
+    header.out += struct.pack("<I", _OPCODE_TABLE)
+    header.uint(len(writer.strings))
+    for s in writer.strings:
+        data = s.encode("utf-8", "surrogatepass")
+        header.uint(len(data))
+        header.out += data
+    return bytes(header.out + writer.out)
+
+
+def loads(data):
+    """The CodeObject stored by dumps(); CodeFormatError if ``data`` is not one."""
+    if data[:len(CODE_MAGIC)] != CODE_MAGIC:
+        raise CodeFormatError("not a compiled program")
+    reader = _Reader(data, len(CODE_MAGIC))
+    try:
+        if reader.uint() != CODE_FORMAT:
+            raise CodeFormatError("compiled program of another format")
+        if struct.unpack_from("<I", data, reader.pos)[0] != _OPCODE_TABLE:
+            raise CodeFormatError("compiled program of another opcode table")
+        reader.pos += 4
+        for _ in range(reader.uint()):
+            size = reader.uint()
+            reader.strings.append(reader.take(size).decode("utf-8", "surrogatepass"))
+        code = reader.value()
+    except (IndexError, TypeError, struct.error, UnicodeDecodeError, RecursionError) as e:
+        raise CodeFormatError(f"corrupt compiled program: {e}") from None
+    if type(code) is not CodeObject or reader.pos != len(data):
+        raise CodeFormatError("corrupt compiled program")
+    return code
+
+
+class _Writer:
+    def __init__(self):
+        self.out     = bytearray()
+        self.strings = []
+        self._string_index = {}
+        # id() -> reference number of each node and code object written.
+        self._refs = {}
+
+    def uint(self, n):
+        while n > 0x7F:
+            self.out.append(n & 0x7F | 0x80)
+            n >>= 7
+        self.out.append(n)
+
+    def string(self, s):
+        index = self._string_index.get(s)
+        if index is None:
+            index = self._string_index[s] = len(self.strings)
+            self.strings.append(s)
+        self.uint(index)
+
+    def value(self, v):
+        out = self.out
+        t = type(v)
+        if v is None:
+            out.append(_NONE)
+        elif t is bool:
+            out.append(_TRUE if v else _FALSE)
+        elif t is int:
+            out.append(_INT)
+            self.uint(v << 1 if v >= 0 else (-v << 1) - 1)
+        elif t is float:
+            out.append(_FLOAT)
+            out += struct.pack("<d", v)
+        elif t is str:
+            out.append(_STR)
+            self.string(v)
+        elif t in _SEQUENCE_TAGS:
+            out.append(_SEQUENCE_TAGS[t])
+            self.uint(len(v))
+            for item in v:
+                self.value(item)
+        elif t is dict:
+            out.append(_DICT)
+            self.uint(len(v))
+            for key, item in v.items():
+                self.value(key)
+                self.value(item)
+        elif id(v) in self._refs:
+            out.append(_REF)
+            self.uint(self._refs[id(v)])
+        elif isinstance(v, ASTNode):
+            self.node(v)
+        elif t is CodeObject:
+            self.code(v)
+        else:
+            raise CodeFormatError(f"cannot store a value of type {t.__name__}")
+
+    def node(self, node):
+        cls = type(node)
+        if getattr(ast_nodes, cls.__name__, None) is not cls:
+            raise CodeFormatError(f"cannot store AST node of type {cls.__name__}")
+        self._refs[id(node)] = len(self._refs)
+        self.out.append(_NODE)
+        self.string(cls.__name__)
+        fields = vars(node)
+        self.uint(len(fields))
+        for name, value in fields.items():
+            self.string(name)
+            self.value(value)
+
+    def code(self, code):
+        self._refs[id(code)] = len(self._refs)
+        self.out.append(_CODE)
+        self.value(code.name)
+        self.value(code.names)
+        self.value(code.consts)
+        self.uint(len(code.code))
+        for opnum, oparg in code.code:
+            self.uint(opnum)
+            self.uint(oparg + 1)
+        self.uint(len(code.handlers))
+        for i, (handler, depth) in code.handlers.items():
+            self.uint(i)
+            self.uint(handler)
+            self.uint(depth)
+        self.uint(len(code.loops))
+        for i, loop in code.loops.items():
+            self.uint(i)
+            self.value(loop)
+        self.uint(len(code.children))
+        for node, child in code.children.items():
+            self.value(node)
+            self.value(child)
+
+
+_SEQUENCE_TAGS = {tuple: _TUPLE, list: _LIST, set: _SET, frozenset: _FROZENSET}
+_SEQUENCE_TYPES = {tag: t for t, tag in _SEQUENCE_TAGS.items()}
+
+
+class _Reader:
+    def __init__(self, data, pos):
+        self.data    = data
+        self.pos     = pos
+        self.strings = []
+        self._refs   = []
+
+    def take(self, n):
+        end = self.pos + n
+        if end > len(self.data):
+            raise IndexError("data ends early")
+        chunk = self.data[self.pos:end]
+        self.pos = end
+        return bytes(chunk)
+
+    def uint(self):
+        n = self.data[self.pos]
+        self.pos += 1
+        if n < 0x80:
+            return n
+        n &= 0x7F
+        shift = 7
+        while True:
+            byte = self.data[self.pos]
+            self.pos += 1
+            n |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return n
+            shift += 7
+
+    def string(self):
+        return self.strings[self.uint()]
+
+    def value(self):
+        tag = self.data[self.pos]
+        self.pos += 1
+        if tag == _NONE:
+            return None
+        if tag == _TRUE:
+            return True
+        if tag == _FALSE:
+            return False
+        if tag == _INT:
+            n = self.uint()
+            return -((n + 1) >> 1) if n & 1 else n >> 1
+        if tag == _FLOAT:
+            return struct.unpack("<d", self.take(8))[0]
+        if tag == _STR:
+            return self.string()
+        if tag in _SEQUENCE_TYPES:
+            return _SEQUENCE_TYPES[tag](self.value() for _ in range(self.uint()))
+        if tag == _DICT:
+            return {self.value(): self.value() for _ in range(self.uint())}
+        if tag == _REF:
+            return self._refs[self.uint()]
+        if tag == _NODE:
+            return self.node()
+        if tag == _CODE:
+            return self.code()
+        raise CodeFormatError(f"corrupt compiled program: unknown tag {tag}")
+
+    def node(self):
+        cls = getattr(ast_nodes, self.string(), None)
+        if not (isinstance(cls, type) and issubclass(cls, ASTNode)):
+            raise CodeFormatError("corrupt compiled program: unknown AST node type")
+        node = cls.__new__(cls)
+        self._refs.append(node)
+        for _ in range(self.uint()):
+            name = self.string()
+            setattr(node, name, self.value())
+        return node
+
+    def code(self):
+        code = CodeObject(None, [], [], [])
+        self._refs.append(code)
+        code.name   = self.value()
+        code.names  = self.value()
+        code.consts = self.value()
+        if type(code.names) is not list or type(code.consts) is not list:
+            raise CodeFormatError("corrupt compiled program: bad code object tables")
+        for _ in range(self.uint()):
+            opnum = self.uint()
+            oparg = self.uint() - 1
+            if opnum >= len(OPCODES):
+                raise CodeFormatError("corrupt compiled program: unknown opcode")
+            table = code.names if OPCODES[opnum] in NAME_OPCODES else code.consts
+            if oparg >= len(table):
+                raise CodeFormatError("corrupt compiled program: argument out of range")
+            code.code.append((opnum, oparg))
+        for _ in range(self.uint()):
+            i = self.uint()
+            code.handlers[i] = (self.uint(), self.uint())
+        for _ in range(self.uint()):
+            i = self.uint()
+            code.loops[i] = self.value()
+        for _ in range(self.uint()):
+            node = self.value()
+            code.children[node] = self.value()
+        return code
@@ -1,4 +1,10 @@
+from compiler.class_layout import build_class_layout
+
+
 class BytecodeDisassembler:
+    def __init__(self):
+        self.class_layouts = {}
+
     def _format_arg(self, opcode, arg):
         if arg is None:
             return None
@@ -24,14 +30,24 @@ class BytecodeDisassembler:
             bases = getattr(arg, "bases", []) or []
             parent = getattr(arg, "parent", None)
             base_names = [str(b) for b in bases if b] or ([str(parent)] if parent else [])
-            if base_names:
-                return f"{name}({', '.join(base_names)})"
-            return name
+            header = f"{name}({', '.join(base_names)})" if base_names else name
+            try:
+                layout = build_class_layout(arg, self.class_layouts)
+            except (TypeError, AttributeError):
+                return header
+            self.class_layouts[name] = layout
+            methods = ", ".join(
+                m if owner == name else f"{m}<-{owner}"
+                for m, (_, owner) in layout.methods.items()
+            )
+            return f"{header}  mro=[{', '.join(layout.mro)}]  methods=[{methods}]"
         if opcode == "MAKE_LAMBDA":
             params = getattr(arg, "params", [])
             return f"lambda {', '.join(str(p) for p in params)}"
         if opcode == "EXEC_WITH":
             return "<with-block>"
+        if opcode == "MAKE_GENERATOR":
+            return "<genexpr>"
         return str(arg)
 
     def disassemble(self, instructions):
@@ -42,4 +58,22 @@ class BytecodeDisassembler:
                 lines.append(f"{i:04}  {instr.opcode}")
             else:
                 lines.append(f"{i:04}  {instr.opcode} {arg_str}")
-        return "\n".join(lines)
\ No newline at end of file
+        table = self._exception_table(instructions)
+        if table:
+            lines.append("ExceptionTable:")
+            for start, end, handler, depth in table:
+                lines.append(f"  {start:04} to {end - 1:04} -> {handler:04} [{depth}]")
+        return "\n".join(lines)
+
+    def _exception_table(self, instructions):
+        """Collapse per-instruction handler entries into (start, end, handler, depth) ranges."""
+        table = []
+        for i, instr in enumerate(instructions):
+            entry = getattr(instr, "handler", None)
+            if entry is None:
+                continue
+            if table and table[-1][1] == i and table[-1][2:] == entry:
+                table[-1] = (table[-1][0], i + 1) + entry
+            else:
+                table.append((i, i + 1) + entry)
+        return table
@@ -12,12 +12,15 @@ class IRInstruction:
             return f"JUMP {self.arg1}"
         if self.op == "JUMP_IF_FALSE":
             return f"JUMP_IF_FALSE {self.arg2} {self.arg1}"
+        if self.op == "JUMP_IF_TRUE":
+            return f"JUMP_IF_TRUE {self.arg2} {self.arg1}"
         if self.op == "CONST":
             return f"{self.result} = {self.arg1!r}"
         if self.op == "ASSIGN":
             return f"{self.result} = {self.arg1}"
         if self.op == "PRINT":
-            return f"PRINT {self.arg1}"
+            values = self.arg1 if isinstance(self.arg1, list) else [self.arg1]
+            return f"PRINT {', '.join(map(str, values))}"
         if self.op == "RETURN":
             return f"RETURN {self.arg1}"
         if self.op == "CALL":
@@ -41,6 +44,13 @@ class IRGenerator:
         self.instructions = []
         self.temp_count = 0
         self.label_count = 0
+        # (continue label, end label) of each enclosing loop.
+        self.loop_labels = []
+        # Node types without an IR lowering, which generate() skips, and
+        # the program's own variable names; compiler.register_vm refuses
+        # code with the former or with a name that looks like a temp.
+        self.unsupported = []
+        self.names = set()
 
     def new_temp(self):
         self.temp_count += 1
@@ -54,6 +64,7 @@ class IRGenerator:
         method = getattr(self, f"visit_{type(node).__name__}", None)
         if method:
             return method(node)
+        self.unsupported.append(type(node).__name__)
 
     def visit_Program(self, node):
         for stmt in node.statements:
@@ -62,10 +73,22 @@ class IRGenerator:
 
     def visit_Assignment(self, node):
         value = self.generate(node.value)
+        self.names.add(node.name)
         self.instructions.append(
             IRInstruction("ASSIGN", value, None, node.name)
         )
 
+    def visit_AugmentedAssignment(self, node):
+        value = self.generate(node.value)
+        self.names.add(node.name)
+        temp = self.new_temp()
+        self.instructions.append(
+            IRInstruction(node.operator, node.name, value, temp)
+        )
+        self.instructions.append(
+            IRInstruction("ASSIGN", temp, None, node.name)
+        )
+
     def visit_Number(self, node):
         temp = self.new_temp()
         self.instructions.append(
@@ -95,6 +118,7 @@ class IRGenerator:
         return temp
 
     def visit_Variable(self, node):
+        self.names.add(node.name)
         return node.name
 
     def visit_BinaryOp(self, node):
@@ -107,15 +131,48 @@ class IRGenerator:
         )
         return temp
 
+    def visit_UnaryOp(self, node):
+        operand = self.generate(node.operand)
+        op = {"-": "UNARY_NEG", "not": "UNARY_NOT"}.get(node.operator)
+        if op is None:
+            self.unsupported.append(f"UnaryOp {node.operator}")
+        temp = self.new_temp()
+        self.instructions.append(
+            IRInstruction(op, operand, None, temp)
+        )
+        return temp
+
+    def visit_BoolOp(self, node):
+        # The right operand is only evaluated when the left one does not
+        # decide the result; either way the result is one of them.
+        temp = self.new_temp()
+        end_label = self.new_label()
+        self.instructions.append(
+            IRInstruction("ASSIGN", self.generate(node.left), None, temp)
+        )
+        jump = "JUMP_IF_FALSE" if node.operator == "and" else "JUMP_IF_TRUE"
+        self.instructions.append(
+            IRInstruction(jump, end_label, temp)
+        )
+        self.instructions.append(
+            IRInstruction("ASSIGN", self.generate(node.right), None, temp)
+        )
+        self.instructions.append(
+            IRInstruction("LABEL", end_label)
+        )
+        return temp
+
+    def visit_BitwiseOp(self, node):
+        return self.visit_BinaryOp(node)
+
     def visit_Print(self, node):
         values = getattr(node, "values", None)
         if values is None:
             values = [getattr(node, "value", None)]
-        for value_node in values:
-            value = self.generate(value_node)
-            self.instructions.append(
-                IRInstruction("PRINT", value)
-            )
+        operands = [self.generate(value_node) for value_node in values]
+        self.instructions.append(
+            IRInstruction("PRINT", operands)
+        )
 
     def visit_ExprStatement(self, node):
         return self.generate(node.expr)
@@ -172,8 +229,10 @@ class IRGenerator:
             IRInstruction("JUMP_IF_FALSE", end_label, condition)
         )
 
+        self.loop_labels.append((start_label, end_label))
         for stmt in node.body:
             self.generate(stmt)
+        self.loop_labels.pop()
 
         self.instructions.append(
             IRInstruction("JUMP", start_label)
@@ -188,8 +247,24 @@ class IRGenerator:
             IRInstruction("DEFINE_FUNCTION", node.name, node, None)
         )
 
+    def visit_Break(self, node):
+        self.instructions.append(
+            IRInstruction("JUMP", self.loop_labels[-1][1])
+        )
+
+    def visit_Continue(self, node):
+        self.instructions.append(
+            IRInstruction("JUMP", self.loop_labels[-1][0])
+        )
+
+    def visit_Pass(self, node):
+        pass
+
     def visit_Return(self, node):
-        value = self.generate(node.value)
+        if node.value is None:
+            value = self.visit_NoneLiteral(node)
+        else:
+            value = self.generate(node.value)
         self.instructions.append(
             IRInstruction("RETURN", value)
         )
@@ -221,6 +296,7 @@ class IRGenerator:
 
     def visit_ListAccess(self, node):
         index = self.generate(node.index)
+        self.names.add(node.name)
 
         temp = self.new_temp()
 
@@ -246,8 +322,10 @@ class IRGenerator:
         end = self.generate(node.end)
 
         loop_var = node.var_name
+        self.names.add(loop_var)
 
         start_label = self.new_label()
+        next_label = self.new_label()
         end_label = self.new_label()
 
         self.instructions.append(
@@ -268,8 +346,14 @@ class IRGenerator:
             IRInstruction("JUMP_IF_FALSE", end_label, cond_temp)
         )
 
+        self.loop_labels.append((next_label, end_label))
         for stmt in node.body:
             self.generate(stmt)
+        self.loop_labels.pop()
+
+        self.instructions.append(
+            IRInstruction("LABEL", next_label)
+        )
 
         one_temp = self.new_temp()
         self.instructions.append(
@@ -291,4 +375,122 @@ class IRGenerator:
 
         self.instructions.append(
             IRInstruction("LABEL", end_label)
-        )
\ No newline at end of file
+        )
+
+    def visit_ForInLoop(self, node):
+        """``for v in range(...)`` with a constant step, counting in a temp.
+
+        The loop variable is assigned from the counter on every iteration,
+        so rebinding it in the body does not change the iteration, as in
+        Python.  Other iterables have no IR lowering.
+        """
+        bounds = self._range_bounds(node)
+        if bounds is None:
+            self.unsupported.append("ForInLoop")
+            return
+        start, end, step = bounds
+        self.names.add(node.var_name)
+
+        counter = self.new_temp()
+        self.instructions.append(
+            IRInstruction("ASSIGN", start, None, counter)
+        )
+
+        start_label = self.new_label()
+        next_label = self.new_label()
+        end_label = self.new_label()
+
+        self.instructions.append(
+            IRInstruction("LABEL", start_label)
+        )
+
+        cond_temp = self.new_temp()
+        self.instructions.append(
+            IRInstruction("<" if step > 0 else ">", counter, end, cond_temp)
+        )
+
+        self.instructions.append(
+            IRInstruction("JUMP_IF_FALSE", end_label, cond_temp)
+        )
+
+        self.instructions.append(
+            IRInstruction("ASSIGN", counter, None, node.var_name)
+        )
+
+        self.loop_labels.append((next_label, end_label))
+        for stmt in node.body:
+            self.generate(stmt)
+        self.loop_labels.pop()
+
+        self.instructions.append(
+            IRInstruction("LABEL", next_label)
+        )
+
+        step_temp = self.new_temp()
+        self.instructions.append(
+            IRInstruction("CONST", step, None, step_temp)
+        )
+
+        inc_temp = self.new_temp()
+        self.instructions.append(
+            IRInstruction("+", counter, step_temp, inc_temp)
+        )
+
+        self.instructions.append(
+            IRInstruction("ASSIGN", inc_temp, None, counter)
+        )
+
+        self.instructions.append(
+            IRInstruction("JUMP", start_label)
+        )
+
+        self.instructions.append(
+            IRInstruction("LABEL", end_label)
+        )
+
+    def _range_bounds(self, node):
+        """(start, end, step) operands of a ``range`` loop, or None.
+
+        Bounds go through ``int`` as the VM's range does; the step must be
+        a non-zero integer literal.
+        """
+        from compiler.ast_nodes import RangeExpr, Number, UnaryOp
+
+        iterable = node.iterable
+        if type(iterable) is not RangeExpr or isinstance(node.var_name, list):
+            return None
+        step = 1
+        literal = iterable.step
+        if literal is not None:
+            negate = type(literal) is UnaryOp and literal.operator == "-"
+            if negate:
+                literal = literal.operand
+            if type(literal) is not Number or type(literal.value) is not int or not literal.value:
+                return None
+            step = -literal.value if negate else literal.value
+        start = self._int_operand(iterable.start)
+        end = self._int_operand(iterable.stop)
+        return start, end, step
+
+    def visit_RangeExpr(self, node):
+        args = [self.generate(node.start), self.generate(node.stop)]
+        if node.step is not None:
+            args.append(self.generate(node.step))
+
+        temp = self.new_temp()
+        self.instructions.append(
+            IRInstruction("CALL", "range", args, temp)
+        )
+        return temp
+
+    def _int_operand(self, node):
+        from compiler.ast_nodes import Number
+
+        value = self.generate(node)
+        if type(node) is Number and type(node.value) is int:
+            return value
+        temp = self.new_temp()
+        self.instructions.append(
+            IRInstruction("CALL", "int", [value], temp)
+        )
+        return temp
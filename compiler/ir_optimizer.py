@@ -33,10 +33,6 @@ class IROptimizer:
                 return True, self._BINARY_OPS[op](left, right)
             if op in self._COMPARE_OPS:
                 return True, self._COMPARE_OPS[op](left, right)
-            if op == "BOOL_AND":
-                return True, bool(left and right)
-            if op == "BOOL_OR":
-                return True, bool(left or right)
         except Exception:
             return False, None
         return False, None
@@ -58,12 +54,16 @@ class IROptimizer:
         for instr in instructions:
             op = instr.op
 
+            if op == "LABEL":
+                # Jumps meet here, so nothing assigned before is known.
+                constants.clear()
+
             if op == "CONST":
                 constants[instr.result] = instr.arg1
                 optimized.append(instr)
                 continue
 
-            if op in self._BINARY_OPS or op in self._COMPARE_OPS or op in ("BOOL_AND", "BOOL_OR"):
+            if op in self._BINARY_OPS or op in self._COMPARE_OPS:
                 if isinstance(instr.arg1, str) and isinstance(instr.arg2, str):
                     if instr.arg1 in constants and instr.arg2 in constants:
                         ok, folded = self._fold_binary(op, constants[instr.arg1], constants[instr.arg2])
@@ -21,7 +21,7 @@ class IRToBytecodeConverter:
             elif instr.op in ("<", ">", "==", "!=", "<=", ">="):
                 position += 4  
             elif instr.op == "PRINT":
-                position += 2   
+                position += len(instr.arg1) + 1
             elif instr.op == "JUMP":
                 position += 1
             elif instr.op == "JUMP_IF_FALSE":
@@ -100,11 +100,12 @@ class IRToBytecodeConverter:
                 )
 
             elif instr.op == "PRINT":
+                for value in instr.arg1:
+                    self.bytecode.append(
+                        Instruction("LOAD_VAR", value)
+                    )
                 self.bytecode.append(
-                    Instruction("LOAD_VAR", instr.arg1)
-                )
-                self.bytecode.append(
-                    Instruction("PRINT")
+                    Instruction("PRINT", len(instr.arg1))
                 )
 
             elif instr.op == "DEFINE_FUNCTION":
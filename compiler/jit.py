@@ -1,31 +1,480 @@
+import collections
+import marshal
+import threading
+import time
+
 JIT_THRESHOLD = 10
+# Guard failures a specialised function may take before it is thrown away
+# and recompiled from the wider type profile.
+JIT_MAX_BAILOUTS = 8
+# Back-edges a module-level loop takes in the interpreter before it is
+# compiled and entered mid-loop (on-stack replacement).
+JIT_OSR_THRESHOLD = 50
+# Translate hot code on a worker thread instead of at the call that made it hot.
+JIT_BACKGROUND = True
+# Entries kept in JITCompiler.events; later ones are only counted.
+JIT_MAX_EVENTS = 256
+# AST nodes compiled loops run before charging them to the ExecutionBudget.
+JIT_TICK_BATCH = 1000
+
+# Execution profiles a run can ask for; see jit_settings.
+JIT_PROFILES = ("interpreter", "jit", "eager")
+DEFAULT_JIT_PROFILE = "jit"
+
+
+def jit_settings(profile=DEFAULT_JIT_PROFILE, threshold=None):
+    """JITCompiler keyword arguments for execution ``profile``.
+
+    ``interpreter`` never compiles.  ``jit`` compiles functions after
+    ``threshold`` calls (JIT_THRESHOLD unless given) and module-level loops
+    after JIT_OSR_THRESHOLD back-edges.  ``eager`` compiles every function,
+    method and lambda at its first call and every module-level loop at its
+    first back-edge, synchronously.  Raises ValueError for anything else.
+    """
+    if profile not in JIT_PROFILES:
+        raise ValueError(f"Unknown execution profile {profile!r}; expected one of {JIT_PROFILES}")
+    if threshold is not None:
+        if profile != "jit":
+            raise ValueError("A JIT threshold only applies to the 'jit' profile")
+        if type(threshold) is not int or threshold < 1:
+            raise ValueError("The JIT threshold must be a positive integer")
+    if profile == "interpreter":
+        return {"threshold": float("inf"), "osr_threshold": float("inf")}
+    if profile == "eager":
+        return {"threshold": 1, "osr_threshold": 1, "background": False}
+    return {"threshold": threshold or JIT_THRESHOLD}
+
+_NONE_TYPE = type(None)
+# Parameter types a guard may check for.  Values of these types behave the
+# same under Python operators as under the interpreter's opcodes.
+SPECIALIZABLE_TYPES = (int, float, bool, str, list, dict, tuple, _NONE_TYPE)
+
+# Result types of str methods, used to type chained calls.
+_STR_METHOD_TYPES = {
+    "upper": str, "lower": str, "strip": str, "lstrip": str, "rstrip": str,
+    "replace": str, "title": str, "capitalize": str, "join": str, "format": str,
+    "split": list, "find": int, "count": int, "index": int,
+    "startswith": bool, "endswith": bool, "isdigit": bool, "isalpha": bool,
+}
+# Builtins that run a user dunder on an Instance, and the VM helper doing it.
+_INSTANCE_BUILTINS = {"str": "__jit_str__", "len": "__jit_len__"}
+_CALL_TYPES = {"len": int, "int": int, "float": float, "str": str, "bool": bool}
+
+
+class CompiledCode:
+    """JIT output for one function, lambda or loop that outlives the process.
+
+    ``code`` is the marshalled module code object defining ``def_name``;
+    ``names`` are the namespace names it needs besides its own.  A program
+    cache stores these per AST node so a later run can install them without
+    warming up or translating again.
+    """
+
+    __slots__ = ("code", "def_name", "free_names", "names", "tier")
+
+    def __init__(self, code, def_name, free_names, names, tier):
+        self.code       = code
+        self.def_name   = def_name
+        self.free_names = free_names
+        self.names      = names
+        self.tier       = tier
+
+    def __getstate__(self):
+        return (self.code, self.def_name, self.free_names, self.names, self.tier)
+
+    def __setstate__(self, state):
+        self.code, self.def_name, self.free_names, self.names, self.tier = state
+
+
 class _Untranslatable(Exception):
     """Raised by PythonCodeGen when it encounters a node it cannot translate."""
 
+
+class TypeProfile:
+    """Argument and return types seen while a function ran in the interpreter."""
+
+    __slots__ = ("arg_types", "return_types")
+
+    def __init__(self):
+        self.arg_types    = {}   # tuple of argument types -> calls
+        self.return_types = {}   # return type -> returns
+
+    def record_args(self, args):
+        key = tuple(type(a) for a in args)
+        self.arg_types[key] = self.arg_types.get(key, 0) + 1
+
+    def record_return(self, value):
+        key = type(value)
+        self.return_types[key] = self.return_types.get(key, 0) + 1
+
+    def param_types(self, n_params):
+        """Per parameter, the one specialisable type every call passed, else None."""
+        result = []
+        for i in range(n_params):
+            seen = {key[i] if i < len(key) else None for key in self.arg_types}
+            only = seen.pop() if len(seen) == 1 else None
+            result.append(only if only in SPECIALIZABLE_TYPES else None)
+        return result
+
+    def summary(self):
+        return {
+            "args": {
+                "(" + ", ".join(t.__name__ for t in key) + ")": n
+                for key, n in self.arg_types.items()
+            },
+            "returns": {t.__name__: n for t, n in self.return_types.items()},
+        }
+
+
+def _binop_type(op, left, right):
+    """Result type of ``left op right``, or None when it depends on the values."""
+    if left is int and right is int:
+        if op in ("+", "-", "*", "//", "%", "&", "|", "^", "<<", ">>"):
+            return int
+        if op == "/":
+            return float
+        return None
+    if left in (int, float) and right in (int, float):
+        return float if op in ("+", "-", "*", "/", "//", "%") else None
+    if op == "+" and left is right and left in (str, list, tuple):
+        return left
+    if op == "*" and {left, right} == {str, int}:
+        return str
+    return None
+
+
 class PythonCodeGen:
+    """Translate a FunctionDef or LambdaExpr into Python source for the JIT.
+
+    With ``param_types`` the emitted function starts with a guard checking
+    those parameter types; if it fails the call is handed to
+    ``__jit_deopt__`` before anything else runs.  Under the guard, types
+    are propagated through the body so that operations on known types
+    (prints, ``range`` loops, str/list/dict methods) are emitted as plain
+    Python, while attribute and method access on values of unknown type
+    goes through the VM's ``__jit_getattr__``/``__jit_call_method__``
+    helpers and keeps interpreter semantics.
+
+    Names that are neither locals nor in ``known_names`` make the function
+    untranslatable, so compiled code never fails on a name the interpreter
+    would have resolved.  Known names are looked up in the JIT namespace
+    when the code runs, so they may be rebound after it was compiled.
+
+    The result is a factory ``__jit_factory__(__jit_deopt__, *free)``
+    returning the function, so every compiled function gets its own
+    deoptimisation hook.  With ``closure`` (the variables a lambda
+    captured) the captured names the body reads are listed in
+    ``free_names`` after emitting, in factory parameter order.  The known
+    names the code refers to are left in ``names_used``.
+
+    When ``__jit_tick__`` is a known name (the VM binds it while running
+    under an ExecutionBudget), the emitted code charges it the number of
+    AST nodes in the body on entry and in every loop iteration (batched
+    for loops that cannot call out), so compiled code uses up the budget
+    like interpreted code does.
+    """
+
     def __init__(self):
         self._indent = 0
-    def emit_function(self, func_def):
-        self._indent = 1
+        self._env    = {}
+        self._locals = set()
+        self._known  = None
+        self._closure = None
+        self.free_names = []
+        self.names_used = set()
+        # Loop mode (emit_loop): builtins that never run interpreted code,
+        # the locals read so far, the (bound, loaded) variables to write
+        # back and reload around an escaping statement, and a count of the
+        # constructs that may run interpreted code.
+        self._pure   = None
+        self._used   = None
+        self._spill  = None
+        self._escapes = 0
+        self._temps  = 0
+        self._ticks  = False
+
+    def emit_function(self, func_def, param_types=None, known_names=None,
+                      def_name=None, closure=None):
+        from compiler.ast_nodes import LambdaExpr, Return
+        if func_def.vararg or func_def.kwarg or getattr(func_def, "kwonly_params", None):
+            return None, False
+        if type(func_def) is LambdaExpr:
+            body = func_def.body if isinstance(func_def.body, list) else [Return(func_def.body)]
+        else:
+            body = func_def.body
+        def_name = def_name or func_def.name
+        self._indent = 2
+        self._closure = closure
+        self._pure = self._used = self._spill = None
+        self.free_names = []
+        self.names_used = set()
+        param_types = list(param_types or [None] * len(func_def.params))
+        self._known = None if known_names is None else set(known_names) | {def_name}
+        self._ticks = self._known is not None and "__jit_tick__" in self._known
         body_lines = []
         try:
-            for stmt in func_def.body:
+            self._infer_types(func_def.params, body, param_types)
+            body_lines.extend(self._tick(body, entry=True))
+            body_lines.extend(self._guard(func_def, param_types))
+            for stmt in body:
                 body_lines.extend(self._stmt(stmt))
         except _Untranslatable:
             return None, False
 
         if not body_lines:
-            body_lines = ["    pass"]
+            body_lines = [self._ind("pass")]
 
         params = ", ".join(func_def.params)
-        header = f"def {func_def.name}({params}):"
-        return header + "\n" + "\n".join(body_lines), True
+        header = f"def {def_name}({params}):"
+        factory = ", ".join(["__jit_deopt__"] + self.free_names)
+        return "\n".join([
+            f"def __jit_factory__({factory}):",
+            "    " + header,
+            *body_lines,
+            f"    return {def_name}",
+        ]), True
+
+    def emit_loop(self, loop, variables, known_names=None, pure_names=()):
+        """Translate a module-level loop for on-stack replacement.
+
+        ``variables`` are the module variables at the back-edge where the
+        interpreter hands over.  The emitted ``__jit_loop__(__jit_vars__,
+        __jit_it__)`` copies those the loop uses into locals, checks their
+        types, runs the remaining iterations (a for-loop goes on with the
+        interpreter's iterator ``__jit_it__``) and writes the bound ones
+        back, also when an exception leaves the loop.  It returns False,
+        having run nothing, when a name is unbound or a type check fails.
+
+        A statement that may run interpreted code -- a call to anything but
+        ``pure_names``, a method call or print through the VM -- is preceded
+        by a write-back and followed by a reload, so that code sees, and may
+        change, the current values.
+        """
+        from compiler.ast_nodes import ForInLoop
+        names = list(variables)
+        param_types = [
+            type(v) if type(v) in SPECIALIZABLE_TYPES else None for v in variables.values()
+        ]
+        self._known = None if known_names is None else set(known_names)
+        self._ticks = self._known is not None and "__jit_tick__" in self._known
+        self._closure = None
+        self._pure = set(pure_names)
+        self.names_used = set()
+        try:
+            self._infer_types(names, [loop], param_types)
+            bound = list(dict.fromkeys(name for name, _ in self._bindings([loop])))
+            missing = [name for name in bound if name not in variables]
+            if missing:
+                raise _Untranslatable(f"Unbound at loop entry: {missing[0]}")
+            # A first pass finds the variables the loop reads; the second
+            # knows them all and can reload them after escaping statements.
+            self._used, self._spill = set(), ((), ())
+            self._loop_body(loop, ForInLoop)
+            loaded = [name for name in names if name in self._used or name in bound]
+            self._spill = (bound, loaded)
+            body_lines = self._loop_body(loop, ForInLoop)
+        except _Untranslatable:
+            return None, False
+        finally:
+            self._used = None
+
+        # Code loaded from the program cache may be entered before every
+        # name has been bound, so a missing one is treated as a guard miss.
+        lines = ["def __jit_loop__(__jit_vars__, __jit_it__):", "    try:"]
+        lines += [f"        {name} = __jit_vars__[{name!r}]" for name in loaded] or ["        pass"]
+        lines += ["    except KeyError:", "        return False"]
+        checks = self._checks(name for name in loaded)
+        if checks:
+            lines.append(f"    if {' or '.join(checks)}:")
+            lines.append("        return False")
+        if self._ticks:
+            lines.append("    __jit_ticks__ = 0")
+        lines.append("    try:")
+        lines += body_lines
+        lines.append("    finally:")
+        lines += [f"        __jit_vars__[{name!r}] = {name}" for name in bound] or ["        pass"]
+        lines.append("    return True")
+        return "\n".join(lines), True
+
+    def _loop_body(self, loop, for_in_type):
+        self._indent = 2
+        self._temps = 0
+        if type(loop) is not for_in_type:
+            return self._while_stmt(loop)
+        var = loop.var_name
+        target = ", ".join(var) if isinstance(var, list) else var
+        lines = [self._ind(f"for {target} in __jit_it__:")]
+        self._indent += 1
+        lines.extend(self._ticked_block(loop.body, loop.body, self._escapes))
+        self._indent -= 1
+        return lines
+
+    def _checks(self, names):
+        checks = []
+        for name in names:
+            typ = self._env.get(name)
+            if typ is _NONE_TYPE:
+                checks.append(f"{name} is not None")
+            elif typ is not None:
+                checks.append(f"__jit_type__({name}) is not {typ.__name__}")
+        return checks
+
+    def _guard(self, func_def, param_types):
+        checks = []
+        for param, typ in zip(func_def.params, param_types):
+            if typ is _NONE_TYPE:
+                checks.append(f"{param} is not None")
+            elif typ is not None:
+                checks.append(f"__jit_type__({param}) is not {typ.__name__}")
+        if not checks:
+            return []
+        args = "".join(f", {p}" for p in func_def.params)
+        return [
+            self._ind(f"if {' or '.join(checks)}:"),
+            self._ind(f"    return __jit_deopt__({args[2:]})"),
+        ]
+
+    # ------------------------------------------------------------------
+    # Type inference.  Every local gets the single type all of its
+    # bindings produce, or None.  Types only ever widen to None, so the
+    # fixed point is reached quickly.
+    # ------------------------------------------------------------------
+
+    def _infer_types(self, params, body, param_types):
+        self._env = dict(zip(params, param_types))
+        self._locals = set(params)
+        bindings = list(self._bindings(body))
+        self._locals.update(name for name, _ in bindings)
+        changed = True
+        while changed:
+            changed = False
+            for name, node in bindings:
+                typ = self._bound_type(name, node)
+                if name not in self._env:
+                    self._env[name] = typ
+                    changed = True
+                elif self._env[name] is not None and self._env[name] is not typ:
+                    self._env[name] = None
+                    changed = True
+
+    def _bindings(self, stmts):
+        """(name, binding node) for every local bound in ``stmts``."""
+        from compiler.ast_nodes import (
+            Assignment, AugmentedAssignment, IfStatement, WhileLoop,
+            ForInLoop, ForLoop,
+        )
+        for node in stmts:
+            t = type(node)
+            if t is Assignment or t is AugmentedAssignment:
+                yield node.name, node
+            elif t is ForInLoop or t is ForLoop:
+                if isinstance(node.var_name, list):
+                    for name in node.var_name:
+                        yield name, None
+                else:
+                    yield node.var_name, node
+                yield from self._bindings(node.body)
+            elif t is WhileLoop:
+                yield from self._bindings(node.body)
+            elif t is IfStatement:
+                yield from self._bindings(node.body)
+                yield from self._bindings(node.else_body or [])
+
+    def _bound_type(self, name, node):
+        from compiler.ast_nodes import Assignment, AugmentedAssignment, ForInLoop, ForLoop
+        t = type(node)
+        if t is Assignment:
+            return self._type(node.value)
+        if t is AugmentedAssignment:
+            return _binop_type(node.operator, self._env.get(name), self._type(node.value))
+        if t is ForInLoop:
+            return self._element_type(node.iterable)
+        if t is ForLoop:
+            return int
+        return None
+
+    def _element_type(self, iterable):
+        from compiler.ast_nodes import RangeExpr, FunctionCall
+        if type(iterable) is RangeExpr:
+            return int
+        if type(iterable) is FunctionCall and iterable.name == "range":
+            return int
+        return str if self._type(iterable) is str else None
+
+    def _type(self, node):
+        from compiler.ast_nodes import (
+            Number, Float, String, BoolLiteral, NoneLiteral,
+            Variable, BinaryOp, UnaryOp, Compare, BoolOp,
+            FunctionCall, ListLiteral, ListAccess, MethodCall, MethodCallExpr,
+            ListComprehension,
+        )
+        t = type(node)
+        if t is Number:
+            return type(node.value)
+        if t is Float:
+            return float
+        if t is String:
+            return str
+        if t is BoolLiteral:
+            return bool
+        if t is NoneLiteral:
+            return _NONE_TYPE
+        if t is Variable:
+            return self._env.get(node.name)
+        if t is BinaryOp:
+            return _binop_type(node.operator, self._type(node.left), self._type(node.right))
+        if t is UnaryOp:
+            if node.operator == "not":
+                return bool
+            operand = self._type(node.operand)
+            return operand if operand in (int, float) else None
+        if t is Compare:
+            return bool
+        if t is BoolOp:
+            left = self._type(node.left)
+            return left if left is self._type(node.right) else None
+        if t is FunctionCall:
+            return _CALL_TYPES.get(node.name)
+        if t is ListLiteral or t is ListComprehension:
+            return list
+        if t is ListAccess:
+            return str if self._env.get(node.name) is str else None
+        if t is MethodCall or t is MethodCallExpr:
+            receiver = self._receiver_type(node)
+            return _STR_METHOD_TYPES.get(node.method) if receiver is str else None
+        return None
+
+    def _receiver_type(self, node):
+        from compiler.ast_nodes import MethodCall
+        if type(node) is MethodCall:
+            if isinstance(node.obj, str):
+                return self._env.get(node.obj)
+            return self._type(node.obj)
+        return self._type(node.obj_expr)
+
+    def _name(self, name):
+        if name in self._locals:
+            if self._used is not None:
+                self._used.add(name)
+            return name
+        if self._closure is not None and name in self._closure:
+            if name not in self.free_names:
+                self.free_names.append(name)
+            return name
+        if self._known is not None and name not in self._known:
+            raise _Untranslatable(f"Unresolved name: {name}")
+        self.names_used.add(name)
+        return name
+
+    # ------------------------------------------------------------------
+    # Emission.
+    # ------------------------------------------------------------------
 
     def _stmt(self, node):
         from compiler.ast_nodes import (
             Assignment, AugmentedAssignment, Return,
             IfStatement, WhileLoop, ForInLoop, ForLoop,
-            Print, Break, Continue,
+            Print, Break, Continue, Pass, ExprStatement,
             FunctionCall, IndexAssignment, AttributeAssignment,
             AttributeAugAssignment, IndexAugAssignment,
         )
@@ -38,31 +487,33 @@ class PythonCodeGen:
             return [self._ind(f"{node.name} {node.operator}= {self._expr(node.value)}")]
 
         if t is AttributeAugAssignment:
-            obj = node.obj if isinstance(node.obj, str) else self._expr(node.obj)
-            return [self._ind(f"{obj}.{node.attr} {node.operator}= {self._expr(node.value)}")]
+            obj = self._obj(node.obj)
+            current = self._attr(node.obj, obj, node.attr)
+            value = f"({current} {node.operator} {self._expr(node.value)})"
+            return [self._ind(self._set_attr(node.obj, obj, node.attr, value))]
 
         if t is IndexAugAssignment:
             return [self._ind(
-                f"{node.name}[{self._expr(node.index)}] "
+                f"{self._name(node.name)}[{self._expr(node.index)}] "
                 f"{node.operator}= {self._expr(node.value)}"
             )]
 
         if t is IndexAssignment:
             return [self._ind(
-                f"{node.name}[{self._expr(node.index)}] = {self._expr(node.value)}"
+                f"{self._name(node.name)}[{self._expr(node.index)}] = {self._expr(node.value)}"
             )]
 
         if t is AttributeAssignment:
-            obj = node.obj if isinstance(node.obj, str) else self._expr(node.obj)
-            return [self._ind(f"{obj}.{node.attr} = {self._expr(node.value)}")]
+            obj = self._obj(node.obj)
+            value = self._expr(node.value)
+            return [self._ind(self._set_attr(node.obj, obj, node.attr, value))]
 
         if t is Return:
             val = self._expr(node.value) if node.value is not None else "None"
             return [self._ind(f"return {val}")]
 
         if t is Print:
-            args_src = ", ".join(self._expr(v) for v in node.values)
-            return [self._ind(f"__jit_print__({args_src})")]
+            return [self._ind(self._print(node.values))]
 
         if t is Break:
             return [self._ind("break")]
@@ -70,6 +521,9 @@ class PythonCodeGen:
         if t is Continue:
             return [self._ind("continue")]
 
+        if t is Pass:
+            return [self._ind("pass")]
+
         if t is IfStatement:
             return self._if_stmt(node)
 
@@ -85,48 +539,199 @@ class PythonCodeGen:
         if t is FunctionCall:
             return [self._ind(self._expr(node))]
 
+        if t is ExprStatement:
+            return [self._ind(self._expr(node.expr))]
+
         raise _Untranslatable(f"Unsupported statement: {type(node).__name__}")
 
+    def _print(self, values):
+        # The interpreter formats each value with VirtualMachine._fmt; for
+        # ints, bools and strs that is plain str(), so skip the call back.
+        if all(self._type(v) in (int, bool, str) for v in values):
+            if len(values) == 1:
+                return f"__jit_emit__({self._expr(values[0])})"
+            parts = ", ".join(
+                self._expr(v) if self._type(v) is str else f"str({self._expr(v)})"
+                for v in values
+            )
+            return f"__jit_emit__(' '.join(({parts},)))"
+        args_src = ", ".join(self._expr(v) for v in values)
+        self._escapes += 1
+        return f"__jit_print__({args_src})"
+
+    def _header(self, node, emit=None):
+        """(lines to run first, source) for the expression in a statement header.
+
+        In a loop compiled by ``emit_loop`` an expression that may run
+        interpreted code is evaluated into a temporary between a write-back
+        and a reload; otherwise there are no lines to run first.
+        """
+        before = self._escapes
+        src = (emit or self._expr)(node)
+        if self._spill is None or self._escapes == before:
+            return [], src
+        self._temps += 1
+        temp = f"__jit_t{self._temps}__"
+        return self._spilled([self._ind(f"{temp} = {src}")], ()), temp
+
+    def _spilled(self, lines, assigned):
+        bound, loaded = self._spill
+        return (
+            [self._ind(f"__jit_vars__[{name!r}] = {name}") for name in bound]
+            + lines
+            + [self._ind(f"{name} = __jit_vars__[{name!r}]")
+               for name in loaded if name not in assigned]
+        )
+
     def _if_stmt(self, node):
-        lines = [self._ind(f"if {self._expr(node.condition)}:")]
+        lines, cond = self._header(node.condition)
+        lines.append(self._ind(f"if {cond}:"))
         self._indent += 1
-        for s in node.body:
-            lines.extend(self._stmt(s))
+        lines.extend(self._block(node.body))
         self._indent -= 1
         if node.else_body:
             lines.append(self._ind("else:"))
             self._indent += 1
-            for s in node.else_body:
-                lines.extend(self._stmt(s))
+            lines.extend(self._block(node.else_body))
             self._indent -= 1
         return lines
 
     def _while_stmt(self, node):
-        lines = [self._ind(f"while {self._expr(node.condition)}:")]
+        escapes = self._escapes
         self._indent += 1
-        for s in node.body:
-            lines.extend(self._stmt(s))
+        test, cond = self._header(node.condition)
+        body = self._block(node.body)
+        tick = self._tick([node.condition, *node.body], each=self._escapes != escapes)
         self._indent -= 1
-        return lines
+        if test:
+            # Re-evaluated at the top of every iteration, continue included.
+            lines = [self._ind("while True:")] + tick + test + [
+                self._ind(f"    if not {cond}:"),
+                self._ind("        break"),
+            ]
+        else:
+            lines = [self._ind(f"while {cond}:")] + tick
+        return lines + body
 
     def _for_in_stmt(self, node):
-        lines = [self._ind(f"for {node.var_name} in {self._expr(node.iterable)}:")]
+        target = ", ".join(node.var_name) if isinstance(node.var_name, list) else node.var_name
+        escapes = self._escapes
+        lines, iterable = self._header(node.iterable, self._iterable)
+        lines.append(self._ind(f"for {target} in {iterable}:"))
         self._indent += 1
-        for s in node.body:
-            lines.extend(self._stmt(s))
+        lines.extend(self._ticked_block(node.body, node.body, escapes))
         self._indent -= 1
         return lines
 
     def _for_stmt(self, node):
-        start = self._expr(node.start)
-        end   = self._expr(node.end)
-        lines = [self._ind(f"for {node.var_name} in range({start}, {end}):")]
+        escapes = self._escapes
+        lines, iterable = self._header(node, lambda n: self._range([n.start, n.end]))
+        lines.append(self._ind(f"for {node.var_name} in {iterable}:"))
         self._indent += 1
-        for s in node.body:
-            lines.extend(self._stmt(s))
+        lines.extend(self._ticked_block(node.body, node.body, escapes))
         self._indent -= 1
         return lines
 
+    def _ticked_block(self, nodes, body, escapes):
+        """A loop body's lines, preceded by the tick charging ``nodes``.
+
+        ``escapes`` is ``_escapes`` before the loop header was emitted: a
+        loop that may run other code ticks every iteration.
+        """
+        block = self._block(body)
+        return self._tick(nodes, each=self._escapes != escapes) + block
+
+    def _tick(self, nodes, entry=False, each=False):
+        """Lines charging one run of ``nodes`` to ``__jit_tick__``, if ticking.
+
+        Loop iterations add up in the local ``__jit_ticks__``, which is
+        charged once it exceeds JIT_TICK_BATCH.  With ``each`` (the loop
+        calls code that may take any time, e.g. ``time.sleep``) every
+        iteration is charged, so the budget's clock is read every time.
+        """
+        if not self._ticks:
+            return []
+        from compiler.ast_nodes import ASTNode
+        size = 0
+        pending = list(nodes)
+        while pending:
+            item = pending.pop()
+            if isinstance(item, ASTNode):
+                size += 1
+                pending.extend(vars(item).values())
+            elif isinstance(item, (list, tuple)):
+                pending.extend(item)
+        self.names_used.add("__jit_tick__")
+        if entry:
+            return [self._ind(f"__jit_tick__({size})"), self._ind("__jit_ticks__ = 0")]
+        if each:
+            return [self._ind(f"__jit_tick__({size})")]
+        return [
+            self._ind(f"__jit_ticks__ += {size}"),
+            self._ind(f"if __jit_ticks__ > {JIT_TICK_BATCH}:"),
+            self._ind("    __jit_tick__(__jit_ticks__)"),
+            self._ind("    __jit_ticks__ = 0"),
+        ]
+
+    def _block(self, stmts):
+        from compiler.ast_nodes import (
+            Assignment, AugmentedAssignment, IfStatement, WhileLoop, ForInLoop, ForLoop,
+        )
+        lines = []
+        for s in stmts:
+            before = self._escapes
+            stmt_lines = self._stmt(s)
+            t = type(s)
+            if (
+                self._spill is not None
+                and self._escapes != before
+                and t not in (IfStatement, WhileLoop, ForInLoop, ForLoop)
+            ):
+                assigned = (s.name,) if t is Assignment or t is AugmentedAssignment else ()
+                stmt_lines = self._spilled(stmt_lines, assigned)
+            lines.extend(stmt_lines)
+        return lines or [self._ind("pass")]
+
+    def _iterable(self, node):
+        from compiler.ast_nodes import RangeExpr, FunctionCall
+        if type(node) is RangeExpr:
+            parts = [node.start, node.stop] + ([node.step] if node.step is not None else [])
+            return self._range(parts)
+        if type(node) is FunctionCall and node.name == "range":
+            return self._range(node.args)
+        return self._expr(node)
+
+    def _range(self, arg_nodes):
+        # The namespace's range() converts its arguments with int() and
+        # builds a list; with int arguments a loop can use range itself.
+        args = ", ".join(self._expr(a) for a in arg_nodes)
+        if all(self._type(a) is int for a in arg_nodes):
+            return f"__range__({args})"
+        return f"range({args})"
+
+    def _obj(self, obj):
+        return self._name(obj) if isinstance(obj, str) else self._expr(obj)
+
+    def _obj_type(self, obj):
+        return self._env.get(obj) if isinstance(obj, str) else self._type(obj)
+
+    def _attr(self, obj_node, obj, attr):
+        if self._obj_type(obj_node) is not None:
+            return f"getattr({obj}, {attr!r}, None)"
+        return f"__jit_getattr__({obj}, {attr!r})"
+
+    def _set_attr(self, obj_node, obj, attr, value):
+        if not isinstance(obj_node, str):
+            # The receiver would be evaluated twice for an augmented store.
+            raise _Untranslatable("Attribute store on an expression")
+        return f"__jit_setattr__({obj}, {attr!r}, {value})"
+
+    def _method(self, receiver_type, obj, method, args):
+        if receiver_type is not None:
+            return f"{obj}.{method}({args})"
+        self._escapes += 1
+        return f"__jit_call_method__({obj}, {method!r}{', ' if args else ''}{args})"
+
     def _expr(self, node):
         from compiler.ast_nodes import (
             Number, Float, String, BoolLiteral, NoneLiteral,
@@ -149,37 +754,56 @@ class PythonCodeGen:
             return "None"
 
         if t is Variable:
-            return node.name
+            return self._name(node.name)
 
         if t is BinaryOp:
             return f"({self._expr(node.left)} {node.operator} {self._expr(node.right)})"
         if t is UnaryOp:
-            return f"({node.operator}{self._expr(node.operand)})"
+            return f"({node.operator} {self._expr(node.operand)})"
         if t is Compare:
-            return f"({self._expr(node.left)} {node.operator} {self._expr(node.right)})"
+            left, right = self._expr(node.left), self._expr(node.right)
+            if node.operator in ("==", "!=") and (
+                    self._type(node.left) is None or self._type(node.right) is None):
+                # A user Instance compares through its __eq__/__ne__.
+                self._escapes += 1
+                return f"__jit_compare__({node.operator!r}, {left}, {right})"
+            return f"({left} {node.operator} {right})"
         if t is BoolOp:
             return f"({self._expr(node.left)} {node.operator} {self._expr(node.right)})"
 
         if t is FunctionCall:
             args = ", ".join(self._expr(a) for a in node.args)
-            return f"{node.name}({args})"
+            if (node.name in _INSTANCE_BUILTINS and len(node.args) == 1
+                    and node.name not in self._locals
+                    and self._type(node.args[0]) not in SPECIALIZABLE_TYPES):
+                # str() and len() of a user Instance run its __str__/__len__.
+                self._escapes += 1
+                return f"{_INSTANCE_BUILTINS[node.name]}({args})"
+            if self._pure is None or node.name not in self._pure or node.name in self._locals:
+                self._escapes += 1
+            if node.name in self._locals or (self._closure is not None and node.name in self._closure):
+                # A variable may hold a user function, which is a name to
+                # the VM rather than a Python callable.
+                callee = self._name(node.name)
+                return f"__jit_call__({callee}, {args})" if args else f"__jit_call__({callee})"
+            return f"{self._name(node.name)}({args})"
 
         if t is ListLiteral:
             elems = ", ".join(self._expr(e) for e in node.elements)
             return f"[{elems}]"
         if t is ListAccess:
-            return f"{node.name}[{self._expr(node.index)}]"
+            return f"{self._name(node.name)}[{self._expr(node.index)}]"
 
         if t is AttributeAccess:
-            obj = node.obj if isinstance(node.obj, str) else self._expr(node.obj)
-            return f"{obj}.{node.attr}"
+            return self._attr(node.obj, self._obj(node.obj), node.attr)
         if t is MethodCall:
-            obj  = node.obj if isinstance(node.obj, str) else self._expr(node.obj)
             args = ", ".join(self._expr(a) for a in node.args)
-            return f"{obj}.{node.method}({args})"
+            return self._method(self._receiver_type(node), self._obj(node.obj), node.method, args)
         if t is MethodCallExpr:
             args = ", ".join(self._expr(a) for a in node.args)
-            return f"{self._expr(node.obj_expr)}.{node.method}({args})"
+            return self._method(
+                self._receiver_type(node), self._expr(node.obj_expr), node.method, args
+            )
 
         if t is RangeExpr:
             parts = [self._expr(node.start), self._expr(node.stop)]
@@ -188,78 +812,459 @@ class PythonCodeGen:
             return f"range({', '.join(parts)})"
 
         if t is ListComprehension:
-            expr_s = self._expr(node.expr)
-            it_s   = self._expr(node.iterable)
-            cond_s = f" if {self._expr(node.condition)}" if node.condition else ""
-            return f"[{expr_s} for {node.var_name} in {it_s}{cond_s}]"
+            return self._comprehension(node)
 
         raise _Untranslatable(f"Unsupported expression: {type(node).__name__}")
 
+    def _comprehension(self, node):
+        if isinstance(node.var_name, list):
+            raise _Untranslatable("Comprehension with a tuple target")
+        it_s = self._iterable(node.iterable)
+        var = node.var_name
+        saved_type, was_local = self._env.get(var), var in self._locals
+        self._env[var] = self._element_type(node.iterable)
+        self._locals.add(var)
+        try:
+            expr_s = self._expr(node.expr)
+            cond_s = f" if {self._expr(node.condition)}" if node.condition else ""
+        finally:
+            self._env[var] = saved_type
+            if not was_local:
+                self._locals.discard(var)
+        return f"[{expr_s} for {var} in {it_s}{cond_s}]"
+
     def _ind(self, text):
         return "    " * self._indent + text
 
+
+class _CompileJob:
+    """One translation for JITCompiler.
+
+    ``translate(codegen)`` returns the CompiledCode or None and may run on
+    the worker thread; ``finish(entry)`` installs it on the interpreter's
+    thread and its return value becomes ``result``.
+    """
+
+    __slots__ = ("key", "name", "translate", "finish", "entry", "seconds", "result")
+
+    def __init__(self, key, name, translate, finish):
+        self.key       = key
+        self.name      = name
+        self.translate = translate
+        self.finish    = finish
+        self.entry     = None
+        self.seconds   = 0.0
+        self.result    = None
+
+
 class JITCompiler:
-    def __init__(self, threshold=JIT_THRESHOLD):
-        self.threshold   = threshold
+    """Hot-code compiler with two tiers.
+
+    While code is interpreted, the VM reports each call's arguments and
+    return value here (``record_call``/``record_return``).  After
+    ``threshold`` calls it is compiled: tier 2 when some parameters always
+    had one specialisable type, with a guard on them; tier 1 otherwise.
+    A guard failure is a bailout: the call runs in the interpreter and,
+    after ``max_bailouts`` of them, the compiled code is dropped so the
+    function re-profiles and recompiles with the wider types.
+
+    Functions are keyed by name; methods and lambdas, which have no unique
+    name, by their AST node, with a display name for the stats.
+
+    Module-level loops are not called, so the VM counts their back-edges
+    instead and, after ``osr_threshold`` of them, has ``compile_loop``
+    translate the rest of the loop and switches to it mid-loop.
+
+    All compiled code shares one module namespace, ``namespace``.  The VM
+    ``link``s each of its functions and classes there to a callable that
+    runs it in the interpreter; compiling a function rebinds its name to
+    the compiled code and dropping the code binds it back.  Compiled
+    callers look their callees up there on every call, so they switch to
+    the compiled code as soon as it exists and recursive or mutually
+    recursive functions end up calling each other directly.
+
+    With ``background`` set, translation runs on a worker thread started
+    when there is work and exiting when there is none.  The interpreter
+    keeps interpreting the code meanwhile; the finished code is installed
+    on the interpreter's thread by the next ``try_get_compiled``, i.e. at
+    the next interpreted call, or the next ``compile_loop`` for a loop.
+    Without it everything compiles synchronously, which tests that need
+    deterministic tiers and stats should use.
+
+    Everything compiled is also kept as CompiledCode per AST node
+    (``persistent_code``).  Code handed back through ``preload`` is
+    installed on the first call or back-edge instead of after warming up.
+    """
+
+    def __init__(self, threshold=JIT_THRESHOLD, max_bailouts=JIT_MAX_BAILOUTS,
+                 osr_threshold=JIT_OSR_THRESHOLD, background=JIT_BACKGROUND):
+        self.threshold    = threshold
+        self.max_bailouts = max_bailouts
+        self.osr_threshold = osr_threshold
+        self.background   = background
         self._call_counts = {}
-        self._cache       = {} 
+        self._cache       = {}
+        self._profiles    = {}
+        self._names       = {}   # key -> name shown in stats
+        self._nodes       = {}   # key -> AST node compiled for it
+        self._persistent  = {}   # AST node -> CompiledCode
+        # AST node -> CompiledCode from an earlier run, not installed yet.
+        self.preloaded    = {}
+        self.namespace    = {}
+        self._links       = {}   # name -> interpreter fallback for it
+        self._rebound     = set()  # names a decorator bound to something else
 
         self._codegen = PythonCodeGen()
+        # Background compilation: jobs not installed yet by key, the
+        # worker's queue (guarded by _lock) and its finished jobs.
+        self._pending = {}
+        self._loop_jobs = {}   # loop -> its job until compile_loop returns the result
+        self._queue   = collections.deque()
+        self._done    = collections.deque()
+        self._lock    = threading.Lock()
+        self._worker_running = False
 
         self.stats = {
-            "compiled": [],  
-            "failed":   [],  
-            "counts":   {},  
+            "compiled":    [],
+            "failed":      [],
+            "counts":      {},
+            "tiers":       {},   # name -> 1 or 2, for the current code
+            "bailouts":    {},   # name -> guard failures since compiling
+            "deoptimized": [],   # names whose specialised code was dropped
+            "osr":         [],   # loops compiled for on-stack replacement
+            "compile_seconds": {},   # name -> time spent translating it
+            "queue_depth":     0,    # background jobs not installed yet
+            "max_queue_depth": 0,
+            "events_dropped":  0,
         }
+        # What happened when, in seconds since the compiler was created.
+        self.events   = []
+        self._started = time.perf_counter()
 
-    def record_call(self, func_name):
-        n = self._call_counts.get(func_name, 0) + 1
-        self._call_counts[func_name] = n
-        return n
+    def record_call(self, key, args=()):
+        """Count an interpreted call and profile its argument types.
 
-    def should_compile(self, func_name):
-        return (
-            self._call_counts.get(func_name, 0) >= self.threshold
-            and func_name not in self._cache
-        )
+        Returns the function's TypeProfile, for recording the return type.
+        """
+        n = self._call_counts.get(key, 0) + 1
+        self._call_counts[key] = n
+        profile = self._profiles.get(key)
+        if profile is None:
+            profile = self._profiles[key] = TypeProfile()
+        profile.record_args(args)
+        return profile
+
+    def profile(self, key):
+        return self._profiles.get(key)
+
+    @property
+    def enabled(self):
+        """False when neither functions nor loops can ever get hot."""
+        return self.threshold != float("inf") or self.osr_threshold != float("inf")
+
+    def link(self, name, fallback):
+        """Bind ``name`` in the namespace to ``fallback`` until it is compiled."""
+        self._links[name] = fallback
+        self._rebound.discard(name)
+        compiled = self._cache.get(name)
+        self.namespace[name] = compiled if callable(compiled) else fallback
+
+    def rebind(self, name, value):
+        """Bind ``name`` to ``value`` until it is linked again.
+
+        A decorator replaced the function of that name, so compiling the
+        function itself leaves the binding alone.
+        """
+        self._rebound.add(name)
+        self.namespace[name] = value
+        if callable(self._cache.get(name)):
+            # Compiled under its own name, so its recursive calls would
+            # skip ``value``; compile it again.
+            del self._cache[name]
+
+    def _unlink(self, key):
+        fallback = self._links.get(key)
+        if fallback is not None and key not in self._rebound:
+            self.namespace[key] = fallback
+
+    def should_compile(self, key, node=None):
+        if key in self._cache or key in self._pending:
+            return False
+        return self._call_counts.get(key, 0) >= self.threshold or node in self.preloaded
+
+    def preload(self, entries):
+        """Install CompiledCode per AST node saved by an earlier run's ``persistent_code``."""
+        self.preloaded.update(entries)
 
-    def try_compile(self, func_name, func_def_node, builtins_ns):
-        source, ok = self._codegen.emit_function(func_def_node)
-        if not ok:
-            self._mark_failed(func_name)
+    def persistent_code(self):
+        """CompiledCode per AST node for everything compiled and still in use."""
+        return dict(self._persistent)
+
+    def try_compile(self, key, node, interpret=None, name=None, closure=None):
+        """Compile ``node`` (a FunctionDef or LambdaExpr) and cache it under ``key``.
+
+        ``interpret(*args)`` runs a call in the interpreter and is what a
+        failed guard falls back to.  With ``closure`` the cached value is a
+        factory that the caller instantiates with ``__jit_deopt__`` and the
+        free variables named in its ``free_names`` (see PythonCodeGen).
+        A function keyed by name is bound under it in ``namespace``.
+        Returns the compiled function or factory, or None -- also while it
+        is being compiled in the background.
+        """
+        name = self._names.get(key) or self._display_name(name or key)
+        self._names[key] = name
+        self._nodes[key] = node
+
+        def finish(entry, seconds=None):
+            fn = entry and self._install(entry, self.namespace)
+            if fn and closure is None:
+                def deopt(*args):
+                    self.record_bailout(key, args)
+                    return interpret(*args)
+                fn = fn(deopt)
+            if not fn:
+                self._mark_failed(key)
+                return None
+            self._persistent[node] = entry
+            self._cache[key] = fn
+            if isinstance(key, str) and key not in self._rebound:
+                self.namespace[key] = fn
+            self.stats["compiled"].append(name)
+            self.stats["counts"][name] = self._call_counts.get(key, 0)
+            self.stats["tiers"][name] = entry.tier
+            self.stats["bailouts"][name] = 0
+            self._event("compile", name, tier=entry.tier, seconds=seconds,
+                        calls=self._call_counts.get(key, 0))
+            return fn
+
+        entry = self._installable(node)
+        if entry is not None:
+            return finish(entry)
+        if self._call_counts.get(key, 0) < self.threshold:
+            # Saved code that cannot be used yet; warm up as usual.
             return None
 
+        # Everything the translation reads is captured here, on the
+        # interpreter's thread.
+        profile = self._profiles.get(key)
+        param_types = profile.param_types(len(node.params)) if profile is not None else None
+        tier = 2 if param_types and any(param_types) else 1
+        # Recursive calls in a function compiled under its own name bind to
+        # the compiled function; a rebound name must reach the namespace.
+        def_name = key if isinstance(key, str) and key not in self._rebound else "__jit_code__"
+        known_names = frozenset(self.namespace)
+        free = None if closure is None else frozenset(closure)
+
+        def translate(codegen):
+            source, ok = codegen.emit_function(
+                node, param_types, known_names=known_names, def_name=def_name, closure=free,
+            )
+            return ok and self._translate(codegen, source, name, "__jit_factory__", tier)
+
+        return self._submit(key, name, translate, finish).result
+
+    def compile_loop(self, loop, variables, pure_names=(), name="<loop>"):
+        """Compile module-level ``loop`` for on-stack replacement.
+
+        ``variables`` are the module variables at the hand-over; see
+        PythonCodeGen.emit_loop for the calling convention of the result.
+        Returns the compiled ``__jit_loop__``, False if the loop cannot be
+        compiled, or None while it is being compiled in the background;
+        call again later for the result.
+        """
+        job = self._loop_jobs.get(loop)
+        if job is None:
+            name = self._names.get(loop) or self._display_name(name)
+            self._names[loop] = name
+
+            def finish(entry, seconds=None):
+                fn = entry and self._install(entry, self.namespace)
+                if not fn:
+                    self.stats["failed"].append(name)
+                    self._event("fail", name)
+                    return False
+                self._persistent[loop] = entry
+                self.stats["osr"].append(name)
+                self.stats["bailouts"].setdefault(name, 0)
+                self._event("osr", name, seconds=seconds)
+                return fn
+
+            entry = self._installable(loop)
+            if entry is not None:
+                return finish(entry)
+            variables = dict(variables)
+            known_names = frozenset(self.namespace)
+            pure_names = frozenset(pure_names)
+
+            def translate(codegen):
+                source, ok = codegen.emit_loop(
+                    loop, variables, known_names=known_names, pure_names=pure_names,
+                )
+                return ok and self._translate(codegen, source, name, "__jit_loop__", 2)
+
+            job = self._submit(loop, name, translate, finish)
+        elif self._done:
+            self._collect()
+        if job.result is None:
+            self._loop_jobs[loop] = job
+        else:
+            self._loop_jobs.pop(loop, None)
+        return job.result
+
+    def _submit(self, key, name, translate, finish):
+        """Run ``translate`` now or queue it for the worker; see _CompileJob."""
+        job = _CompileJob(key, name, translate, finish)
+        if not self.background:
+            self._run(job, self._codegen)
+            self._complete(job)
+            return job
+        self._pending[key] = job
+        depth = len(self._pending)
+        self.stats["queue_depth"] = depth
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], depth)
+        with self._lock:
+            self._queue.append(job)
+            if not self._worker_running:
+                self._worker_running = True
+                threading.Thread(target=self._work, name="pyflux-jit", daemon=True).start()
+        return job
+
+    def _work(self):
+        """Worker thread: translate queued jobs, exiting when the queue is empty."""
+        codegen = PythonCodeGen()
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._worker_running = False
+                    return
+                job = self._queue.popleft()
+            try:
+                self._run(job, codegen)
+            except Exception:
+                job.entry = None
+            self._done.append(job)
+
+    @staticmethod
+    def _run(job, codegen):
+        start = time.perf_counter()
+        job.entry = job.translate(codegen)
+        job.seconds = time.perf_counter() - start
+
+    def _collect(self):
+        """Install the code the worker has finished since the last call."""
+        while self._done:
+            job = self._done.popleft()
+            # Jobs of functions redefined meanwhile are dropped.
+            if self._pending.get(job.key) is job:
+                del self._pending[job.key]
+                self._complete(job)
+        self.stats["queue_depth"] = len(self._pending)
+
+    def _complete(self, job):
+        self.stats["compile_seconds"][job.name] = job.seconds
+        job.result = job.finish(job.entry, job.seconds)
+
+    def _installable(self, node):
+        """The preloaded CompiledCode for ``node`` if the namespace has every name it uses.
+
+        Code compiled without ``__jit_tick__`` calls would escape the
+        ExecutionBudget of a run that binds it, so it is compiled afresh.
+        """
+        entry = self.preloaded.pop(node, None)
+        if entry is None or not entry.names <= self.namespace.keys():
+            return None
+        if "__jit_tick__" in self.namespace and "__jit_tick__" not in entry.names:
+            return None
+        return entry
+
+    @staticmethod
+    def _translate(codegen, source, name, def_name, tier):
+        """CompiledCode for ``source`` just generated by ``codegen``, or None."""
         try:
-            code_obj = compile(source, f"<jit:{func_name}>", "exec")
+            code = compile(source, f"<jit:{name}>", "exec")
         except SyntaxError:
-            self._mark_failed(func_name)
             return None
+        return CompiledCode(
+            marshal.dumps(code), def_name, tuple(codegen.free_names),
+            frozenset(codegen.names_used), tier,
+        )
 
-        ns = dict(builtins_ns)
+    @staticmethod
+    def _install(entry, ns):
+        """The function ``entry``'s code defines with ``ns`` as its globals, or None."""
+        scope = {}
         try:
-            exec(code_obj, ns)
+            exec(marshal.loads(entry.code), ns, scope)
         except Exception:
-            self._mark_failed(func_name)
             return None
-
-        fn = ns.get(func_name)
+        fn = scope.get(entry.def_name)
         if not callable(fn):
-            self._mark_failed(func_name)
             return None
-
-        self._cache[func_name] = fn
-        self.stats["compiled"].append(func_name)
-        self.stats["counts"][func_name] = self._call_counts[func_name]
+        if entry.def_name == "__jit_factory__":
+            fn.free_names = entry.free_names
         return fn
 
-    def _mark_failed(self, func_name):
-        self._cache[func_name] = False 
-        self.stats["failed"].append(func_name)
+    def _display_name(self, name):
+        """``name``, numbered when another key (e.g. a second lambda) has it."""
+        taken = set(self._names.values())
+        unique, n = name, 1
+        while unique in taken:
+            n += 1
+            unique = f"{name}#{n}"
+        return unique
+
+    def record_bailout(self, key, args):
+        """Count a guard failure; drop the compiled code once it fails too often."""
+        profile = self._profiles.get(key)
+        if profile is not None:
+            profile.record_args(args)
+        name = self._names.get(key, key)
+        n = self.stats["bailouts"].get(name, 0) + 1
+        self.stats["bailouts"][name] = n
+        self._event("bailout", name, count=n)
+        if n >= self.max_bailouts and callable(self._cache.get(key)):
+            self.invalidate(key)
+
+    def invalidate(self, key):
+        """Forget the compiled code; the function warms up again from scratch."""
+        name = self._names.get(key, key)
+        self._cache.pop(key, None)
+        self._unlink(key)
+        self._persistent.pop(self._nodes.get(key), None)
+        self._call_counts[key] = 0
+        self.stats["tiers"].pop(name, None)
+        self.stats["deoptimized"].append(name)
+        self._event("deopt", name)
+
+    def forget(self, key):
+        """Drop the code, count and profile of ``key``, whose function was redefined."""
+        self._cache.pop(key, None)
+        self._pending.pop(key, None)
+        self._unlink(key)
+        self._persistent.pop(self._nodes.pop(key, None), None)
+        self._call_counts.pop(key, None)
+        self._profiles.pop(key, None)
+
+    def _mark_failed(self, key):
+        self._cache[key] = False
+        self.stats["failed"].append(self._names.get(key, key))
+        self._event("fail", self._names.get(key, key))
+
+    def _event(self, kind, name, **info):
+        """Append to ``events``; a compile or osr without ``seconds`` came from preload."""
+        if len(self.events) >= JIT_MAX_EVENTS:
+            self.stats["events_dropped"] += 1
+            return
+        event = {"at": time.perf_counter() - self._started, "event": kind, "name": str(name)}
+        event.update(info)
+        self.events.append(event)
 
 
-    def try_get_compiled(self, func_name):
-        result = self._cache.get(func_name)
+    def try_get_compiled(self, key):
+        if self._done:
+            self._collect()
+        result = self._cache.get(key)
         return result if callable(result) else None
 
-    def get_call_count(self, func_name):
-        return self._call_counts.get(func_name, 0)
\ No newline at end of file
+    def get_call_count(self, key):
+        return self._call_counts.get(key, 0)
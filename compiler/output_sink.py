@@ -0,0 +1,56 @@
+class OutputCancelled(BaseException):
+    """Raised from a sink callback to stop the running program."""
+
+
+class OutputSink:
+    """Destination for the lines a VirtualMachine prints.
+
+    With an ``on_chunk`` callback, lines are buffered until ``buffer_size``
+    characters are pending and then handed over as one newline-joined text
+    chunk, so memory stays bounded however much the program prints.
+    Concatenating every chunk gives exactly the program's output.
+
+    Without a callback every line is retained and ``getvalue()`` returns the
+    complete output, which is what non-streaming callers use.
+
+    Sub-VMs share their parent's sink, so output appears in execution order
+    without being copied between VMs.
+    """
+
+    def __init__(self, on_chunk=None, buffer_size=8192):
+        self.on_chunk    = on_chunk
+        self.buffer_size = buffer_size
+        self.lines       = 0
+        self._pending    = []
+        self._pending_chars = 0
+        self._retained   = [] if on_chunk is None else None
+        self._emitted    = False
+
+    def append(self, line):
+        line = str(line)
+        self.lines += 1
+        if self._retained is not None:
+            self._retained.append(line)
+            return
+        self._pending.append(line)
+        self._pending_chars += len(line) + 1
+        if self._pending_chars >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Hand any pending lines to ``on_chunk``."""
+        if not self._pending:
+            return
+        chunk = "\n".join(self._pending)
+        if self._emitted:
+            chunk = "\n" + chunk
+        self._emitted = True
+        self._pending = []
+        self._pending_chars = 0
+        self.on_chunk(chunk)
+
+    def getvalue(self):
+        """The retained output; empty when streaming to ``on_chunk``."""
+        if self._retained is None:
+            return ""
+        return "\n".join(self._retained)
@@ -0,0 +1,139 @@
+from compiler.bytecode import Instruction, intern_operand
+
+
+class PeepholeOptimizer:
+    """Bytecode-level rewrites applied between BytecodeGenerator and the VM.
+
+    * jump threading — a jump whose target is an unconditional JUMP goes
+      straight to that JUMP's destination, unless that JUMP is a loop
+      back-edge the VM counts for on-stack replacement, or jumps backwards
+      and the jump is conditional: the VM checks its ExecutionBudget on
+      backward JUMPs only;
+    * superinstructions — ``LOAD x; LOAD_CONST c; ADD|SUB; STORE x`` becomes
+      INC_VAR / INC_FAST, and ``COMPARE op; JUMP_IF_FALSE t`` becomes
+      COMPARE_JUMP;
+    * dead jumps — a JUMP to the very next instruction is dropped.
+
+    Sequences are only fused when no jump or exception handler lands inside
+    them.  Jump arguments and exception-table entries are remapped to the
+    new positions.  The input list is left untouched.
+    """
+
+    JUMP_OPS = ("JUMP", "JUMP_IF_FALSE", "JUMP_IF_TRUE",
+                "JUMP_IF_FALSE_OR_POP", "JUMP_IF_TRUE_OR_POP", "FOR_ITER")
+
+    _INC_FORMS = {
+        ("LOAD_VAR", "STORE_VAR"):   "INC_VAR",
+        ("LOAD_FAST", "STORE_FAST"): "INC_FAST",
+    }
+
+    def __init__(self):
+        self.fused    = 0
+        self.threaded = 0
+        self.removed  = 0
+
+    def optimize(self, instructions):
+        code = [self._copy(instr) for instr in instructions]
+        self._thread_jumps(code)
+        targets = self._targets(code)
+
+        out = []
+        new_index = [0] * (len(code) + 1)
+        i = 0
+        while i < len(code):
+            new_index[i] = len(out)
+            fused, width = self._fuse(code, i, targets)
+            if fused is not None:
+                for k in range(1, width):
+                    new_index[i + k] = len(out)
+                out.append(fused)
+                self.fused += 1
+                i += width
+                continue
+            instr = code[i]
+            if instr.opcode == "NOP" or (instr.opcode == "JUMP" and instr.argument == i + 1):
+                self.removed += 1
+            else:
+                out.append(instr)
+            i += 1
+        new_index[len(code)] = len(out)
+
+        for instr in out:
+            if instr.opcode in self.JUMP_OPS:
+                instr.argument = new_index[instr.argument]
+            elif instr.opcode == "COMPARE_JUMP":
+                op, target = instr.argument
+                instr.argument = intern_operand((op, new_index[target]))
+            if instr.handler is not None:
+                handler, depth = instr.handler
+                instr.handler = (new_index[handler], depth)
+        return out
+
+    def stats(self):
+        return {"fused": self.fused, "threaded": self.threaded, "removed": self.removed}
+
+    @staticmethod
+    def _copy(instr):
+        copy = Instruction(instr.opcode, instr.argument)
+        copy.handler = instr.handler
+        if instr.loop is not None:
+            copy.loop = instr.loop
+        return copy
+
+    def _thread_jumps(self, code):
+        for instr in code:
+            if instr.opcode not in self.JUMP_OPS or instr.argument is None:
+                continue
+            target = instr.argument
+            seen = set()
+            while (
+                target < len(code)
+                and code[target].opcode == "JUMP"
+                and code[target].loop is None
+                and (instr.opcode == "JUMP" or code[target].argument > target)
+                and target not in seen
+            ):
+                seen.add(target)
+                target = code[target].argument
+            if target != instr.argument:
+                instr.argument = target
+                self.threaded += 1
+
+    def _targets(self, code):
+        targets = set()
+        for instr in code:
+            if instr.opcode in self.JUMP_OPS:
+                targets.add(instr.argument)
+            if instr.handler is not None:
+                targets.add(instr.handler[0])
+        return targets
+
+    def _fuse(self, code, i, targets):
+        """Return (superinstruction, width) for the sequence at ``i``, or (None, 0)."""
+        first = code[i]
+        if i + 1 < len(code) and first.opcode == "COMPARE":
+            nxt = code[i + 1]
+            if nxt.opcode == "JUMP_IF_FALSE" and i + 1 not in targets:
+                return self._make("COMPARE_JUMP", (first.argument, nxt.argument), first), 2
+
+        if i + 3 < len(code):
+            load, const, op, store = code[i:i + 4]
+            form = self._INC_FORMS.get((load.opcode, store.opcode))
+            if (
+                form is not None
+                and load.argument == store.argument
+                and const.opcode == "LOAD_CONST"
+                and type(const.argument) in (int, float)
+                and op.opcode in ("ADD", "SUB")
+                and not targets.intersection((i + 1, i + 2, i + 3))
+                and load.handler == store.handler
+            ):
+                delta = const.argument if op.opcode == "ADD" else -const.argument
+                return self._make(form, (load.argument, delta), load), 4
+        return None, 0
+
+    @staticmethod
+    def _make(opcode, argument, first):
+        fused = Instruction(opcode, argument)
+        fused.handler = first.handler
+        return fused
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+
+# Bump whenever the pickled layout of CachedProgram, the AST nodes or the
+# instructions changes, so stale entries are never loaded.
+CACHE_FORMAT = 8
+PROGRAM_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def default_cache_dir():
+    """``$PYFLUX_CACHE_DIR``, else ``pyflux`` in the user's cache directory."""
+    configured = os.environ.get("PYFLUX_CACHE_DIR")
+    if configured:
+        return configured
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pyflux")
+
+
+class CachedProgram:
+    """Everything compiling one source text produced, in storable form.
+
+    ``ast`` and ``instructions`` are the front end's output.  ``bodies``
+    (the VM's CodeCache entries) and ``jit_code`` (CompiledCode per AST
+    node) grow as runs compile more of the program, and ``debug`` holds
+    the rendered AST/CFG/IR/bytecode views once asked for.  All of it is
+    pickled together, so the AST nodes used as keys stay the very nodes
+    the instructions refer to.
+    """
+
+    def __init__(self, key, ast, instructions):
+        self.key          = key
+        self.ast          = ast
+        self.instructions = instructions
+        self.bodies       = {}
+        self.jit_code     = {}
+        self.debug        = None
+        self.stored       = False
+
+    def install(self, vm):
+        """Give ``vm`` the bodies and JIT code compiled by earlier runs."""
+        vm.code_cache.preload(self.bodies)
+        if vm.jit.enabled:
+            vm.jit.preload(self.jit_code)
+
+    def absorb(self, vm):
+        """Take over what a run on ``vm`` compiled; True if it needs storing."""
+        bodies = vm.code_cache.entries()
+        if vm.jit.enabled:
+            # Saved code this run had no use for is kept for the next one.
+            jit_code = {**vm.jit.preloaded, **vm.jit.persistent_code()}
+        else:
+            jit_code = self.jit_code
+        changed = (not self.stored or bodies.keys() != self.bodies.keys()
+                   or jit_code != self.jit_code)
+        self.bodies = bodies
+        self.jit_code = jit_code
+        return changed
+
+
+class ProgramCache:
+    """Content-addressed directory of CachedPrograms with LRU eviction.
+
+    An entry is named by a hash of the source, ``CACHE_FORMAT`` and the
+    Python version, since marshalled code objects only load on the version
+    that wrote them.  Entries are written atomically; loading one refreshes
+    its modification time, and storing evicts the least recently used
+    entries until the directory holds at most ``max_bytes``.  A
+    ``max_bytes`` of 0 disables the cache.
+    """
+
+    SUFFIX = ".pyfc"
+
+    def __init__(self, directory=None, max_bytes=PROGRAM_CACHE_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+
+    def key(self, source):
+        digest = hashlib.sha256(f"{CACHE_FORMAT}\0{sys.version}\0".encode())
+        digest.update(source.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def load(self, source):
+        """The CachedProgram stored for ``source``, or None."""
+        if not self.max_bytes:
+            return None
+        path = self._path(self.key(source))
+        try:
+            with open(path, "rb") as f:
+                program = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            # Truncated, or written by an incompatible build.
+            self._remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return program
+
+    def store(self, program):
+        """Write ``program``; returns False if it cannot be stored."""
+        if not self.max_bytes:
+            return False
+        program.stored = True
+        try:
+            data = pickle.dumps(program, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError, RecursionError):
+            program.stored = False
+            return False
+        if len(data) > self.max_bytes:
+            program.stored = False
+            return False
+        tmp = None
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(program.key))
+        except OSError:
+            if tmp is not None:
+                self._remove(tmp)
+            program.stored = False
+            return False
+        self._evict()
+        return True
+
+    def clear(self):
+        for _, _, path in self._entries():
+            self._remove(path)
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "hits":      self.hits,
+            "misses":    self.misses,
+            "evictions": self.evictions,
+            "entries":   len(entries),
+            "bytes":     sum(size for _, size, _ in entries),
+        }
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def _entries(self):
+        """(mtime, size, path) of every entry; other processes may race us."""
+        entries = []
+        try:
+            listing = list(os.scandir(self.directory))
+        except OSError:
+            return entries
+        for entry in listing:
+            if not entry.name.endswith(self.SUFFIX):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            self.evictions += 1
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,471 @@
+import re
+
+from compiler.ast_nodes import Program
+from compiler.ir import IRGenerator
+from compiler.output_sink import OutputSink
+from compiler.vm import _COMPARE_OPS, _format_value
+
+
+# Names IRGenerator gives its temps; a variable spelled like one would
+# share its register.
+_TEMP_NAME = re.compile(r"t\d+\Z")
+
+# Calls deeper than this raise RecursionError instead of growing the
+# frame stack without bound.
+REGISTER_VM_MAX_DEPTH = 10000
+
+
+class UnsupportedIR(Exception):
+    """Raised for code RegisterVM cannot run exactly as VirtualMachine would."""
+
+
+def generate_ir(statements):
+    """Three-address IR for ``statements``; UnsupportedIR if it is incomplete."""
+    gen = IRGenerator()
+    ir = gen.generate(Program(statements))
+    if gen.unsupported:
+        raise UnsupportedIR(f"No IR lowering for {gen.unsupported[0]}")
+    clash = sorted(name for name in gen.names if _TEMP_NAME.match(name))
+    if clash:
+        raise UnsupportedIR(f"Variable '{clash[0]}' is spelled like an IR temp")
+    return ir
+
+
+# Every opcode of register code.  The position in this tuple is the
+# opcode's integer id; RegisterVM indexes its handler table with it.
+REGISTER_OPCODES = (
+    "MOVE", "LOAD_GLOBAL",
+    "ADD", "SUB", "MUL", "DIV", "MOD", "FLOORDIV", "POW",
+    "BITAND", "BITOR", "BITXOR", "LSHIFT", "RSHIFT",
+    "NEG", "NOT", "COMPARE",
+    "JUMP", "JUMP_IF_FALSE", "JUMP_IF_TRUE", "COMPARE_JUMP",
+    "BUILD_LIST", "INDEX", "PRINT",
+    "CALL", "CALL_BUILTIN", "RETURN",
+)
+
+REGISTER_OPCODE_IDS = {name: i for i, name in enumerate(REGISTER_OPCODES)}
+
+_BINARY_OPS = {
+    "+": "ADD", "-": "SUB", "*": "MUL", "/": "DIV", "%": "MOD", "//": "FLOORDIV", "**": "POW",
+    "&": "BITAND", "|": "BITOR", "^": "BITXOR", "<<": "LSHIFT", ">>": "RSHIFT",
+}
+_UNARY_OPS = {"UNARY_NEG": "NEG", "UNARY_NOT": "NOT"}
+
+# Builtins a CALL may name, with the bytecode VM's semantics.  As in
+# VirtualMachine._dispatch_call they win over user functions of the same
+# name.
+_BUILTINS = {
+    "len":    len,
+    "abs":    abs,
+    "int":    int,
+    "float":  float,
+    "str":    str,
+    "bool":   bool,
+    "round":  round,
+    "min":    min,
+    "max":    max,
+    "sum":    sum,
+    "list":   list,
+    "sorted": sorted,
+    "range":  lambda *a: range(*(int(x) for x in a)),
+}
+
+
+class RegisterInstruction:
+    """``c = a <op> b`` and its relatives, on register numbers.
+
+    ``a`` and ``b`` are source registers (a tuple of them for PRINT,
+    BUILD_LIST and calls), ``c`` the destination register or jump target
+    and ``arg`` a constant operand: the compare function or the callee.
+    """
+
+    __slots__ = ("op", "a", "b", "c", "arg")
+
+    def __init__(self, opcode, a=None, b=None, c=None, arg=None):
+        self.op  = REGISTER_OPCODE_IDS[opcode]
+        self.a   = a
+        self.b   = b
+        self.c   = c
+        self.arg = arg
+
+    def __repr__(self):
+        fields = [repr(v) for v in (self.a, self.b, self.c) if v is not None]
+        return f"{REGISTER_OPCODES[self.op]} {', '.join(fields)}"
+
+
+class RegisterCode:
+    """The module or one function, lowered from IR for RegisterVM.
+
+    ``registers`` is the register file a run or call starts with: the
+    parameters first, then the other variables and the temps.  Temps only
+    ever holding one constant are loaded with it here, so their CONST
+    instructions are gone.  ``slots`` maps each variable to its register.
+    """
+
+    __slots__ = ("name", "instructions", "registers", "n_params", "slots")
+
+    def __init__(self, name, n_params=0):
+        self.name         = name
+        self.instructions = []
+        self.registers    = []
+        self.n_params     = n_params
+        self.slots        = {}
+
+
+def _reads(instr):
+    """The names IR instruction ``instr`` reads."""
+    op = instr.op
+    if op in ("CONST", "LABEL", "JUMP", "DEFINE_FUNCTION"):
+        return ()
+    if op in ("JUMP_IF_FALSE", "JUMP_IF_TRUE"):
+        return (instr.arg2,)
+    if op in ("PRINT", "LIST"):
+        return tuple(instr.arg1)
+    if op == "CALL":
+        return tuple(instr.arg2)
+    if op in ("ASSIGN", "RETURN") or op in _UNARY_OPS:
+        return (instr.arg1,)
+    return (instr.arg1, instr.arg2)
+
+
+_IR_OPS = frozenset(_BINARY_OPS) | frozenset(_UNARY_OPS) | frozenset(_COMPARE_OPS) | {
+    "CONST", "ASSIGN", "LABEL", "JUMP", "JUMP_IF_FALSE", "JUMP_IF_TRUE",
+    "PRINT", "LIST", "INDEX", "CALL", "RETURN", "DEFINE_FUNCTION",
+}
+
+
+class RegisterVM:
+    """Runs the three-address IR of compiler.ir on a register machine.
+
+    An alternative engine to VirtualMachine for the part of the language
+    IRGenerator lowers: arithmetic, comparisons, if/while/``for ... in
+    range``, lists, prints and calls of top-level functions and a few
+    builtins.  Anything else raises UnsupportedIR when the VM is created,
+    never halfway through a run.
+
+    Every variable and temp of a function or the module lives in one
+    register of a fixed-size list, and instructions name their operands'
+    registers directly, so ``t3 = t1 + t2`` is one dispatch instead of the
+    four LOAD/ADD/STORE a stack machine needs.  Lowering also stores a
+    result straight into the variable the next ASSIGN copies it to and
+    fuses a comparison with the branch on it (COMPARE_JUMP).  Functions
+    read module variables through LOAD_GLOBAL; calls run on an explicit
+    frame stack, as in VirtualMachine.
+    """
+
+    def __init__(self, ir_instructions, output=None):
+        """``ir_instructions`` is the module's IR, from generate_ir."""
+        self.output    = output if output is not None else OutputSink()
+        self.functions = {}   # name -> RegisterCode
+        self.globals   = None
+        self._builtins = dict(_BUILTINS, print=self._print)
+
+        definitions = [i for i in ir_instructions if i.op == "DEFINE_FUNCTION"]
+        for instr in definitions:
+            node = instr.arg2
+            if instr.arg1 in self.functions:
+                raise UnsupportedIR(f"Function '{instr.arg1}' is defined twice")
+            if (node.decorators or node.defaults or node.vararg or node.kwarg
+                    or node.kwonly_params or node.is_generator):
+                raise UnsupportedIR(f"Function '{instr.arg1}' has a signature IR cannot call")
+            self.functions[instr.arg1] = RegisterCode(instr.arg1, len(node.params))
+
+        self.module = self._lower(RegisterCode("<module>"), ir_instructions)
+        for instr in definitions:
+            node = instr.arg2
+            clash = [p for p in node.params if _TEMP_NAME.match(p)]
+            if clash:
+                raise UnsupportedIR(f"Parameter '{clash[0]}' is spelled like an IR temp")
+            self._lower(self.functions[instr.arg1], generate_ir(node.body), node.params)
+
+        # State of the running frame; see _execute.
+        self._frames = []
+        self._code   = None
+        self._regs   = None
+        self._ip     = 0
+        self._result = None
+
+    def run(self):
+        regs = list(self.module.registers)
+        self.globals = regs
+        self._execute(self.module.instructions, regs)
+        self.output.flush()
+        return self.output.getvalue()
+
+    # ------------------------------------------------------------------
+    # Lowering IR to register code.
+    # ------------------------------------------------------------------
+
+    def _lower(self, code, ir, params=()):
+        is_module = code.name == "<module>"
+        reads, writes, constants = {}, {}, {}
+        for instr in ir:
+            if instr.op not in _IR_OPS:
+                raise UnsupportedIR(f"No register instruction for IR op {instr.op!r}")
+            for name in _reads(instr):
+                if name is None:
+                    raise UnsupportedIR(f"IR op {instr.op!r} reads no value")
+                reads[name] = reads.get(name, 0) + 1
+            if instr.result is not None:
+                writes[instr.result] = writes.get(instr.result, 0) + 1
+                if instr.op == "CONST":
+                    constants[instr.result] = instr.arg1
+            if instr.op == "DEFINE_FUNCTION" and not is_module:
+                raise UnsupportedIR("Nested function definitions have no register code")
+        shadowed = sorted(self.functions.keys() & writes.keys())
+        if shadowed:
+            raise UnsupportedIR(f"Function '{shadowed[0]}' is also assigned as a variable")
+        constants = {
+            name: value for name, value in constants.items()
+            if _TEMP_NAME.match(name) and writes[name] == 1
+        }
+        constants["%none"] = None
+
+        slots = code.slots
+        registers = []
+        for name in params:
+            slots[name] = len(registers)
+            registers.append(None)
+
+        def register(name):
+            if name not in slots:
+                slots[name] = len(registers)
+                registers.append(constants.get(name))
+            return slots[name]
+
+        out, labels = [], {}
+
+        def use(name):
+            if name in constants or name in writes or name in slots:
+                return register(name)
+            if is_module or name not in self.module.slots:
+                raise UnsupportedIR(f"Name '{name}' is never assigned")
+            # Module variables are read afresh on every use.
+            scratch = len(registers)
+            registers.append(None)
+            out.append(["LOAD_GLOBAL", self.module.slots[name], None, scratch, None])
+            return scratch
+
+        def single_use_temp(name):
+            return _TEMP_NAME.match(name) and reads.get(name) == 1 and writes.get(name) == 1
+
+        i = 0
+        while i < len(ir):
+            instr = ir[i]
+            op = instr.op
+            nxt = ir[i + 1] if i + 1 < len(ir) else None
+            result = instr.result
+            step = 1
+            if op in ("LABEL", "DEFINE_FUNCTION", "CONST"):
+                if op == "LABEL":
+                    labels[instr.arg1] = len(out)
+                i += 1
+                continue
+            if (op in _COMPARE_OPS and single_use_temp(result) and nxt is not None
+                    and nxt.op == "JUMP_IF_FALSE" and nxt.arg2 == result):
+                a, b = use(instr.arg1), use(instr.arg2)
+                out.append(["COMPARE_JUMP", a, b, nxt.arg1, _COMPARE_OPS[op]])
+                i += 2
+                continue
+            if (result is not None and op != "CONST" and single_use_temp(result)
+                    and nxt is not None and nxt.op == "ASSIGN" and nxt.arg1 == result):
+                result = nxt.result
+                step = 2
+
+            if op == "ASSIGN":
+                out.append(["MOVE", use(instr.arg1), None, register(result), None])
+            elif op in _BINARY_OPS:
+                a, b = use(instr.arg1), use(instr.arg2)
+                out.append([_BINARY_OPS[op], a, b, register(result), None])
+            elif op in _COMPARE_OPS:
+                a, b = use(instr.arg1), use(instr.arg2)
+                out.append(["COMPARE", a, b, register(result), _COMPARE_OPS[op]])
+            elif op in _UNARY_OPS:
+                out.append([_UNARY_OPS[op], use(instr.arg1), None, register(result), None])
+            elif op == "JUMP":
+                out.append(["JUMP", None, None, instr.arg1, None])
+            elif op in ("JUMP_IF_FALSE", "JUMP_IF_TRUE"):
+                out.append([op, use(instr.arg2), None, instr.arg1, None])
+            elif op == "PRINT":
+                out.append(["PRINT", tuple(use(v) for v in instr.arg1), None, None, None])
+            elif op == "LIST":
+                values = tuple(use(v) for v in instr.arg1)
+                out.append(["BUILD_LIST", values, None, register(result), None])
+            elif op == "INDEX":
+                a, b = use(instr.arg1), use(instr.arg2)
+                out.append(["INDEX", a, b, register(result), None])
+            elif op == "CALL":
+                args = tuple(use(v) for v in instr.arg2)
+                out.append(self._call(instr.arg1, args, register(result)))
+            elif op == "RETURN":
+                out.append(["RETURN", use(instr.arg1), None, None, None])
+            i += step
+        out.append(["RETURN", register("%none"), None, None, None])
+
+        for entry in out:
+            if entry[0] in ("JUMP", "JUMP_IF_FALSE", "JUMP_IF_TRUE", "COMPARE_JUMP"):
+                entry[3] = labels[entry[3]]
+        code.instructions = [RegisterInstruction(*entry) for entry in out]
+        code.registers = registers
+        return code
+
+    def _call(self, name, args, result):
+        if name in self._builtins:
+            return ["CALL_BUILTIN", args, None, result, self._builtins[name]]
+        callee = self.functions.get(name)
+        if callee is None:
+            raise UnsupportedIR(f"Unknown function '{name}'")
+        if len(args) != callee.n_params:
+            raise UnsupportedIR(f"'{name}' takes {callee.n_params} arguments, not {len(args)}")
+        return ["CALL", args, None, result, callee]
+
+    # ------------------------------------------------------------------
+    # Execution.
+    # ------------------------------------------------------------------
+
+    def _execute(self, instructions, regs):
+        """Dispatch until the module code returns.
+
+        CALL and RETURN switch frames by storing the new code, registers
+        and index in ``_code``/``_regs``/``_ip`` and returning -1, which
+        ends the inner loop; the outer one picks the new frame up.
+        """
+        handlers = _HANDLERS
+        self._frames = []
+        self._code, self._regs, ip = instructions, regs, 0
+        while True:
+            while ip >= 0:
+                instr = instructions[ip]
+                ip = handlers[instr.op](self, regs, instr, ip)
+            instructions = self._code
+            if instructions is None:
+                return self._result
+            regs, ip = self._regs, self._ip
+
+    def _print(self, *values):
+        self.output.append(" ".join(_format_value(v) for v in values))
+
+    def _op_MOVE(self, r, instr, ip):
+        r[instr.c] = r[instr.a]
+        return ip + 1
+
+    def _op_LOAD_GLOBAL(self, r, instr, ip):
+        r[instr.c] = self.globals[instr.a]
+        return ip + 1
+
+    def _op_ADD(self, r, instr, ip):
+        r[instr.c] = r[instr.a] + r[instr.b]
+        return ip + 1
+
+    def _op_SUB(self, r, instr, ip):
+        r[instr.c] = r[instr.a] - r[instr.b]
+        return ip + 1
+
+    def _op_MUL(self, r, instr, ip):
+        r[instr.c] = r[instr.a] * r[instr.b]
+        return ip + 1
+
+    def _op_DIV(self, r, instr, ip):
+        r[instr.c] = r[instr.a] / r[instr.b]
+        return ip + 1
+
+    def _op_MOD(self, r, instr, ip):
+        r[instr.c] = r[instr.a] % r[instr.b]
+        return ip + 1
+
+    def _op_FLOORDIV(self, r, instr, ip):
+        r[instr.c] = r[instr.a] // r[instr.b]
+        return ip + 1
+
+    def _op_POW(self, r, instr, ip):
+        r[instr.c] = r[instr.a] ** r[instr.b]
+        return ip + 1
+
+    def _op_BITAND(self, r, instr, ip):
+        r[instr.c] = r[instr.a] & r[instr.b]
+        return ip + 1
+
+    def _op_BITOR(self, r, instr, ip):
+        r[instr.c] = r[instr.a] | r[instr.b]
+        return ip + 1
+
+    def _op_BITXOR(self, r, instr, ip):
+        r[instr.c] = r[instr.a] ^ r[instr.b]
+        return ip + 1
+
+    def _op_LSHIFT(self, r, instr, ip):
+        r[instr.c] = r[instr.a] << r[instr.b]
+        return ip + 1
+
+    def _op_RSHIFT(self, r, instr, ip):
+        r[instr.c] = r[instr.a] >> r[instr.b]
+        return ip + 1
+
+    def _op_NEG(self, r, instr, ip):
+        r[instr.c] = -r[instr.a]
+        return ip + 1
+
+    def _op_NOT(self, r, instr, ip):
+        r[instr.c] = not r[instr.a]
+        return ip + 1
+
+    def _op_COMPARE(self, r, instr, ip):
+        r[instr.c] = instr.arg(r[instr.a], r[instr.b])
+        return ip + 1
+
+    def _op_JUMP(self, r, instr, ip):
+        return instr.c
+
+    def _op_JUMP_IF_FALSE(self, r, instr, ip):
+        if r[instr.a]:
+            return ip + 1
+        return instr.c
+
+    def _op_JUMP_IF_TRUE(self, r, instr, ip):
+        if r[instr.a]:
+            return instr.c
+        return ip + 1
+
+    def _op_COMPARE_JUMP(self, r, instr, ip):
+        if instr.arg(r[instr.a], r[instr.b]):
+            return ip + 1
+        return instr.c
+
+    def _op_BUILD_LIST(self, r, instr, ip):
+        r[instr.c] = [r[i] for i in instr.a]
+        return ip + 1
+
+    def _op_INDEX(self, r, instr, ip):
+        r[instr.c] = r[instr.a][r[instr.b]]
+        return ip + 1
+
+    def _op_PRINT(self, r, instr, ip):
+        self.output.append(" ".join(_format_value(r[i]) for i in instr.a))
+        return ip + 1
+
+    def _op_CALL_BUILTIN(self, r, instr, ip):
+        r[instr.c] = instr.arg(*[r[i] for i in instr.a])
+        return ip + 1
+
+    def _op_CALL(self, r, instr, ip):
+        if len(self._frames) >= REGISTER_VM_MAX_DEPTH:
+            raise RecursionError("maximum recursion depth exceeded")
+        callee = instr.arg
+        regs = [r[i] for i in instr.a]
+        regs += callee.registers[callee.n_params:]
+        self._frames.append((self._code, r, ip + 1, instr.c))
+        self._code, self._regs, self._ip = callee.instructions, regs, 0
+        return -1
+
+    def _op_RETURN(self, r, instr, ip):
+        value = r[instr.a]
+        if not self._frames:
+            self._code, self._result = None, value
+            return -1
+        code, caller, ip, result = self._frames.pop()
+        caller[result] = value
+        self._code, self._regs, self._ip = code, caller, ip
+        return -1
+
+
+_HANDLERS = tuple(getattr(RegisterVM, f"_op_{name}") for name in REGISTER_OPCODES)
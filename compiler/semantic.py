@@ -1,17 +1,110 @@
+from compiler.ast_nodes import (
+    ASTNode, Assignment, AugmentedAssignment, WalrusExpr, UnpackAssignment,
+    ForLoop, ForInLoop, ListComprehension, DictComprehension,
+    SetComprehension, GeneratorExpr, LambdaExpr, GlobalStatement, YieldExpr,
+    WithStatement, DeleteStatement, Import, ImportFrom, NonlocalStatement,
+    FunctionDef, ClassDef, Decorated, ExceptHandler,
+)
+
+
 class SemanticError(Exception):
     pass
 
 
 BUILTIN_NAMES = {
     "len", "input", "int", "float", "str", "bool", "abs", "round",
-    "range", "list", "tuple", "set", "dict", "map", "enumerate",
-    "zip", "sum", "min", "max", "sorted", "reversed", "print",
+    "range", "list", "tuple", "set", "dict", "map", "filter", "enumerate",
+    "zip", "sum", "min", "max", "sorted", "reversed", "print", "iter", "next",
     "isinstance", "hasattr", "getattr", "setattr", "type", "format",
     "True", "False", "None", "self", "super",
     "NotImplemented", "Ellipsis", "__name__",
 }
 
 
+# Statements whose VM implementation reads or writes the frame's variables
+# by name.  A function containing any of them keeps dict-based locals.
+_NAME_BASED_NODES = (
+    WithStatement, DeleteStatement, Import, ImportFrom, NonlocalStatement,
+    FunctionDef, ClassDef, Decorated,
+)
+
+# Node type -> attribute holding the name(s) it stores into.
+_STORE_TARGETS = {
+    Assignment:          "name",
+    AugmentedAssignment: "name",
+    WalrusExpr:          "name",
+    UnpackAssignment:    "names",
+    ForLoop:             "var_name",
+    ForInLoop:           "var_name",
+    ListComprehension:   "var_name",
+    DictComprehension:   "var_name",
+    SetComprehension:    "var_name",
+    GeneratorExpr:       "var_name",
+    ExceptHandler:       "var_name",
+}
+
+
+def _scan_locals(node, stored, global_names):
+    """Collect names stored by `node`; False if it needs name-based locals."""
+    if isinstance(node, (list, tuple)):
+        return all(_scan_locals(n, stored, global_names) for n in node)
+    if not isinstance(node, ASTNode):
+        return True
+    if isinstance(node, _NAME_BASED_NODES):
+        return False
+    if isinstance(node, LambdaExpr):
+        return True
+    if isinstance(node, GlobalStatement):
+        global_names.update(node.names)
+        return True
+    attr = _STORE_TARGETS.get(type(node))
+    if attr is not None:
+        target = getattr(node, attr)
+        stored.extend(target if isinstance(target, list) else [target])
+    return all(
+        _scan_locals(value, stored, global_names)
+        for value in vars(node).values()
+    )
+
+
+def _contains_yield(node):
+    """True if ``node`` yields, not counting nested functions, classes and lambdas."""
+    if isinstance(node, (list, tuple)):
+        return any(_contains_yield(n) for n in node)
+    if not isinstance(node, ASTNode):
+        return False
+    if isinstance(node, YieldExpr):
+        return True
+    if isinstance(node, (FunctionDef, ClassDef, LambdaExpr)):
+        return False
+    return any(_contains_yield(value) for value in vars(node).values())
+
+
+def assign_local_slots(func_node):
+    """Give every local of `func_node` a slot index in the frame's locals array.
+
+    Parameters take the first slots, in order, followed by ``*args``,
+    ``**kwargs``, keyword-only parameters and then every other name the body
+    stores into.  Names declared ``global`` get no slot.
+    """
+    stored = []
+    global_names = set()
+    if not _scan_locals(func_node.body, stored, global_names):
+        func_node.local_slots = None
+        func_node.global_names = global_names
+        return
+    slots = {}
+    for name in func_node.params:
+        slots.setdefault(name, len(slots))
+    extras = [func_node.vararg, func_node.kwarg] + list(func_node.kwonly_params)
+    for name in extras + stored:
+        if name and name not in global_names:
+            slots.setdefault(name, len(slots))
+    func_node.local_slots = slots
+    func_node.slot_names = list(slots)
+    func_node.global_names = global_names
+
+
 class SemanticAnalyzer:
     def __init__(self):
         self.scopes = [dict.fromkeys(BUILTIN_NAMES, True)]
@@ -20,6 +113,9 @@ class SemanticAnalyzer:
         self._current_class = None
         self.current_function = None
         self._in_loop = 0
+        # Module-level functions and classes: function bodies may use them
+        # before their definition, since they only run once it has been.
+        self._module_names = set()
 
     def enter_scope(self):
         self.scopes.append({})
@@ -46,9 +142,18 @@ class SemanticAnalyzer:
         pass
 
     def visit_Program(self, node):
+        for stmt in node.statements:
+            if isinstance(stmt, Decorated):
+                stmt = stmt.node
+            if isinstance(stmt, (FunctionDef, ClassDef)):
+                self._module_names.add(stmt.name)
         for stmt in node.statements:
             self.visit(stmt)
 
+    def _is_forward_reference(self, name):
+        """True for a module-level function or class used in a function body."""
+        return self.current_function is not None and name in self._module_names
+
     def visit_Number(self, node):      pass
     def visit_Float(self, node):       pass
     def visit_String(self, node):      pass
@@ -57,7 +162,7 @@ class SemanticAnalyzer:
     def visit_Pass(self, node):        pass
 
     def visit_Variable(self, node):
-        if not self.is_declared(node.name):
+        if not self.is_declared(node.name) and not self._is_forward_reference(node.name):
             raise SemanticError(f"Variable '{node.name}' is not defined")
 
     def visit_Assignment(self, node):
@@ -188,16 +293,21 @@ class SemanticAnalyzer:
         self.enter_scope()
         prev = self.current_function
         self.current_function = node.name
-        for param in node.params:
-            self.declare(param)
+        for param in node.params + [node.vararg, node.kwarg] + list(node.kwonly_params):
+            if param:
+                self.declare(param)
         for stmt in node.body:
             self.visit(stmt)
         self.current_function = prev
         self.exit_scope()
+        node.is_generator = _contains_yield(node.body)
+        if prev is None:
+            assign_local_slots(node)
 
     def visit_FunctionCall(self, node):
         if node.name not in BUILTIN_NAMES and node.name not in self.classes:
-            if node.name not in self.functions and not self.is_declared(node.name):
+            if (node.name not in self.functions and not self.is_declared(node.name)
+                    and not self._is_forward_reference(node.name)):
                 raise SemanticError(f"Function or class '{node.name}' is not defined")
         for arg in node.args:
             self.visit(arg)
@@ -1,6 +1,306 @@
+import builtins
+import operator
+
+from compiler.bytecode import OPCODES, decode
+from compiler.class_layout import build_class_layout
+from compiler.peephole import PeepholeOptimizer
+from compiler.output_sink import OutputSink
+from compiler.jit import DEFAULT_JIT_PROFILE, JITCompiler, jit_settings
+
+
+_UNBOUND = object()
+
+_EXCEPTION_TYPES = {
+    "Exception": Exception,
+    "ValueError": ValueError,
+    "TypeError": TypeError,
+    "KeyError": KeyError,
+    "IndexError": IndexError,
+    "AttributeError": AttributeError,
+    "NameError": NameError,
+    "UnboundLocalError": UnboundLocalError,
+    "RuntimeError": RuntimeError,
+    "StopIteration": StopIteration,
+    "ZeroDivisionError": ZeroDivisionError,
+    "FileNotFoundError": FileNotFoundError,
+    "IOError": IOError,
+    "OSError": OSError,
+    "ImportError": ImportError,
+    "NotImplementedError": NotImplementedError,
+    "AssertionError": AssertionError,
+    "OverflowError": OverflowError,
+    "RecursionError": RecursionError,
+    "MemoryError": MemoryError,
+    "PermissionError": PermissionError,
+    "TimeoutError": TimeoutError,
+    "ArithmeticError": ArithmeticError,
+    "LookupError": LookupError,
+    "UnicodeError": UnicodeError,
+    "UnicodeDecodeError": UnicodeDecodeError,
+    "UnicodeEncodeError": UnicodeEncodeError,
+    "SystemExit": SystemExit,
+    "KeyboardInterrupt": KeyboardInterrupt,
+    "GeneratorExit": GeneratorExit,
+    "BaseException": BaseException,
+}
+
+
+# Frames kept for reuse by one top-level run and its sub-VMs.
+FRAME_POOL_SIZE = 256
+
+
 class Frame:
-    def __init__(self):
+    """A call frame.
+
+    Functions whose locals were given slots by the semantic pass keep them in
+    the fixed-size ``fast`` array (indexed by LOAD_FAST/STORE_FAST); ``slots``
+    maps each local name to its index and ``slot_names`` lists them in slot
+    order.  Everything else, and all code without slots, lives in the
+    ``variables`` dict.
+
+    A frame pushed by a call also holds where RETURN_VALUE resumes the
+    caller: ``return_code`` and ``return_ip``.
+    """
+
+    __slots__ = ("variables", "slots", "slot_names", "fast", "stack_base", "profile",
+                 "return_code", "return_ip")
+
+    def __init__(self, slots=None, slot_names=None):
         self.variables = {}
+        self.slots = slots
+        self.slot_names = slot_names
+        self.fast  = [_UNBOUND] * len(slots) if slots else None
+        # Operand stack height when the frame was entered; an exception
+        # handler in this frame discards everything above it.
+        self.stack_base = 0
+        # The JIT's TypeProfile for the function running in this frame,
+        # which RETURN_VALUE feeds the return value to; None when not
+        # profiled.
+        self.profile = None
+        self.return_code = None
+        self.return_ip   = 0
+
+    def get(self, name, default=None):
+        if self.slots is not None and name in self.slots:
+            value = self.fast[self.slots[name]]
+            if value is not _UNBOUND:
+                return value
+        return self.variables.get(name, default)
+
+    def set(self, name, value):
+        if self.slots is not None and name in self.slots:
+            self.fast[self.slots[name]] = value
+        else:
+            self.variables[name] = value
+
+    def bind(self, params, args):
+        """Bind positional args; params are the function's leading slots."""
+        if self.fast is not None:
+            n = min(len(params), len(args))
+            self.fast[:n] = args[:n]
+        else:
+            for param, val in zip(params, args):
+                self.variables[param] = val
+
+    def snapshot(self):
+        """All bound names of this frame as a plain dict."""
+        if self.slots is None:
+            return dict(self.variables)
+        merged = dict(self.variables)
+        for name, slot in self.slots.items():
+            if self.fast[slot] is not _UNBOUND:
+                merged[name] = self.fast[slot]
+        return merged
+
+
+class Closure:
+    """A function defined inside another function, as a value.
+
+    Nested functions keep dict-based locals and look up the names they do
+    not bind through the frames, so once the function that defined one has
+    returned, its Closure supplies the variables it saw at the ``def``.
+    """
+
+    __slots__ = ("node", "captured", "vm")
+
+    def __init__(self, node, captured, vm):
+        self.node     = node
+        self.captured = captured
+        self.vm       = vm
+
+    def __call__(self, *args, **kwargs):
+        return self.vm.call(self, args, kwargs)
+
+    def __repr__(self):
+        return f"<function {self.node.name}>"
+
+
+class Instance:
+    """An instance of a user-defined class.
+
+    Attribute names live in the shared per-class ``Shape``; the instance only
+    carries the values, in shape order.
+    """
+
+    __slots__ = ("_cls", "_shape", "_values")
+
+    def __init__(self, class_name, shape):
+        self._cls    = class_name
+        self._shape  = shape
+        self._values = []
+
+    def has_attr(self, name):
+        return name in self._shape.offsets
+
+    def get_attr(self, name, default=None):
+        index = self._shape.offsets.get(name)
+        return default if index is None else self._values[index]
+
+    def set_attr(self, name, value):
+        index = self._shape.offsets.get(name)
+        if index is None:
+            self._shape = self._shape.with_attribute(name)
+            self._values.append(value)
+        else:
+            self._values[index] = value
+
+    def __repr__(self):
+        return f"<{self._cls} object>"
+
+
+class BoundMethod:
+    """A user method read off an Instance as a value, e.g. ``g = obj.method``."""
+
+    __slots__ = ("obj", "node", "class_name", "vm")
+
+    def __init__(self, obj, node, class_name, vm):
+        self.obj        = obj
+        self.node       = node
+        self.class_name = class_name
+        self.vm         = vm
+
+    def __call__(self, *args, **kwargs):
+        return self.vm._run_method(self.node, self.class_name, self.obj, args, kwargs)
+
+    def __repr__(self):
+        return f"<bound method {self.class_name}.{self.node.name}>"
+
+
+class Generator:
+    """A generator function call or generator expression, run on demand.
+
+    The body executes on its own sub-VM whose frame and operand stack stay
+    alive between values.  YIELD_VALUE suspends that VM with the value on
+    top of its stack; ``send`` resumes it at the next instruction with the
+    sent value pushed in its place.  Nothing runs ahead of the consumer.
+
+    ``throw`` and ``close`` unwind the suspended VM from the yield through
+    its exception table, so ``finally`` blocks run.  Unlike CPython, a
+    generator that is dropped without being closed is not closed when it
+    is collected.
+    """
+
+    __slots__ = ("__name__", "_vm", "_ip")
+
+    def __init__(self, name, vm):
+        self.__name__ = name
+        self._vm = vm
+        self._ip = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.send(None)
+
+    def send(self, value):
+        vm = self._vm
+        if vm is None:
+            raise StopIteration
+        if self._ip:
+            vm.stack.append(value)
+        elif value is not None:
+            raise TypeError("can't send non-None value to a just-started generator")
+        return self._resume(self._ip)
+
+    def throw(self, exc):
+        """Raise ``exc`` at the suspended yield, as if the yield raised it."""
+        if isinstance(exc, type):
+            exc = exc()
+        if self._vm is None or not self._ip:
+            self._vm = None
+            raise exc
+        return self._resume(self._ip - 1, exc)
+
+    def close(self):
+        """Raise GeneratorExit at the suspended yield, so finally blocks run."""
+        if self._vm is None:
+            return
+        try:
+            self.throw(GeneratorExit())
+        except (GeneratorExit, StopIteration):
+            return
+        raise RuntimeError("generator ignored GeneratorExit")
+
+    def _resume(self, ip, exc=None):
+        vm = self._vm
+        try:
+            if exc is not None:
+                ip = vm._unwind(exc, ip)
+            ip = vm._execute(ip)
+        except StopIteration as exc:
+            self._vm = None
+            raise RuntimeError("generator raised StopIteration") from exc
+        except BaseException:
+            self._vm = None
+            raise
+        if ip is None:
+            self._vm = None
+            raise StopIteration(vm.stack[-1] if vm.stack else None)
+        self._ip = ip
+        return vm.stack.pop()
+
+    def __repr__(self):
+        return f"<generator object {self.__name__}>"
+
+
+class CodeCache:
+    """Compiled bytecode keyed by the AST node it was generated from.
+
+    One cache is created per top-level run and handed to every sub-VM, so a
+    method, ``__init__``, ``__str__`` or lambda body is compiled only once no
+    matter how often it is called.
+    """
+
+    def __init__(self):
+        self._code  = {}
+        self.hits   = 0
+        self.misses = 0
+        # Bumped when DEFINE_CLASS rebinds an existing class name; method
+        # inline caches filled under an older epoch are discarded.
+        self.class_epoch = 0
+
+    def get(self, key):
+        code = self._code.get(key)
+        if code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return code
+
+    def put(self, key, code):
+        self._code[key] = code
+
+    def entries(self):
+        """All compiled bodies by key, e.g. for a persistent program cache."""
+        return dict(self._code)
+
+    def preload(self, entries):
+        """Add bodies compiled by an earlier run of the same program."""
+        self._code.update(entries)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._code)}
 
 
 class BreakSignal(Exception):
@@ -21,6 +321,43 @@ _BUILTIN_CALLABLES = {
     "type":  lambda x: type(x).__name__,
 }
 
+# Names _dispatch_call handles itself before looking at user classes and
+# functions.
+_DISPATCH_BUILTINS = frozenset({
+    "str", "format", "int", "float", "bool", "abs", "round", "len", "input",
+    "range", "list", "tuple", "set", "dict", "sorted", "reversed", "enumerate",
+    "map", "filter", "zip", "sum", "min", "max", "print", "isinstance",
+    "hasattr", "type", "getattr", "setattr",
+})
+
+# Code a frame run by VirtualMachine.call returns into: empty, so the
+# nested dispatch loop ends as soon as the callee returns.
+_CALL_RETURN = []
+
+_COMPARE_OPS = {
+    "==":     operator.eq,
+    "!=":     operator.ne,
+    "<":      operator.lt,
+    ">":      operator.gt,
+    "<=":     operator.le,
+    ">=":     operator.ge,
+    "is":     operator.is_,
+    "is not": operator.is_not,
+    "in":     lambda a, b: a in b,
+    "not in": lambda a, b: a not in b,
+}
+
+def _format_value(v):
+    """How PRINT shows ``v``, a value other than a user class instance."""
+    if isinstance(v, bool):
+        return "True" if v else "False"
+    if v is None:
+        return "None"
+    if isinstance(v, float) and v == int(v):
+        return str(int(v))
+    return str(v)
+
+
 _ALLOWED_MODULES = {
     "ast", "dis", "tokenize", "token", "symtable", "types", "codeop",
     "sys", "io", "contextlib", "traceback", "builtins",
@@ -64,18 +401,46 @@ def _import_module(name: str):
 
 
 class VirtualMachine:
-    def __init__(self, instructions):
-        self.instructions = instructions
+    def __init__(self, instructions, peephole=True, output=None, collect_stats=False,
+                 jit_profile=DEFAULT_JIT_PROFILE, jit_threshold=None, budget=None):
+        # With peephole enabled, the program and every function body
+        # compiled at run time go through PeepholeOptimizer first.
+        self.peephole = peephole
+        # With collect_stats, executed instructions are counted per opcode
+        # number and calls per function name, for report().
+        self.opcode_counts = [0] * len(OPCODES) if collect_stats else None
+        self.call_counts   = {} if collect_stats else None
+        if peephole:
+            instructions = PeepholeOptimizer().optimize(instructions)
+        self.instructions = decode(instructions)
         self.stack = []
         self.frames = [Frame()]
+        self.globals = self.frames[0].variables
         self.functions = {}       
-        self.classes   = {}       
-        self.output    = []
-        self.call_stack = []    
+        self.classes   = {}       # name -> ClassLayout
+        # FunctionDef node -> {parameter: value}, evaluated when the
+        # function (or its class) is defined, as Python does.
+        self.default_values = {}
+        # Printed lines go to an OutputSink; pass one with an on_chunk
+        # callback to stream output while the program runs.
+        self.output    = output if output is not None else OutputSink()
+        self._owns_output = True
+        # Frames popped by returns, handed out again by _new_frame.
+        self._free_frames = []
         self._input_provider = input  
-
-        from compiler.jit import JITCompiler
-        self.jit = JITCompiler(threshold=10)
+        # Set by YIELD_VALUE to the index a Generator resumes at.
+        self._resume_ip = None
+        # Frames below this depth belong to a dispatch loop further up the
+        # Python stack (see _run_frame); exceptions do not unwind past them.
+        self._floor = 1
+        # Dispatch loops of this VM currently running.
+        self._running = 0
+        # Names a decorator bound to something other than their function
+        # or class; calls to them go through the variable.
+        self._rebound = set()
+        self.code_cache = CodeCache()
+
+        self.jit = JITCompiler(**jit_settings(jit_profile, jit_threshold))
         self._jit_builtins = {
             "range":    lambda *a: list(range(*[int(x) for x in a])),
             "len":      len,
@@ -94,9 +459,25 @@ class VirtualMachine:
             "enumerate": enumerate,
             "list":     list,
             "tuple":    tuple,
-            "type":     lambda x: type(x).__name__,
+            "type":     self._jit_type,
             "__jit_print__": self._jit_print,
+            "__jit_emit__":  self._jit_emit,
+            "__jit_str__":   self._jit_str,
+            "__jit_len__":   self._len,
+            "__jit_compare__": self._compare,
+            "__jit_getattr__":     self._jit_getattr,
+            "__jit_setattr__":     self._jit_setattr,
+            "__jit_call_method__": self._jit_call_method,
+            "__jit_call__":  self._jit_call,
+            "__jit_type__":  type,
+            "__range__":     range,
         }
+        self.jit.namespace.update(self._jit_builtins)
+        # An ExecutionBudget is charged on backward jumps and calls, and by
+        # compiled code through __jit_tick__ (see compiler.budget).
+        self.budget = budget
+        if budget is not None:
+            self.jit.namespace["__jit_tick__"] = budget.charge
 
 
     def current_frame(self):
@@ -107,6 +488,12 @@ class VirtualMachine:
         for frame in reversed(self.frames):
             if name in frame.variables:
                 return frame.variables[name]
+        return self._load_global(name)
+
+    def _load_global(self, name):
+        """Look up a module-level name, then the builtins."""
+        if name in self.globals:
+            return self.globals[name]
         if name in _BUILTIN_CALLABLES:
             return _BUILTIN_CALLABLES[name]
         if name == "True":
@@ -121,778 +508,1556 @@ class VirtualMachine:
             return name 
         if name in self.classes:
             return name
-        return 0  
-
-    def _compile_body(self, stmts):
+        if name in _DISPATCH_BUILTINS:
+            return self._builtin_function(name)
+        value = getattr(builtins, name, None)
+        if callable(value):
+            return value
+        return 0
+
+    def _builtin_function(self, name):
+        """A Python callable for builtin ``name``, as _dispatch_call runs it.
+
+        Lets a builtin be passed as a value, e.g. ``sorted(words, key=len)``.
+        """
+        def call(*args, **kwargs):
+            self._dispatch_call(name, list(args), 0, kwargs)
+            return self.stack.pop()
+        return call  
+
+    def _compile_body(self, stmts, func_node=None):
         from compiler.bytecode import BytecodeGenerator
         from compiler.ast_nodes import Program
-        gen = BytecodeGenerator()
+        if func_node is not None and func_node.local_slots is not None:
+            gen = BytecodeGenerator(func_node.local_slots, func_node.global_names,
+                                    func_node.slot_names)
+        else:
+            gen = BytecodeGenerator()
         instrs = gen.generate(Program(stmts))
         if not instrs or instrs[-1].opcode != "RETURN_VALUE":
             from compiler.bytecode import Instruction
             instrs.append(Instruction("LOAD_CONST", None))
             instrs.append(Instruction("RETURN_VALUE"))
+        if self.peephole:
+            instrs = PeepholeOptimizer().optimize(instrs)
+        return decode(instrs)
+
+    def _compile_cached(self, key, stmts):
+        """Compile `stmts` once per `key` (normally the owning AST node)."""
+        instrs = self.code_cache.get(key)
+        if instrs is None:
+            instrs = self._compile_body(stmts)
+            self.code_cache.put(key, instrs)
+        return instrs
+
+    def _compile_function(self, func_node):
+        """Compile a function or method body once, using its local slots."""
+        instrs = self.code_cache.get(func_node)
+        if instrs is None:
+            instrs = self._compile_body(func_node.body, func_node)
+            self.code_cache.put(func_node, instrs)
         return instrs
 
+    def _new_frame(self, func_node):
+        slots = getattr(func_node, "local_slots", None)
+        names = getattr(func_node, "slot_names", None)
+        if not self._free_frames:
+            return Frame(slots, names)
+        frame = self._free_frames.pop()
+        frame.slots = slots
+        frame.slot_names = names
+        frame.fast  = [_UNBOUND] * len(slots) if slots else None
+        # A generator's frame is never pushed, so it keeps this base.
+        frame.stack_base = 0
+        return frame
+
+    def _push_frame(self, frame, instructions, ip):
+        """Enter ``instructions`` in ``frame``, returning to ``ip`` + 1 afterwards."""
+        frame.stack_base  = len(self.stack)
+        frame.return_code = self.instructions
+        frame.return_ip   = ip + 1
+        self.frames.append(frame)
+        self.instructions = instructions
+
+    def _pop_frame(self):
+        """Leave the current call; returns the caller's ip.
+
+        Only frames pushed by _push_frame come through here, and nothing
+        refers to them once they are left, so they go back to the pool.
+        """
+        frame = self.frames.pop()
+        self.instructions = frame.return_code
+        ip = frame.return_ip
+        free = self._free_frames
+        if len(free) < FRAME_POOL_SIZE:
+            if frame.variables:
+                frame.variables = {}
+            frame.profile = None
+            frame.return_code = None
+            free.append(frame)
+        return ip
+
+    def _spawn(self, instructions, frame):
+        """Create a sub-VM sharing this VM's functions, classes, globals and code cache.
+
+        Sub-VMs run generator bodies, with-blocks and evaluated
+        expressions, and calls made through a VM that is not running (see
+        _run_frame), so this skips __init__ and only sets what a sub-VM
+        does not take over from its parent.
+        """
+        sub = VirtualMachine.__new__(VirtualMachine)
+        sub.instructions = instructions
+        sub.stack      = []
+        sub._resume_ip = None
+        sub._floor     = 1
+        sub._running   = 0
+        sub._rebound   = self._rebound
+        sub._free_frames = self._free_frames
+        sub.peephole   = self.peephole
+        sub.output     = self.output
+        sub._owns_output = False
+        sub.frames     = [frame]
+        sub.globals    = self.globals
+        sub.functions  = self.functions
+        sub.classes    = self.classes
+        sub.default_values = self.default_values
+        sub.code_cache = self.code_cache
+        sub.opcode_counts = self.opcode_counts
+        sub.call_counts   = self.call_counts
+        sub.jit        = self.jit
+        sub._jit_builtins = self._jit_builtins
+        sub.budget     = self.budget
+        sub._input_provider = self._input_provider
+        return sub
+
+    @staticmethod
+    def _param_names(node):
+        """Parameter names of ``node`` in frame-slot order (see assign_local_slots)."""
+        names = list(node.params)
+        for extra in (node.vararg, node.kwarg):
+            if extra:
+                names.append(extra)
+        names.extend(getattr(node, "kwonly_params", None) or ())
+        return names
+
+    def _bind_arguments(self, node, args, kwargs=None, defaults=None):
+        """Match a call's arguments to the parameters of ``node``.
+
+        Returns one value per name of ``_param_names(node)``: positional
+        arguments fill ``params`` and the surplus goes to ``*args``,
+        keywords fill named parameters and the rest go to ``**kwargs``, and
+        anything still missing takes its default.  ``defaults`` overrides
+        the values recorded for ``node`` in ``default_values``.
+        """
+        params = node.params
+        vararg, kwarg = node.vararg, node.kwarg
+        kwonly = getattr(node, "kwonly_params", None)
+        if not kwargs and len(args) == len(params) and not (vararg or kwarg or kwonly):
+            return args
+        name = getattr(node, "name", "<lambda>")
+        if defaults is None:
+            defaults = self.default_values.get(node, {})
+        n = len(params)
+        if len(args) > n and not vararg:
+            raise TypeError(
+                f"{name}() takes {n} positional arguments but {len(args)} were given"
+            )
+        values = list(args[:n])
+        kwargs = dict(kwargs) if kwargs else {}
+        for param in params[:len(values)]:
+            if param in kwargs:
+                raise TypeError(f"{name}() got multiple values for argument '{param}'")
+        def take(param, kind):
+            if param in kwargs:
+                return kwargs.pop(param)
+            if param in defaults:
+                return defaults[param]
+            raise TypeError(f"{name}() missing 1 required {kind} argument: '{param}'")
+
+        values.extend(take(param, "positional") for param in params[len(values):])
+        kwonly_values = [take(param, "keyword-only") for param in kwonly or ()]
+        if vararg:
+            values.append(tuple(args[n:]))
+        if kwarg:
+            values.append(kwargs)
+        elif kwargs:
+            raise TypeError(f"{name}() got an unexpected keyword argument '{next(iter(kwargs))}'")
+        values.extend(kwonly_values)
+        return values
+
+    def _frame_for(self, node, values):
+        """A new frame for ``node`` with ``values`` from ``_bind_arguments`` bound."""
+        frame = self._new_frame(node)
+        if len(values) == len(node.params):
+            frame.bind(node.params, values)
+        else:
+            for name, value in zip(self._param_names(node), values):
+                frame.set(name, value)
+        return frame
+
+    def _closure_frame(self):
+        """A frame seeing the current function's locals.
+
+        At module level it starts empty: the sub-VM shares the globals.
+        """
+        frame = Frame()
+        if len(self.frames) > 1:
+            frame.variables.update(self.frames[-1].snapshot())
+        return frame
+
+    def _eval_expr(self, node):
+        """Evaluate expression ``node`` in the current scope and return its value."""
+        from compiler.ast_nodes import Return
+        sub = self._spawn(self._compile_cached((node, "value"), [Return(node)]),
+                          self._closure_frame())
+        sub.run()
+        return sub.stack[-1] if sub.stack else None
+
+    def _eval_defaults(self, node):
+        """Evaluate the default values of function or lambda ``node``."""
+        return {param: self._eval_expr(expr) for param, expr in node.defaults.items()}
+
+    def _run_bound(self, node, code, values, class_name=None, profile=None):
+        """Run ``code`` for ``node`` with ``values`` bound; return the result."""
+        frame = self._frame_for(node, values)
+        if class_name is not None:
+            frame.variables["__current_class__"] = class_name
+        if node.is_generator:
+            return self._make_generator(node.name, code, frame)
+        frame.profile = profile
+        return self._run_frame(frame, code)
+
+    def _run_frame(self, frame, code):
+        """Run ``code`` in ``frame`` to completion and return its result.
+
+        While this VM is dispatching, the frame goes on its own frame
+        stack and a nested dispatch loop runs it: the frame returns into
+        _CALL_RETURN, which ends the loop, and the interrupted code's
+        instructions are restored afterwards.  Exceptions stop unwinding
+        at the frame and propagate to the caller.  A VM that is not
+        running (a finished or suspended sub-VM whose frames are stale)
+        runs the frame on a sub-VM instead.
+        """
+        if not self._running:
+            sub_vm = self._spawn(code, frame)
+            sub_vm.run()
+            return sub_vm.stack[-1] if sub_vm.stack else None
+        saved = self.instructions, self._resume_ip, self._floor
+        depth = len(self.frames)
+        base = len(self.stack)
+        frame.stack_base = base
+        frame.return_code = _CALL_RETURN
+        frame.return_ip = 0
+        self.frames.append(frame)
+        self.instructions = code
+        self._floor = depth + 1
+        try:
+            self._execute(0)
+            return self.stack[base] if len(self.stack) > base else None
+        finally:
+            del self.frames[depth:]
+            del self.stack[base:]
+            self.instructions, self._resume_ip, self._floor = saved
+
+    def call(self, func, args=(), kwargs=None):
+        """Call ``func`` with ``args`` (and ``kwargs``) and return its result.
+
+        ``func`` is a callable as the program sees it: the name of a user
+        function or class (which is its definition, even where a decorator
+        rebound the name), a Closure, or a Python callable such as a lambda.  User
+        functions run on this VM's frame stack (see _run_frame), so
+        builtins taking callbacks call into the program at the cost of a
+        normal call.
+        """
+        if isinstance(func, str):
+            if func in self.classes:
+                return self._construct(func, args, kwargs)
+            if func in self.functions:
+                return self._run_function(func, args, kwargs)
+        if type(func) is Closure:
+            node = func.node
+            code = self._compile_function(node)
+            frame = self._closure_frame_for(func, self._bind_arguments(node, args, kwargs))
+            if node.is_generator:
+                return self._make_generator(node.name, code, frame)
+            self._charge_closure(node, code)
+            return self._run_frame(frame, code)
+        if callable(func):
+            return func(*args, **(kwargs or {}))
+        raise TypeError(f"'{type(func).__name__}' object is not callable")
+
+    def _key(self, func):
+        """A Python key function calling ``func``, or None for no key."""
+        if func is None:
+            return None
+        return lambda value: self.call(func, (value,))
+
+    def _run_function(self, func_name, args, kwargs=None):
+        """Call user function ``func_name`` to completion and return its result."""
+        func = self.functions[func_name]
+        node = func["node"]
+        values = self._bind_arguments(node, args, kwargs)
+        profile = None
+        if not node.is_generator:
+            compiled, profile = self._jit_lookup(func_name, node, values)
+            if compiled is not None:
+                return compiled(*values)
+        return self._run_bound(node, func["instructions"], values, profile=profile)
+
+    def _run_method(self, method_node, class_name, obj, args, kwargs=None):
+        """Call a user method on ``obj`` to completion and return its result."""
+        values = self._bind_arguments(method_node, [obj, *args], kwargs)
+        profile = None
+        if not method_node.is_generator:
+            compiled, profile = self._jit_lookup(method_node, method_node, values, class_name)
+            if compiled is not None:
+                return compiled(*values)
+        return self._run_bound(method_node, self._compile_function(method_node), values,
+                               class_name, profile)
+
+    def _construct(self, class_name, args, kwargs=None):
+        """Create an instance of user class ``class_name`` and run its ``__init__``."""
+        instance = Instance(class_name, self.classes[class_name].root_shape)
+        init_node, init_class = self._find_method(class_name, "__init__")
+        if init_node is not None:
+            self._run_method(init_node, init_class or class_name, instance, args, kwargs)
+        return instance
+
+    def _jit_lookup(self, key, node, values, class_name=None):
+        """Compiled code for ``key``, or None and the profile of this call.
+
+        Every call kind (functions, methods, constructors) comes through
+        here, so they are counted, profiled and compiled alike: functions
+        are keyed by name, methods by their FunctionDef node.
+        """
+        jit = self.jit
+        if self.call_counts is not None:
+            self._count_call(key if isinstance(key, str) else f"{class_name}.{node.name}")
+        compiled = profile = None
+        # Under the interpreter profile nothing ever compiles, so calls
+        # are not profiled either.
+        if jit.enabled:
+            compiled = jit.try_get_compiled(key)
+            if compiled is not None:
+                return compiled, None
+            profile = jit.record_call(key, values)
+            if jit.should_compile(key, node):
+                code = self._code_for(key, node)
+                compiled = jit.try_compile(
+                    key, node,
+                    interpret=lambda *args: self._run_bound(node, code, args, class_name),
+                    name=key if isinstance(key, str) else f"{class_name}.{node.name}",
+                )
+        if compiled is None and self.budget is not None:
+            self.budget.charge(len(self._code_for(key, node)))
+        return compiled, profile
+
+    def _code_for(self, key, node):
+        return (self.functions[key]["instructions"] if isinstance(key, str)
+                else self._compile_function(node))
+
+    def _count_call(self, name):
+        counts = self.call_counts
+        counts[name] = counts.get(name, 0) + 1
+
+    def report(self):
+        """Execution statistics of a run with ``collect_stats``, as plain data.
+
+        Calls are those the interpreter made; compiled code calling other
+        compiled code directly is not seen.
+        """
+        counts = self.opcode_counts or [0] * len(OPCODES)
+        by_count = sorted(range(len(counts)), key=lambda op: -counts[op])
+        stats = self.jit.stats
+        calls = self.call_counts or {}
+        return {
+            "instructions": sum(counts),
+            "opcodes": {OPCODES[op]: counts[op] for op in by_count if counts[op]},
+            "calls": dict(sorted(calls.items(), key=lambda item: -item[1])),
+            "jit": {
+                "compiled":        list(stats["compiled"]),
+                "failed":          list(stats["failed"]),
+                "osr":             list(stats["osr"]),
+                "deoptimized":     list(stats["deoptimized"]),
+                "tiers":           {str(k): v for k, v in stats["tiers"].items()},
+                "bailouts":        {str(k): v for k, v in stats["bailouts"].items() if v},
+                "compile_seconds": {str(k): v for k, v in stats["compile_seconds"].items()},
+                "max_queue_depth": stats["max_queue_depth"],
+                "events":          list(self.jit.events),
+                "events_dropped":  stats["events_dropped"],
+            },
+        }
+
+    def _compile_genexpr(self, node):
+        """Compile the body of generator expression ``node`` once."""
+        instrs = self.code_cache.get(node)
+        if instrs is None:
+            from compiler.bytecode import BytecodeGenerator
+            instrs = BytecodeGenerator().generate_genexpr(node)
+            if self.peephole:
+                instrs = PeepholeOptimizer().optimize(instrs)
+            instrs = decode(instrs)
+            self.code_cache.put(node, instrs)
+        return instrs
+
+    def _make_generator(self, name, instructions, frame):
+        return Generator(name, self._spawn(instructions, frame))
+
     def _find_method(self, class_name, method_name):
-        visited = set()
-        while class_name and class_name not in visited:
-            visited.add(class_name)
-            cn = self.classes.get(class_name)
-            if cn is None:
-                break
-            for stmt in cn.body:
-                if hasattr(stmt, "name") and stmt.name == method_name:
-                    return stmt, class_name
-            class_name = getattr(cn, "parent", None)
-        return None, None
+        layout = self.classes.get(class_name)
+        if layout is None:
+            return None, None
+        return layout.lookup(method_name)
+
+    def _cached_method(self, instr, class_name, method_name, after=None):
+        """Resolve ``method_name`` on ``class_name`` through ``instr``'s inline cache.
+
+        With ``after`` set, resolution starts past that class in
+        ``class_name``'s MRO, as ``super()`` does.  The cache maps receiver
+        classes to (method node, defining class, compiled body) and is valid
+        for a single class epoch.  Returns (None, None, None) when the method
+        does not exist.
+        """
+        epoch = self.code_cache.class_epoch
+        cache = instr.cache
+        if cache is None or cache[0] != epoch:
+            cache = instr.cache = (epoch, {})
+        key = class_name if after is None else (class_name, after)
+        entry = cache[1].get(key)
+        if entry is None:
+            layout = self.classes.get(class_name)
+            if layout is None:
+                return None, None, None
+            if after is None:
+                method_node, found_class = layout.lookup(method_name)
+            else:
+                method_node, found_class = layout.next_method(after, method_name)
+            if method_node is None:
+                return None, None, None
+            entry = (method_node, found_class, self._compile_function(method_node))
+            cache[1][key] = entry
+        return entry
 
     def _fmt(self, v):
-        if isinstance(v, bool):
-            return "True" if v else "False"
-        if v is None:
-            return "None"
-        if isinstance(v, dict) and "__class__" in v:
+        if type(v) is Instance:
             s = self._instance_str(v)
             return s if s is not None else repr(v)
-        if isinstance(v, float) and v == int(v):
-            return str(int(v))
-        return str(v)
+        return _format_value(v)
 
     def _instance_str(self, obj):
-        if not (isinstance(obj, dict) and "__class__" in obj):
+        if type(obj) is not Instance:
             return None
-        method_node, found_class = self._find_method(obj["__class__"], "__str__")
+        method_node, found_class = self._find_method(obj._cls, "__str__")
         if method_node is None:
-            class_name = obj.get("__class__", "object")
-            return f"<{class_name} object>"
-        method_instructions = self._compile_body(method_node.body)
-        new_frame = Frame()
-        new_frame.variables["self"] = obj
-        new_frame.variables["__current_class__"] = found_class or obj.get("__class__", "")
-        sub_vm = VirtualMachine(method_instructions)
-        sub_vm.frames    = [new_frame]
-        sub_vm.functions = self.functions
-        sub_vm.classes   = self.classes
-        sub_vm._input_provider = self._input_provider
-        sub_vm.run()
-        result = sub_vm.stack[-1] if sub_vm.stack else ""
-        return str(result)
-
-    def _call_method_node(self, method_node, obj, args, ip, class_name=None, kwargs=None):
-        method_instructions = self._compile_body(method_node.body)
-        new_frame = Frame()
-        new_frame.variables["self"] = obj
-        new_frame.variables["__current_class__"] = (
-            class_name if class_name is not None else obj.get("__class__", "")
-        )
-        kwargs = kwargs or {}
-        params = method_node.params[1:]
-        for param, val in zip(params, args):
-            new_frame.variables[param] = val
-        for param in params[len(args):]:
-            if param in kwargs:
-                new_frame.variables[param] = kwargs[param]
-        kwarg_name = getattr(method_node, "kwarg", None)
-        if kwarg_name:
-            extra_kwargs = {k: v for k, v in kwargs.items() if k not in params}
-            new_frame.variables[kwarg_name] = extra_kwargs
-        else:
-            unexpected = [k for k in kwargs if k not in params]
-            if unexpected:
-                raise TypeError(
-                    f"{method_node.name}() got unexpected keyword argument '{unexpected[0]}'"
-                )
-        self.frames.append(new_frame)
-        self.call_stack.append((self.instructions, ip + 1))
-        self.instructions = method_instructions
+            return f"<{obj._cls} object>"
+        return str(self._run_method(method_node, found_class or obj._cls, obj, []))
+
+    def _instance_attr(self, obj, name, default=None):
+        """Attribute ``name`` of Instance ``obj``: its own value, else a bound method."""
+        from compiler.ast_nodes import FunctionDef
+        index = obj._shape.offsets.get(name)
+        if index is not None:
+            return obj._values[index]
+        method_node, found_class = self._find_method(obj._cls, name)
+        if type(method_node) is not FunctionDef:
+            return default
+        return BoundMethod(obj, method_node, found_class or obj._cls, self)
+
+    def _dunder(self, obj, name, *args):
+        """Run user method ``name`` on ``obj``; NotImplemented if it has none."""
+        if type(obj) is not Instance:
+            return NotImplemented
+        method_node, found_class = self._find_method(obj._cls, name)
+        if method_node is None:
+            return NotImplemented
+        return self._run_method(method_node, found_class or obj._cls, obj, args)
+
+    def _compare(self, op, a, b):
+        """``a op b`` as the program sees it.
+
+        ``==`` and ``!=`` with an Instance on either side run the user's
+        ``__eq__``/``__ne__`` as Python does: the left operand first, then
+        the reflected one, ``__ne__`` falling back to the negated
+        ``__eq__``, and identity when neither defines them.
+        """
+        if (op == "==" or op == "!=") and (type(a) is Instance or type(b) is Instance):
+            equal = op == "=="
+            for left, right in ((a, b), (b, a)):
+                result = self._dunder(left, "__eq__" if equal else "__ne__", right)
+                if result is NotImplemented and not equal:
+                    result = self._dunder(left, "__eq__", right)
+                    if result is not NotImplemented:
+                        result = not result
+                if result is not NotImplemented:
+                    return result
+            return (a is b) == equal
+        cmp = _COMPARE_OPS.get(op)
+        return cmp(a, b) if cmp is not None else False
+
+    def _len(self, obj):
+        """``len(obj)``, running ``__len__`` for an Instance."""
+        if type(obj) is not Instance:
+            return len(obj)
+        result = self._dunder(obj, "__len__")
+        if result is NotImplemented:
+            raise TypeError(f"object of type '{obj._cls}' has no len()")
+        return result
+
+    def _call_method_node(self, method_node, obj, args, ip, class_name=None,
+                          kwargs=None, code=None):
+        method_instructions = code if code is not None else self._compile_function(method_node)
+        if class_name is None:
+            class_name = obj._cls
+        values = self._bind_arguments(method_node, [obj, *args], kwargs)
+        profile = None
+        if not method_node.is_generator:
+            compiled, profile = self._jit_lookup(method_node, method_node, values, class_name)
+            if compiled is not None:
+                self.stack.append(compiled(*values))
+                return ip
+        new_frame = self._frame_for(method_node, values)
+        new_frame.variables["__current_class__"] = class_name
+        if method_node.is_generator:
+            self.stack.append(
+                self._make_generator(method_node.name, method_instructions, new_frame)
+            )
+            return ip
+        new_frame.profile = profile
+        self._push_frame(new_frame, method_instructions, ip)
         return -1
 
+    # Helpers called from JIT-compiled code (see compiler.jit).
+
     def _jit_print(self, *args):
         self.output.append(" ".join(self._fmt(v) for v in args))
 
-    def _call_function(self, func_name, args, ip):
-        self.jit.record_call(func_name)
-        cached_fn = self.jit.try_get_compiled(func_name)
-        if cached_fn is None and self.jit.should_compile(func_name):
-            func_entry   = self.functions.get(func_name, {})
-            func_def_node = func_entry.get("node")
-            if func_def_node:
-                ns = dict(self._jit_builtins)
-                for fname, fn in self.jit._cache.items():
-                    if callable(fn):
-                        ns[fname] = fn
-                cached_fn = self.jit.try_compile(func_name, func_def_node, ns)
-        if cached_fn is not None:
-            try:
-                result = cached_fn(*args)
-                self.stack.append(result)
-                return ip
-            except Exception:
-                pass
+    def _jit_emit(self, line):
+        self.output.append(line)
+
+    def _jit_str(self, obj):
+        if type(obj) is Instance:
+            return self._instance_str(obj)
+        return str(obj)
 
+    def _jit_type(self, obj):
+        # As _dispatch_call's type(): the class name for an Instance.
+        if type(obj) is Instance:
+            return obj._cls
+        return type(obj)
+
+    def _jit_getattr(self, obj, name):
+        if type(obj) is Instance:
+            return self._instance_attr(obj, name)
+        return getattr(obj, name, None)
+
+    def _jit_setattr(self, obj, name, value):
+        if type(obj) is Instance:
+            obj.set_attr(name, value)
+        else:
+            setattr(obj, name, value)
+
+    def _jit_call(self, func, *args):
+        return self.call(func, args)
+
+    def _jit_call_method(self, obj, name, *args):
+        if type(obj) is Instance:
+            method_node, found_class = self._find_method(obj._cls, name)
+            if method_node is None:
+                raise AttributeError(f"Class '{obj._cls}' has no method '{name}'")
+            return self._run_method(method_node, found_class, obj, args)
+        method = getattr(obj, name, None)
+        if method is None:
+            raise AttributeError(f"'{type(obj).__name__}' has no attribute '{name}'")
+        result = method(*args)
+        if result is None and isinstance(obj, str):
+            return obj
+        return result
+
+    # The JIT namespace binds each user function and class to one of these
+    # until (for functions) it is compiled; names _dispatch_call resolves
+    # as builtins first are left alone.
+
+    def _jit_construct(self, class_name):
+        return lambda *args: self._construct(class_name, args)
+
+    def _jit_function(self, func_name):
+        return lambda *args: self._run_function(func_name, args)
+
+    def _call_closure(self, closure, args, ip, kwargs=None):
+        node = closure.node
+        code = self._compile_function(node)
+        frame = self._closure_frame_for(closure, self._bind_arguments(node, args, kwargs))
+        if node.is_generator:
+            self.stack.append(self._make_generator(node.name, code, frame))
+            return ip
+        self._charge_closure(node, code)
+        self._push_frame(frame, code, ip)
+        return -1
+
+    def _closure_frame_for(self, closure, values):
+        """A frame for calling ``closure``: its captured variables under the arguments."""
+        frame = self._frame_for(closure.node, values)
+        variables = frame.variables
+        for name, value in closure.captured.items():
+            variables.setdefault(name, value)
+        return frame
+
+    def _charge_closure(self, node, code):
+        # Closures are not compiled, but counted and charged like any call.
+        if self.call_counts is not None:
+            self._count_call(node.name)
+        if self.budget is not None:
+            self.budget.charge(len(code))
+
+    def _is_user_function(self, name):
+        """True if a call to ``name`` goes straight to _call_function.
+
+        Builtins _dispatch_call handles and classes of the same name take
+        precedence over a user function, as they do in _dispatch_call.
+        """
+        return (name in self.functions and name not in _DISPATCH_BUILTINS
+                and name not in self.classes and name not in self._rebound)
+
+    def _call_function(self, func_name, args, ip, kwargs=None):
         func = self.functions[func_name]
-        new_frame = Frame()
-        for param, val in zip(func["params"], args):
-            new_frame.variables[param] = val
-        self.frames.append(new_frame)
-        self.call_stack.append((self.instructions, ip + 1))
-        self.instructions = func["instructions"]
+        node = func["node"]
+        values = self._bind_arguments(node, args, kwargs)
+        if node.is_generator:
+            new_frame = self._frame_for(node, values)
+            self.stack.append(self._make_generator(func_name, func["instructions"], new_frame))
+            return ip
+
+        compiled, profile = self._jit_lookup(func_name, node, values)
+        if compiled is not None:
+            # Compiled code only runs where the interpreter would behave the
+            # same, so an exception from it is the program's own and unwinds
+            # normally; guard failures re-run the call through _run_bound.
+            self.stack.append(compiled(*values))
+            return ip
+
+        new_frame = self._frame_for(node, values)
+        new_frame.profile = profile
+        self._push_frame(new_frame, func["instructions"], ip)
         return -1
 
     def run(self):
-        ip = 0
-
-        while ip < len(self.instructions):
-            instr = self.instructions[ip]
-            op    = instr.opcode
-
-            if op == "LOAD_CONST":
-                self.stack.append(instr.argument)
-
-            elif op == "LOAD_VAR":
-                self.stack.append(self._load_var(instr.argument))
-
-            elif op == "STORE_VAR":
-                name = instr.argument
-                globals_set = self.current_frame().variables.get("__globals__")
-                if isinstance(globals_set, set) and name in globals_set:
-                    self.frames[0].variables[name] = self.stack.pop()
-                else:
-                    self.current_frame().variables[name] = self.stack.pop()
-
-            elif op == "BUILD_LIST":
-                count = instr.argument
-                elems = [self.stack.pop() for _ in range(count)]
-                elems.reverse()
-                self.stack.append(elems)
-
-            elif op == "BUILD_TUPLE":
-                count = instr.argument
-                elems = [self.stack.pop() for _ in range(count)]
-                elems.reverse()
-                self.stack.append(tuple(elems))
-
-            elif op == "UNPACK_SEQUENCE":
-                n   = instr.argument
-                seq = self.stack.pop()
-                items = list(seq)
-                if len(items) != n:
-                    raise ValueError(
-                        f"not enough values to unpack (expected {n}, got {len(items)})"
-                    )
-                for item in reversed(items):
-                    self.stack.append(item)
-
-            elif op == "LIST_APPEND":
-                value = self.stack.pop()
-                lst   = self.stack.pop()
-                lst.append(value)
-               
-            elif op == "LOAD_INDEX":
-                index = self.stack.pop()
-                lst   = self.stack.pop()
-                self.stack.append(lst[index])
-
-            elif op == "STORE_INDEX":
-                value = self.stack.pop()
-                index = self.stack.pop()
-                lst   = self.stack.pop()
-                lst[index] = value
-
-            elif op == "POP_TOP":
-                if self.stack:
-                    self.stack.pop()
-
-            elif op == "PRINT":
-                count  = instr.argument if instr.argument is not None else 1
-                values = [self.stack.pop() for _ in range(count)]
-                values.reverse()
-                self.output.append(" ".join(self._fmt(v) for v in values))
-
-            elif op in ("ADD", "SUB", "MUL", "DIV", "MOD", "POW", "FLOORDIV"):
-                b = self.stack.pop()
-                a = self.stack.pop()
-                if op == "ADD":
-                    result = a + b
-                elif op == "SUB":
-                    result = a - b
-                elif op == "MUL":
-                    result = a * b
-                elif op == "DIV":
-                    result = a / b
-                elif op == "MOD":
-                    result = a % b
-                elif op == "FLOORDIV":
-                    result = a // b
-                else:
-                    result = a ** b
-                self.stack.append(result)
-
-            elif op == "UNARY_NEG":
-                self.stack.append(-self.stack.pop())
-
-            elif op == "UNARY_NOT":
-                self.stack.append(not self.stack.pop())
-
-            elif op == "BINARY_AND":
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a and b)
-
-            elif op == "BINARY_OR":
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a or b)
-
-            elif op == "COMPARE":
-                b = self.stack.pop()
-                a = self.stack.pop()
-                cmp = instr.argument
-                if cmp == "==":
-                    self.stack.append(a == b)
-                elif cmp == "!=":
-                    self.stack.append(a != b)
-                elif cmp == "<":
-                    self.stack.append(a < b)
-                elif cmp == ">":
-                    self.stack.append(a > b)
-                elif cmp == "<=":
-                    self.stack.append(a <= b)
-                elif cmp == ">=":
-                    self.stack.append(a >= b)
-                elif cmp == "is":
-                    self.stack.append(a is b)
-                elif cmp == "is not":
-                    self.stack.append(a is not b)
-                elif cmp == "in":
-                    self.stack.append(a in b)
-                elif cmp == "not in":
-                    self.stack.append(a not in b)
-                else:
-                    self.stack.append(False)
-            elif op == "JUMP_IF_FALSE":
-                if not self.stack.pop():
-                    ip = instr.argument
-                    continue
-
-            elif op == "JUMP":
-                ip = instr.argument
-                continue
-            elif op == "DEFINE_FUNCTION":
-                func_node = instr.argument
-                self.functions[func_node.name] = {
-                    "params":       func_node.params,
-                    "instructions": self._compile_body(func_node.body),
-                    "node":         func_node,  
-                }
-            elif op == "CALL_FUNCTION":
-                name, arg_count = instr.argument
-                args = [self.stack.pop() for _ in range(arg_count)]
-                args.reverse()
-                ip = self._dispatch_call(name, args, ip)
-                if ip == -1:
-                    ip = 0
-                    continue
-                else:
-                    ip += 1
-                    continue
-            elif op == "RETURN_VALUE":
-                return_value = self.stack.pop() if self.stack else None
-                self.frames.pop()
-                if self.call_stack:
-                    self.instructions, ip = self.call_stack.pop()
-                    ip -= 1  
-                else:
-                    self.stack.append(return_value)
-                    break
-                self.stack.append(return_value)
-            elif op == "DEFINE_CLASS":
-                class_node = instr.argument
-                self.classes[class_node.name] = class_node
-            elif op == "LOAD_ATTR":
-                attr = instr.argument
-                obj  = self.stack.pop()
-                if isinstance(obj, dict) and "__attributes__" in obj:
-                    self.stack.append(obj["__attributes__"].get(attr))
-                else:
-                    self.stack.append(getattr(obj, attr, None))
-
-            elif op == "STORE_ATTR":
-                attr  = instr.argument
-                value = self.stack.pop()
-                obj   = self.stack.pop()
-                if isinstance(obj, dict) and "__attributes__" in obj:
-                    obj["__attributes__"][attr] = value
-                else:
-                    setattr(obj, attr, value)
-            elif op == "CALL_METHOD":
-                method_name, arg_count = instr.argument
-                args = [self.stack.pop() for _ in range(arg_count)]
-                args.reverse()
-                obj  = self.stack.pop()
-
-                if isinstance(obj, str):
-                    m = getattr(str, method_name, None)
-                    if m is None:
-                        raise AttributeError(f"str has no method '{method_name}'")
-                    result = getattr(obj, method_name)(*args)
-                    self.stack.append(result if result is not None else obj)
-                    ip += 1
-                    continue
-
-                if isinstance(obj, list):
-                    m = getattr(list, method_name, None)
-                    if m is None:
-                        raise AttributeError(f"list has no method '{method_name}'")
-                    result = getattr(obj, method_name)(*args)
-                    self.stack.append(result if result is not None else None)
-                    ip += 1
-                    continue
-
-                if not (isinstance(obj, dict) and "__class__" in obj):
-                    method = getattr(obj, method_name, None)
-                    if method is None:
-                        raise AttributeError(
-                            f"'{type(obj).__name__}' has no attribute '{method_name}'"
-                        )
-                    result = method(*args)
-                    self.stack.append(result)
-                    ip += 1
-                    continue
-                method_node, found_class = self._find_method(obj["__class__"], method_name)
-                if method_node is None:
-                    raise AttributeError(
-                        f"Class '{obj['__class__']}' has no method '{method_name}'"
-                    )
-                ip = self._call_method_node(method_node, obj, args, ip, class_name=found_class)
-                ip = 0
-                continue
-
-            elif op == "CALL_METHOD_KW":
-                method_name, pos_count, kw_count = instr.argument
-                kw_values = [self.stack.pop() for _ in range(kw_count)]
-                kw_keys = [self.stack.pop() for _ in range(kw_count)]
-                args = [self.stack.pop() for _ in range(pos_count)]
-                kw_values.reverse()
-                kw_keys.reverse()
-                args.reverse()
-                kwargs = {}
-                for key, value in zip(kw_keys, kw_values):
-                    if key is None:
-                        if not isinstance(value, dict):
-                            raise TypeError("** argument must be a mapping")
-                        kwargs.update(value)
+        if self.budget is not None:
+            self.budget.start()
+        if self._execute(0) is not None:
+            raise SyntaxError("'yield' outside function")
+
+        # Sub-VMs write into their parent's sink and leave it to the parent.
+        if not self._owns_output:
+            return ""
+        self.output.flush()
+        return self.output.getvalue()
+
+    def _execute(self, ip):
+        """Dispatch from ``ip`` until the code ends or YIELD_VALUE suspends it.
+
+        Returns the index to resume at after a yield, or None once the code
+        has run to completion.
+        """
+        handlers = _HANDLERS
+        counts = self.opcode_counts
+        self._resume_ip = None
+        self._running += 1
+        try:
+            while True:
+                try:
+                    if counts is None:
+                        while ip < len(self.instructions):
+                            instr = self.instructions[ip]
+                            ip = handlers[instr.opnum](self, instr, ip)
                     else:
-                        kwargs[key] = value
-
-                obj = self.stack.pop()
-
-                if isinstance(obj, str):
-                    m = getattr(str, method_name, None)
-                    if m is None:
-                        raise AttributeError(f"str has no method '{method_name}'")
-                    result = getattr(obj, method_name)(*args, **kwargs)
-                    self.stack.append(result if result is not None else obj)
-                    ip += 1
-                    continue
-
-                if isinstance(obj, list):
-                    m = getattr(list, method_name, None)
-                    if m is None:
-                        raise AttributeError(f"list has no method '{method_name}'")
-                    result = getattr(obj, method_name)(*args, **kwargs)
-                    self.stack.append(result if result is not None else None)
-                    ip += 1
-                    continue
-
-                if not (isinstance(obj, dict) and "__class__" in obj):
-                    method = getattr(obj, method_name, None)
-                    if method is None:
-                        raise AttributeError(
-                            f"'{type(obj).__name__}' has no attribute '{method_name}'"
-                        )
-                    result = method(*args, **kwargs)
-                    self.stack.append(result)
-                    ip += 1
-                    continue
-
-                method_node, found_class = self._find_method(obj["__class__"], method_name)
-                if method_node is None:
-                    raise AttributeError(
-                        f"Class '{obj['__class__']}' has no method '{method_name}'"
-                    )
-                ip = self._call_method_node(
-                    method_node,
-                    obj,
-                    args,
-                    ip,
-                    class_name=found_class,
-                    kwargs=kwargs,
+                        while ip < len(self.instructions):
+                            instr = self.instructions[ip]
+                            counts[instr.opnum] += 1
+                            ip = handlers[instr.opnum](self, instr, ip)
+                    break
+                except Exception as exc:
+                    ip = self._unwind(exc, ip)
+        finally:
+            self._running -= 1
+        return self._resume_ip
+
+    def _unwind(self, exc, ip):
+        """Find the handler for an exception raised at ``ip``.
+
+        Pops call frames until an instruction covered by a try statement is
+        found, then cuts the operand stack back to the handler's depth above
+        that frame's base (keeping enclosing loop iterators), pushes the
+        exception and returns the handler's index.  Re-raises when no frame
+        run by this dispatch loop handles it.
+        """
+        while True:
+            entry = self.instructions[ip].handler
+            if entry is not None:
+                handler, depth = entry
+                del self.stack[self.frames[-1].stack_base + depth:]
+                self.stack.append(exc)
+                return handler
+            if len(self.frames) <= self._floor:
+                raise exc
+            ip = self._pop_frame() - 1
+
+    # ------------------------------------------------------------------
+    # Opcode handlers.  Each takes the current instruction and its index
+    # and returns the index of the next instruction to execute.  They are
+    # collected into _HANDLERS (indexed by Instruction.opnum) below the
+    # class, so run() never compares opcode strings.
+    # ------------------------------------------------------------------
+
+    def _op_NOP(self, instr, ip):
+        return ip + 1
+
+    def _op_LOAD_CONST(self, instr, ip):
+        self.stack.append(instr.argument)
+        return ip + 1
+
+    def _op_LOAD_VAR(self, instr, ip):
+        variables = self.frames[-1].variables
+        name = instr.argument
+        if name in variables:
+            self.stack.append(variables[name])
+        else:
+            self.stack.append(self._load_var(name))
+        return ip + 1
+
+    def _op_STORE_VAR(self, instr, ip):
+        self._store_var(instr.argument, self.stack.pop())
+        return ip + 1
+
+    def _store_var(self, name, value):
+        variables = self.frames[-1].variables
+        globals_set = variables.get("__globals__")
+        if isinstance(globals_set, set) and name in globals_set:
+            self.globals[name] = value
+        else:
+            variables[name] = value
+
+    def _op_LOAD_FAST(self, instr, ip):
+        frame = self.frames[-1]
+        value = frame.fast[instr.argument]
+        if value is _UNBOUND:
+            value = self._load_unbound_fast(frame, instr.argument)
+        self.stack.append(value)
+        return ip + 1
+
+    def _load_unbound_fast(self, frame, slot):
+        name = frame.slot_names[slot]
+        value = frame.variables.get(name, _UNBOUND)
+        if value is _UNBOUND:
+            raise UnboundLocalError(
+                f"cannot access local variable '{name}' where it is not associated with a value")
+        return value
+
+    def _op_STORE_FAST(self, instr, ip):
+        self.frames[-1].fast[instr.argument] = self.stack.pop()
+        return ip + 1
+
+    def _op_LOAD_GLOBAL(self, instr, ip):
+        name = instr.argument
+        if name in self.globals:
+            self.stack.append(self.globals[name])
+        else:
+            self.stack.append(self._load_global(name))
+        return ip + 1
+
+    def _op_STORE_GLOBAL(self, instr, ip):
+        self.globals[instr.argument] = self.stack.pop()
+        return ip + 1
+
+    def _op_BUILD_LIST(self, instr, ip):
+        count = instr.argument
+        elems = [self.stack.pop() for _ in range(count)]
+        elems.reverse()
+        self.stack.append(elems)
+        return ip + 1
+
+    def _op_BUILD_TUPLE(self, instr, ip):
+        count = instr.argument
+        elems = [self.stack.pop() for _ in range(count)]
+        elems.reverse()
+        self.stack.append(tuple(elems))
+        return ip + 1
+
+    def _op_UNPACK_SEQUENCE(self, instr, ip):
+        n   = instr.argument
+        seq = self.stack.pop()
+        items = list(seq)
+        if len(items) != n:
+            raise ValueError(
+                f"not enough values to unpack (expected {n}, got {len(items)})"
+            )
+        for item in reversed(items):
+            self.stack.append(item)
+        return ip + 1
+
+    def _op_LIST_APPEND(self, instr, ip):
+        value = self.stack.pop()
+        lst   = self.stack.pop()
+        lst.append(value)
+        return ip + 1
+
+    def _op_LOAD_INDEX(self, instr, ip):
+        index = self.stack.pop()
+        lst   = self.stack.pop()
+        self.stack.append(lst[index])
+        return ip + 1
+
+    def _op_STORE_INDEX(self, instr, ip):
+        value = self.stack.pop()
+        index = self.stack.pop()
+        lst   = self.stack.pop()
+        lst[index] = value
+        return ip + 1
+
+    def _op_POP_TOP(self, instr, ip):
+        if self.stack:
+            self.stack.pop()
+        return ip + 1
+
+    def _op_PRINT(self, instr, ip):
+        count  = instr.argument if instr.argument is not None else 1
+        values = [self.stack.pop() for _ in range(count)]
+        values.reverse()
+        self.output.append(" ".join(self._fmt(v) for v in values))
+        return ip + 1
+
+    def _op_ADD(self, instr, ip):
+        b = self.stack.pop()
+        self.stack[-1] = self.stack[-1] + b
+        return ip + 1
+
+    def _op_SUB(self, instr, ip):
+        b = self.stack.pop()
+        self.stack[-1] = self.stack[-1] - b
+        return ip + 1
+
+    def _op_MUL(self, instr, ip):
+        b = self.stack.pop()
+        self.stack[-1] = self.stack[-1] * b
+        return ip + 1
+
+    def _op_DIV(self, instr, ip):
+        b = self.stack.pop()
+        self.stack[-1] = self.stack[-1] / b
+        return ip + 1
+
+    def _op_MOD(self, instr, ip):
+        b = self.stack.pop()
+        self.stack[-1] = self.stack[-1] % b
+        return ip + 1
+
+    def _op_FLOORDIV(self, instr, ip):
+        b = self.stack.pop()
+        self.stack[-1] = self.stack[-1] // b
+        return ip + 1
+
+    def _op_POW(self, instr, ip):
+        b = self.stack.pop()
+        self.stack[-1] = self.stack[-1] ** b
+        return ip + 1
+
+    def _op_UNARY_NEG(self, instr, ip):
+        self.stack.append(-self.stack.pop())
+        return ip + 1
+
+    def _op_UNARY_NOT(self, instr, ip):
+        self.stack.append(not self.stack.pop())
+        return ip + 1
+
+    def _op_COMPARE(self, instr, ip):
+        b = self.stack.pop()
+        a = self.stack.pop()
+        if type(a) is Instance or type(b) is Instance:
+            self.stack.append(self._compare(instr.argument, a, b))
+            return ip + 1
+        cmp = _COMPARE_OPS.get(instr.argument)
+        self.stack.append(cmp(a, b) if cmp is not None else False)
+        return ip + 1
+
+    def _op_JUMP_IF_FALSE(self, instr, ip):
+        if not self.stack.pop():
+            return instr.argument
+        return ip + 1
+
+    def _op_JUMP_IF_TRUE(self, instr, ip):
+        if self.stack.pop():
+            return instr.argument
+        return ip + 1
+
+    def _op_JUMP_IF_FALSE_OR_POP(self, instr, ip):
+        if not self.stack[-1]:
+            return instr.argument
+        self.stack.pop()
+        return ip + 1
+
+    def _op_JUMP_IF_TRUE_OR_POP(self, instr, ip):
+        if self.stack[-1]:
+            return instr.argument
+        self.stack.pop()
+        return ip + 1
+
+    def _op_JUMP(self, instr, ip):
+        if instr.loop is not None:
+            return self._back_edge(instr, ip)
+        target = instr.argument
+        if target <= ip and self.budget is not None:
+            # A continue, or a comprehension's loop.
+            self.budget.charge(ip - target + 1)
+        return target
+
+    def _back_edge(self, instr, ip):
+        """Count a loop back-edge; hand a hot module-level loop to the JIT.
+
+        The counter lives in the JUMP's inline cache and is replaced by the
+        compiled loop (or False if the loop cannot be compiled).  While the
+        JIT compiles it in the background the loop goes on interpreting and
+        asks again after another ``osr_threshold`` back-edges.  Only code
+        running directly on the module variables is replaced; inside calls
+        the whole function is compiled instead.  The compiled loop runs the
+        remaining iterations and execution resumes after the loop.
+        """
+        target = instr.argument
+        if self.budget is not None:
+            self.budget.charge(ip - target + 1)
+        if self.frames[-1].variables is not self.globals:
+            return target
+        compiled = instr.cache
+        if compiled is None or type(compiled) is int:
+            count = (compiled or 0) + 1
+            if count < self.jit.osr_threshold and instr.loop not in self.jit.preloaded:
+                instr.cache = count
+                return target
+            kind = "for" if self.instructions[target].opcode == "FOR_ITER" else "while"
+            compiled = self.jit.compile_loop(
+                instr.loop, self.globals,
+                pure_names=self._jit_builtins, name=f"<{kind} loop>",
+            )
+            instr.cache = 0 if compiled is None else compiled
+        if not compiled:
+            return target
+
+        head = self.instructions[target]
+        is_for = head.opcode == "FOR_ITER"
+        if not compiled(self.globals, self.stack[-1] if is_for else None):
+            # A variable changed type since compiling: go on interpreting
+            # and recompile once the loop is hot again.
+            self.jit.record_bailout(instr.loop, ())
+            instr.cache = 0
+            return target
+        if is_for:
+            # The compiled loop exhausted the iterator, as FOR_ITER would.
+            self.stack.pop()
+            return head.argument
+        return ip + 1
+
+    # Superinstructions (see compiler.peephole).
+
+    def _op_INC_VAR(self, instr, ip):
+        name, delta = instr.argument
+        variables = self.frames[-1].variables
+        value = variables[name] if name in variables else self._load_var(name)
+        self._store_var(name, value + delta)
+        return ip + 1
+
+    def _op_INC_FAST(self, instr, ip):
+        slot, delta = instr.argument
+        fast = self.frames[-1].fast
+        value = fast[slot]
+        if value is _UNBOUND:
+            value = self._load_unbound_fast(self.frames[-1], slot)
+        fast[slot] = value + delta
+        return ip + 1
+
+    def _op_COMPARE_JUMP(self, instr, ip):
+        op, target = instr.argument
+        b = self.stack.pop()
+        a = self.stack.pop()
+        if type(a) is Instance or type(b) is Instance:
+            return ip + 1 if self._compare(op, a, b) else target
+        cmp = _COMPARE_OPS.get(op)
+        if cmp is not None and cmp(a, b):
+            return ip + 1
+        return target
+
+    def _op_DEFINE_FUNCTION(self, instr, ip):
+        func_node = instr.argument
+        previous = self.functions.get(func_node.name)
+        if previous is not None and previous["node"] is not func_node:
+            self.jit.forget(func_node.name)
+        if func_node.defaults:
+            self.default_values[func_node] = self._eval_defaults(func_node)
+        self.functions[func_node.name] = {
+            "params":       func_node.params,
+            "instructions": self._compile_function(func_node),
+            "node":         func_node,
+        }
+        name = func_node.name
+        if name not in _DISPATCH_BUILTINS and name not in self.classes:
+            self.jit.link(name, self._jit_function(name))
+        if name in self._rebound:
+            # A new definition replaces what a decorator bound to the name.
+            self._rebound.discard(name)
+            self._store_var(name, name)
+        if len(self.frames) > 1:
+            self._store_var(name, Closure(func_node, self.frames[-1].snapshot(), self))
+        return ip + 1
+
+    def _op_CALL_FUNCTION(self, instr, ip):
+        name, arg_count = instr.argument
+        stack = self.stack
+        if arg_count:
+            args = stack[-arg_count:]
+            del stack[-arg_count:]
+        else:
+            args = []
+        if self._is_user_function(name):
+            ip = self._call_function(name, args, ip)
+        else:
+            ip = self._dispatch_call(name, args, ip)
+        if ip == -1:
+            return 0
+        return ip + 1
+
+    def _op_RETURN_VALUE(self, instr, ip):
+        return_value = self.stack.pop() if self.stack else None
+        # Drop whatever the frame left behind, e.g. iterators of the loops
+        # being returned from.
+        frame = self.frames[-1]
+        del self.stack[frame.stack_base:]
+        self.stack.append(return_value)
+        if frame.profile is not None:
+            frame.profile.record_return(return_value)
+        if len(self.frames) > 1:
+            return self._pop_frame()
+        # The bottom frame of this VM: the code ends here.
+        self.frames.pop()
+        return len(self.instructions)
+
+    def _op_DEFINE_CLASS(self, instr, ip):
+        from compiler.ast_nodes import FunctionDef
+        class_node = instr.argument
+        if class_node.name in self.classes:
+            self.code_cache.class_epoch += 1
+        for stmt in class_node.body:
+            if isinstance(stmt, FunctionDef) and stmt.defaults:
+                self.default_values[stmt] = self._eval_defaults(stmt)
+        self.classes[class_node.name] = build_class_layout(class_node, self.classes)
+        if class_node.name not in _DISPATCH_BUILTINS:
+            self.jit.link(class_node.name, self._jit_construct(class_node.name))
+        if class_node.name in self._rebound:
+            self._rebound.discard(class_node.name)
+            self._store_var(class_node.name, class_node.name)
+        return ip + 1
+
+    # LOAD_ATTR and STORE_ATTR keep the receiver shape they last saw in
+    # instr.cache together with the attribute's offset, so a monomorphic
+    # access site costs one identity check and a list index.
+
+    def _op_LOAD_ATTR(self, instr, ip):
+        obj = self.stack[-1]
+        if type(obj) is Instance:
+            shape = obj._shape
+            cache = instr.cache
+            if cache is not None and cache[0] is shape:
+                index = cache[1]
+            else:
+                index = shape.offsets.get(instr.argument)
+                instr.cache = (shape, index)
+            self.stack[-1] = (obj._values[index] if index is not None
+                              else self._instance_attr(obj, instr.argument))
+        else:
+            self.stack[-1] = getattr(obj, instr.argument, None)
+        return ip + 1
+
+    def _op_STORE_ATTR(self, instr, ip):
+        value = self.stack.pop()
+        obj   = self.stack.pop()
+        if type(obj) is not Instance:
+            setattr(obj, instr.argument, value)
+            return ip + 1
+        shape = obj._shape
+        cache = instr.cache
+        if cache is not None and cache[0] is shape:
+            index, new_shape = cache[1], cache[2]
+        else:
+            index = shape.offsets.get(instr.argument)
+            if index is None:
+                index = len(shape.offsets)
+                new_shape = shape.with_attribute(instr.argument)
+            else:
+                new_shape = shape
+            instr.cache = (shape, index, new_shape)
+        if new_shape is shape:
+            obj._values[index] = value
+        else:
+            obj._values.append(value)
+            obj._shape = new_shape
+        return ip + 1
+
+    def _op_CALL_METHOD(self, instr, ip):
+        method_name, arg_count = instr.argument
+        stack = self.stack
+        if arg_count:
+            args = stack[-arg_count:]
+            del stack[-arg_count:]
+        else:
+            args = []
+        obj = stack.pop()
+
+        if type(obj) is Instance:
+            method_node, found_class, code = self._cached_method(instr, obj._cls, method_name)
+            if method_node is None:
+                raise AttributeError(
+                    f"Class '{obj._cls}' has no method '{method_name}'"
                 )
-                ip = 0
-                continue
-            elif op == "CALL_SUPER_METHOD":
-                instr_arg = instr.argument
-                if len(instr_arg) == 3:
-                    method_name, arg_count, explicit_class = instr_arg
-                else:
-                    method_name, arg_count = instr_arg
-                    explicit_class = None
-                args = [self.stack.pop() for _ in range(arg_count)]
-                args.reverse()
-                self_obj = self.current_frame().variables.get("self")
-                current_class = self.current_frame().variables.get(
-                    "__current_class__", self_obj.get("__class__", "") if self_obj else ""
+            return self._call_method_node(
+                method_node, obj, args, ip, class_name=found_class, code=code
+            ) + 1
+
+        if isinstance(obj, str):
+            m = getattr(str, method_name, None)
+            if m is None:
+                raise AttributeError(f"str has no method '{method_name}'")
+            result = getattr(obj, method_name)(*args)
+            self.stack.append(result if result is not None else obj)
+            return ip + 1
+
+        if isinstance(obj, list):
+            m = getattr(list, method_name, None)
+            if m is None:
+                raise AttributeError(f"list has no method '{method_name}'")
+            result = getattr(obj, method_name)(*args)
+            self.stack.append(result if result is not None else None)
+            return ip + 1
+
+        method = getattr(obj, method_name, None)
+        if method is None:
+            raise AttributeError(
+                f"'{type(obj).__name__}' has no attribute '{method_name}'"
+            )
+        result = method(*args)
+        self.stack.append(result)
+        return ip + 1
+
+    def _op_CALL_METHOD_KW(self, instr, ip):
+        method_name, pos_count, kw_count = instr.argument
+        # Keywords were pushed as key, value pairs after the positionals.
+        kw_items = self.stack[len(self.stack) - 2 * kw_count:]
+        del self.stack[len(self.stack) - 2 * kw_count:]
+        args = [self.stack.pop() for _ in range(pos_count)]
+        args.reverse()
+        kwargs = {}
+        for key, value in zip(kw_items[::2], kw_items[1::2]):
+            if key is None:
+                if not isinstance(value, dict):
+                    raise TypeError("** argument must be a mapping")
+                kwargs.update(value)
+            else:
+                kwargs[key] = value
+
+        obj = self.stack.pop()
+
+        if isinstance(obj, str):
+            m = getattr(str, method_name, None)
+            if m is None:
+                raise AttributeError(f"str has no method '{method_name}'")
+            result = getattr(obj, method_name)(*args, **kwargs)
+            self.stack.append(result if result is not None else obj)
+            return ip + 1
+
+        if isinstance(obj, list):
+            m = getattr(list, method_name, None)
+            if m is None:
+                raise AttributeError(f"list has no method '{method_name}'")
+            result = getattr(obj, method_name)(*args, **kwargs)
+            self.stack.append(result if result is not None else None)
+            return ip + 1
+
+        if type(obj) is not Instance:
+            method = getattr(obj, method_name, None)
+            if method is None:
+                raise AttributeError(
+                    f"'{type(obj).__name__}' has no attribute '{method_name}'"
                 )
-                lookup_root = explicit_class if explicit_class else current_class
-                parent_name = getattr(self.classes.get(lookup_root), "parent", None)
-                if not parent_name:
-                    raise Exception(f"Class '{lookup_root}' has no parent for super()")
-                method_node, found_class = self._find_method(parent_name, method_name)
-                if method_node is None:
-                    raise AttributeError(
-                        f"Parent class '{parent_name}' has no method '{method_name}'"
-                    )
-                ip = self._call_method_node(method_node, self_obj, args, ip, class_name=found_class)
-                ip = 0
-                continue
-
-            elif op == "JUMP_IF_TRUE":
-                if self.stack.pop():
-                    ip = instr.argument
-                    continue
-
-            elif op == "DUP_TOP":
-                self.stack.append(self.stack[-1])
-
-            elif op in ("BITWISE_AND", "BITWISE_OR", "BITWISE_XOR",
-                        "BITWISE_LSHIFT", "BITWISE_RSHIFT"):
-                b = self.stack.pop()
-                a = self.stack.pop()
-                if op == "BITWISE_AND":
-                    self.stack.append(int(a) & int(b))
-                elif op == "BITWISE_OR":
-                    self.stack.append(int(a) | int(b))
-                elif op == "BITWISE_XOR":
-                    self.stack.append(int(a) ^ int(b))
-                elif op == "BITWISE_LSHIFT":
-                    self.stack.append(int(a) << int(b))
-                else:
-                    self.stack.append(int(a) >> int(b))
-
-            elif op == "UNARY_BITNOT":
-                self.stack.append(~int(self.stack.pop()))
-
-            elif op == "BUILD_DICT":
-                count = instr.argument
-                d = {}
-                pairs = [self.stack.pop() for _ in range(count * 2)]
-                pairs.reverse()
-                for i in range(0, len(pairs), 2):
-                    k, v = pairs[i], pairs[i + 1]
-                    d[k] = v
-                self.stack.append(d)
-
-            elif op == "DICT_SPREAD":
-                spread = self.stack.pop()
-                if self.stack and isinstance(self.stack[-1], dict):
-                    self.stack[-1].update(spread)
-                else:
-                    self.stack.append(dict(spread))
-
-            elif op == "DICT_SET_ITEM":
-                value = self.stack.pop()
-                key   = self.stack.pop()
-                d     = self.stack[-1]
-                d[key] = value
-
-            elif op == "BUILD_SET":
-                count = instr.argument
-                elems = [self.stack.pop() for _ in range(count)]
-                self.stack.append(set(elems))
-
-            elif op == "SET_ADD":
-                elem = self.stack.pop()
-                s    = self.stack[-1]
-                s.add(elem)
-
-            elif op == "BUILD_SLICE":
-                step  = self.stack.pop()
-                stop  = self.stack.pop()
-                start = self.stack.pop()
-                self.stack.append(slice(start, stop, step))
-
-            elif op == "UNPACK_STARRED":
-                val = self.stack.pop()
-                if isinstance(val, (list, tuple)):
-                    for item in val:
-                        self.stack.append(item)
-                else:
-                    self.stack.append(val)
-
-            elif op == "IMPORT_MODULE":
-                names = instr.argument   
-                for name, alias in names:
-                    mod = _import_module(name)
-                    store_as = alias if alias else name.split(".")[0]
-                    self.current_frame().variables[store_as] = mod
-
-            elif op == "IMPORT_FROM":
-                module_name, names = instr.argument   
-                mod = _import_module(module_name)
-                for attr, alias in names:
-                    store_as = alias if alias else attr
-                    if attr == "*":
-                        pub = getattr(mod, "__all__", None)
-                        attrs = pub if pub else [a for a in dir(mod) if not a.startswith("_")]
-                        for a in attrs:
-                            self.current_frame().variables[a] = getattr(mod, a)
-                    else:
-                        self.current_frame().variables[store_as] = getattr(mod, attr)
-
-            elif op == "DECLARE_GLOBAL":
-                for name in instr.argument:
-                    self.current_frame().variables.setdefault("__globals__", set())
-                    if isinstance(self.current_frame().variables.get("__globals__"), set):
-                        self.current_frame().variables["__globals__"].add(name)
-
-            elif op == "DECLARE_NONLOCAL":
-                pass
-
-            elif op == "DELETE_VAR":
-                name = instr.argument
-                for frame in reversed(self.frames):
-                    if name in frame.variables:
-                        del frame.variables[name]
-                        break
-
-            elif op == "RAISE_EXCEPTION":
-                exc = self.stack.pop()
-                if exc is None:
-                    raise RuntimeError("re-raise with no active exception")
-                if isinstance(exc, type):
-                    raise exc()
-                if isinstance(exc, Exception):
-                    raise exc
-                raise RuntimeError(str(exc))
-
-            elif op == "RAISE_ASSERTION":
-                msg = self.stack.pop()
-                raise AssertionError(str(msg) if msg is not None else "")
-
-            elif op == "EXEC_TRY":
-                node = instr.argument
-                try:
-                    sub = self._run_sub(node.body)
-                    self.output.extend(sub.output)
-                except Exception as caught:
-                    handled = False
-                    for handler in (node.handlers or []):
-                        if handler.exc_type is None or isinstance(
-                            caught,
-                            self._resolve_exception_type(handler.exc_type)
-                        ):
-                            sub = self._run_sub(handler.body, extra_vars={
-                                handler.var_name: caught
-                            } if handler.var_name else {})
-                            self.output.extend(sub.output)
-                            handled = True
-                            break
-                    if not handled:
-                        raise
-                else:
-                    if node.else_body:
-                        sub = self._run_sub(node.else_body)
-                        self.output.extend(sub.output)
-                finally:
-                    if node.finally_body:
-                        sub = self._run_sub(node.finally_body)
-                        self.output.extend(sub.output)
-
-            elif op == "EXEC_WITH":
-                node = instr.argument
-                ctx_expr, var_name = node.items[0]
-                ctx_instrs = self._compile_body([ctx_expr]
-                    if not isinstance(ctx_expr, list) else ctx_expr)
-                ctx_sub = VirtualMachine(ctx_instrs)
-                ctx_sub.frames    = [self.frames[-1]]
-                ctx_sub.functions = self.functions
-                ctx_sub.classes   = self.classes
-                ctx_sub._input_provider = self._input_provider
-                ctx_sub.run()
-                mgr = ctx_sub.stack[-1] if ctx_sub.stack else None
-                if hasattr(mgr, '__enter__'):
-                    val = mgr.__enter__()
-                else:
-                    val = mgr
-                if var_name:
-                    self.current_frame().variables[var_name] = val
-                try:
-                    sub = self._run_sub(node.body)
-                    self.output.extend(sub.output)
-                except Exception as e:
-                    if hasattr(mgr, '__exit__'):
-                        mgr.__exit__(type(e), e, None)
-                    raise
-                else:
-                    if hasattr(mgr, '__exit__'):
-                        mgr.__exit__(None, None, None)
-
-            elif op == "YIELD_VALUE":
-                val = self.stack.pop()
-                self.output.append(self._fmt(val))
-
-            elif op == "MAKE_LAMBDA":
-                node = instr.argument
-                captured = dict(self.current_frame().variables)
-                vm_ref = self
-
-                def _make_lambda(n, cap):
-                    def _fn(*call_args):
-                        new_frame = Frame()
-                        new_frame.variables.update(cap)
-                        for param, val in zip(n.params, call_args):
-                            new_frame.variables[param] = val
-                        for i, param in enumerate(n.params):
-                            if param not in new_frame.variables and i in n.defaults:
-                                dflt_instrs = vm_ref._compile_body([n.defaults[i]])
-                                dflt_sub = VirtualMachine(dflt_instrs)
-                                dflt_sub.frames = [Frame()]
-                                dflt_sub.functions = vm_ref.functions
-                                dflt_sub.classes   = vm_ref.classes
-                                dflt_sub.run()
-                                new_frame.variables[param] = (
-                                    dflt_sub.stack[-1] if dflt_sub.stack else None
-                                )
-                        from compiler.bytecode import BytecodeGenerator, Instruction
-                        from compiler.ast_nodes import Program, Return
-                        body_stmts = [Return(n.body)] if not isinstance(n.body, list) else n.body
-                        instrs = vm_ref._compile_body(body_stmts)
-                        sub = VirtualMachine(instrs)
-                        sub.frames = [new_frame]
-                        sub.functions = vm_ref.functions
-                        sub.classes   = vm_ref.classes
-                        sub._input_provider = vm_ref._input_provider
-                        sub.run()
-                        return sub.stack[-1] if sub.stack else None
-                    return _fn
-
-                self.stack.append(_make_lambda(node, captured))
-
-            elif op == "APPLY_DECORATOR":
-                dec = self.stack.pop()
-                fn  = self.stack.pop()
-                if callable(dec):
-                    self.stack.append(dec(fn))
-                else:
-                    self.stack.append(fn)
-
-            elif op == "CALL_FUNCTION_KW":
-                name, pos_count, kw_count = instr.argument
-                kw_values = [self.stack.pop() for _ in range(kw_count)]
-                kw_keys   = [self.stack.pop() for _ in range(kw_count)]
-                pos_args  = [self.stack.pop() for _ in range(pos_count)]
-                pos_args.reverse()
-                kw_keys.reverse()
-                kw_values.reverse()
-                kwargs = {}
-                for key, value in zip(kw_keys, kw_values):
-                    if key is None:
-                        if not isinstance(value, dict):
-                            raise TypeError("** argument must be a mapping")
-                        kwargs.update(value)
-                    else:
-                        kwargs[key] = value
-                all_args = pos_args
-                if name in self.functions:
-                    func = self.functions[name]
-                    params = func["params"]
-                    func_node = func.get("node")
-                    new_frame = Frame()
-                    for i, (param, val) in enumerate(zip(params, pos_args)):
-                        new_frame.variables[param] = val
-                    for param in params[len(pos_args):]:
-                        if param in kwargs:
-                            new_frame.variables[param] = kwargs[param]
-                    kwarg_name = getattr(func_node, "kwarg", None) if func_node else None
-                    if kwarg_name:
-                        extra_kwargs = {k: v for k, v in kwargs.items() if k not in params}
-                        new_frame.variables[kwarg_name] = extra_kwargs
-                    self.frames.append(new_frame)
-                    self.call_stack.append((self.instructions, ip + 1))
-                    self.instructions = func["instructions"]
-                    ip = 0
-                    continue
-                else:
-                    ip = self._dispatch_call(name, pos_args, ip, kwargs=kwargs)
-                    if ip == -1:
-                        ip = 0
-                    else:
-                        ip += 1
-                    continue
+            result = method(*args, **kwargs)
+            self.stack.append(result)
+            return ip + 1
+
+        method_node, found_class, code = self._cached_method(instr, obj._cls, method_name)
+        if method_node is None:
+            raise AttributeError(
+                f"Class '{obj._cls}' has no method '{method_name}'"
+            )
+        return self._call_method_node(
+            method_node,
+            obj,
+            args,
+            ip,
+            class_name=found_class,
+            kwargs=kwargs,
+            code=code,
+        ) + 1
+
+    def _op_CALL_SUPER_METHOD(self, instr, ip):
+        instr_arg = instr.argument
+        if len(instr_arg) == 3:
+            method_name, arg_count, explicit_class = instr_arg
+        else:
+            method_name, arg_count = instr_arg
+            explicit_class = None
+        args = [self.stack.pop() for _ in range(arg_count)]
+        args.reverse()
+        self_obj = self.current_frame().get("self")
+        current_class = self.current_frame().variables.get(
+            "__current_class__", self_obj._cls if type(self_obj) is Instance else ""
+        )
+        lookup_root = explicit_class if explicit_class else current_class
+        root = self.classes.get(lookup_root)
+        parent_name = root.node.parent if root is not None else None
+        if not parent_name:
+            raise Exception(f"Class '{lookup_root}' has no parent for super()")
+        # Continue along the receiver's MRO, so cooperative calls in a
+        # diamond reach every class once.
+        receiver = self.classes.get(self_obj._cls) if type(self_obj) is Instance else None
+        if receiver is None or lookup_root not in receiver.ancestors:
+            receiver = root
+        method_node, found_class, code = self._cached_method(
+            instr, receiver.name, method_name, after=lookup_root
+        )
+        if method_node is None:
+            raise AttributeError(
+                f"Parent class '{parent_name}' has no method '{method_name}'"
+            )
+        return self._call_method_node(
+            method_node, self_obj, args, ip, class_name=found_class, code=code
+        ) + 1
+
+    def _op_DUP_TOP(self, instr, ip):
+        self.stack.append(self.stack[-1])
+        return ip + 1
+
+    def _op_BITWISE_AND(self, instr, ip):
+        b = self.stack.pop()
+        self.stack[-1] = int(self.stack[-1]) & int(b)
+        return ip + 1
+
+    def _op_BITWISE_OR(self, instr, ip):
+        b = self.stack.pop()
+        self.stack[-1] = int(self.stack[-1]) | int(b)
+        return ip + 1
+
+    def _op_BITWISE_XOR(self, instr, ip):
+        b = self.stack.pop()
+        self.stack[-1] = int(self.stack[-1]) ^ int(b)
+        return ip + 1
+
+    def _op_BITWISE_LSHIFT(self, instr, ip):
+        b = self.stack.pop()
+        self.stack[-1] = int(self.stack[-1]) << int(b)
+        return ip + 1
+
+    def _op_BITWISE_RSHIFT(self, instr, ip):
+        b = self.stack.pop()
+        self.stack[-1] = int(self.stack[-1]) >> int(b)
+        return ip + 1
+
+    def _op_UNARY_BITNOT(self, instr, ip):
+        self.stack.append(~int(self.stack.pop()))
+        return ip + 1
+
+    def _op_BUILD_DICT(self, instr, ip):
+        count = instr.argument
+        d = {}
+        pairs = [self.stack.pop() for _ in range(count * 2)]
+        pairs.reverse()
+        for i in range(0, len(pairs), 2):
+            k, v = pairs[i], pairs[i + 1]
+            d[k] = v
+        self.stack.append(d)
+        return ip + 1
+
+    def _op_DICT_SPREAD(self, instr, ip):
+        spread = self.stack.pop()
+        if self.stack and isinstance(self.stack[-1], dict):
+            self.stack[-1].update(spread)
+        else:
+            self.stack.append(dict(spread))
+        return ip + 1
+
+    def _op_DICT_SET_ITEM(self, instr, ip):
+        value = self.stack.pop()
+        key   = self.stack.pop()
+        d     = self.stack[-1]
+        d[key] = value
+        return ip + 1
+
+    def _op_BUILD_SET(self, instr, ip):
+        count = instr.argument
+        elems = [self.stack.pop() for _ in range(count)]
+        self.stack.append(set(elems))
+        return ip + 1
+
+    def _op_SET_ADD(self, instr, ip):
+        elem = self.stack.pop()
+        s    = self.stack[-1]
+        s.add(elem)
+        return ip + 1
+
+    def _op_BUILD_SLICE(self, instr, ip):
+        step  = self.stack.pop()
+        stop  = self.stack.pop()
+        start = self.stack.pop()
+        self.stack.append(slice(start, stop, step))
+        return ip + 1
+
+    def _op_UNPACK_STARRED(self, instr, ip):
+        val = self.stack.pop()
+        if isinstance(val, (list, tuple)):
+            for item in val:
+                self.stack.append(item)
+        else:
+            self.stack.append(val)
+        return ip + 1
+
+    def _op_IMPORT_MODULE(self, instr, ip):
+        names = instr.argument
+        for name, alias in names:
+            mod = _import_module(name)
+            store_as = alias if alias else name.split(".")[0]
+            self.current_frame().variables[store_as] = mod
+        return ip + 1
+
+    def _op_IMPORT_FROM(self, instr, ip):
+        module_name, names = instr.argument
+        mod = _import_module(module_name)
+        for attr, alias in names:
+            store_as = alias if alias else attr
+            if attr == "*":
+                pub = getattr(mod, "__all__", None)
+                attrs = pub if pub else [a for a in dir(mod) if not a.startswith("_")]
+                for a in attrs:
+                    self.current_frame().variables[a] = getattr(mod, a)
+            else:
+                self.current_frame().variables[store_as] = getattr(mod, attr)
+        return ip + 1
 
-            ip += 1
+    def _op_DECLARE_GLOBAL(self, instr, ip):
+        for name in instr.argument:
+            self.current_frame().variables.setdefault("__globals__", set())
+            if isinstance(self.current_frame().variables.get("__globals__"), set):
+                self.current_frame().variables["__globals__"].add(name)
+        return ip + 1
 
-        return "\n".join(str(x) for x in self.output)
+    def _op_DECLARE_NONLOCAL(self, instr, ip):
+        return ip + 1
 
-    def _run_sub(self, stmts, extra_vars=None):
+    def _op_DELETE_VAR(self, instr, ip):
+        name = instr.argument
+        for frame in reversed(self.frames):
+            if name in frame.variables:
+                del frame.variables[name]
+                break
+        return ip + 1
+
+    def _op_RAISE_EXCEPTION(self, instr, ip):
+        exc = self.stack.pop()
+        if exc is None:
+            raise RuntimeError("re-raise with no active exception")
+        if isinstance(exc, type):
+            raise exc()
+        if isinstance(exc, BaseException):
+            raise exc
+        raise RuntimeError(str(exc))
+
+    def _op_RAISE_ASSERTION(self, instr, ip):
+        msg = self.stack.pop()
+        raise AssertionError(str(msg) if msg is not None else "")
+
+    def _op_GET_ITER(self, instr, ip):
+        self.stack[-1] = iter(self.stack[-1])
+        return ip + 1
+
+    def _op_FOR_ITER(self, instr, ip):
+        value = next(self.stack[-1], _UNBOUND)
+        if value is _UNBOUND:
+            self.stack.pop()
+            return instr.argument
+        self.stack.append(value)
+        return ip + 1
+
+    def _op_MATCH_EXCEPTION(self, instr, ip):
+        exc = self.stack.pop()
+        self.stack.append(isinstance(exc, self._resolve_exception_type(instr.argument)))
+        return ip + 1
+
+    def _op_EXEC_WITH(self, instr, ip):
+        node = instr.argument
+        ctx_expr, var_name = node.items[0]
+        mgr = self._eval_expr(ctx_expr)
+        val = self._context_call(mgr, "__enter__")
+        if val is NotImplemented:
+            val = mgr
+        if var_name:
+            self.current_frame().variables[var_name] = val
+        try:
+            self._run_sub(node.body, key=(node, "body"))
+        except Exception as e:
+            # A true result from __exit__ suppresses the exception.
+            suppress = self._context_call(mgr, "__exit__", type(e), e, e.__traceback__)
+            if suppress is NotImplemented or not suppress:
+                raise
+        else:
+            self._context_call(mgr, "__exit__", None, None, None)
+        return ip + 1
+
+    def _context_call(self, mgr, name, *args):
+        """Run ``mgr.__enter__``/``__exit__``; NotImplemented if ``mgr`` has none."""
+        if type(mgr) is Instance:
+            return self._dunder(mgr, name, *args)
+        method = getattr(mgr, name, None)
+        return NotImplemented if method is None else method(*args)
+
+    def _op_YIELD_VALUE(self, instr, ip):
+        # Leave the value on the stack for Generator.send and stop dispatching.
+        self._resume_ip = ip + 1
+        return len(self.instructions)
+
+    def _op_MAKE_GENERATOR(self, instr, ip):
+        gen = self._make_generator(
+            "<genexpr>", self._compile_genexpr(instr.argument), self._closure_frame()
+        )
+        gen._vm.stack.append(self.stack.pop())
+        self.stack.append(gen)
+        return ip + 1
+
+    def _op_MAKE_LAMBDA(self, instr, ip):
+        node = instr.argument
+        self.stack.append(
+            self._make_lambda(node, self.current_frame().snapshot(), self._eval_defaults(node))
+        )
+        return ip + 1
+
+    def _lambda_code(self, node):
+        from compiler.ast_nodes import Return
+        body = node.body if isinstance(node.body, list) else [Return(node.body)]
+        return self._compile_cached(node, body)
+
+    def _make_lambda(self, node, captured, defaults):
+        """A Python callable running lambda ``node`` over the ``captured`` variables.
+
+        Calls are counted per lambda expression.  Once it is hot the JIT
+        returns a factory taking the lambda's free variables, and each
+        closure instantiates it with its own captured values.
+        """
+        vm = self
+        jit = self.jit
+        compiled = None
+        factory = None
+
+        def interpret(*values):
+            frame = Frame()
+            frame.variables.update(captured)
+            for name, value in zip(vm._param_names(node), values):
+                frame.variables[name] = value
+            frame.profile = jit.profile(node)
+            return vm._run_frame(frame, vm._lambda_code(node))
+
+        def deopt(*values):
+            nonlocal compiled
+            jit.record_bailout(node, values)
+            if jit.try_get_compiled(node) is not factory:
+                compiled = None
+            return interpret(*values)
+
+        def _fn(*args, **kwargs):
+            nonlocal compiled, factory
+            if vm.call_counts is not None:
+                vm._count_call("<lambda>")
+            values = vm._bind_arguments(node, args, kwargs, defaults)
+            if compiled is None:
+                factory = jit.try_get_compiled(node)
+                if factory is None:
+                    jit.record_call(node, values)
+                    if jit.should_compile(node, node):
+                        factory = jit.try_compile(node, node, name="<lambda>",
+                                                  closure=captured)
+                if factory is not None and all(n in captured for n in factory.free_names):
+                    compiled = factory(deopt, *[captured[n] for n in factory.free_names])
+            if compiled is not None:
+                return compiled(*values)
+            return interpret(*values)
+
+        return _fn
+
+    def _op_APPLY_DECORATOR(self, instr, ip):
+        dec = self.stack.pop()
+        fn  = self.stack.pop()
+        result = self.call(dec, (fn,))
+        self.stack.append(result)
+        # The value of a function or class is its definition, so a wrapper
+        # the decorator returns can still call it; the name is rebound to
+        # whatever else the decorators return.
+        name = instr.argument
+        definition = (isinstance(result, str) and result == name) or (
+            type(result) is Closure and name in self.functions
+            and result.node is self.functions[name]["node"]
+        )
+        if not definition and (name in self.functions or name in self.classes):
+            self._rebound.add(name)
+            self.jit.rebind(name, lambda *args: self.call(result, args))
+        return ip + 1
+
+    def _op_CALL_FUNCTION_KW(self, instr, ip):
+        name, pos_count, kw_count = instr.argument
+        # Keywords were pushed as key, value pairs after the positionals.
+        kw_items = self.stack[len(self.stack) - 2 * kw_count:]
+        del self.stack[len(self.stack) - 2 * kw_count:]
+        pos_args  = [self.stack.pop() for _ in range(pos_count)]
+        pos_args.reverse()
+        kwargs = {}
+        for key, value in zip(kw_items[::2], kw_items[1::2]):
+            if key is None:
+                if not isinstance(value, dict):
+                    raise TypeError("** argument must be a mapping")
+                kwargs.update(value)
+            else:
+                kwargs[key] = value
+        if self._is_user_function(name):
+            ip = self._call_function(name, pos_args, ip, kwargs)
+        else:
+            ip = self._dispatch_call(name, pos_args, ip, kwargs=kwargs)
+        if ip == -1:
+            return 0
+        return ip + 1
+
+    def _run_sub(self, stmts, extra_vars=None, key=None):
         """Execute a list of AST statements in a fresh sub-VM sharing state."""
-        instrs = self._compile_body(stmts)
-        sub = VirtualMachine(instrs)
-        sub.frames    = [Frame()]
+        if key is None:
+            instrs = self._compile_body(stmts)
+        else:
+            instrs = self._compile_cached(key, stmts)
+        sub = self._spawn(instrs, Frame())
         if extra_vars:
             sub.frames[0].variables.update(extra_vars)
         for frame in self.frames:
-            sub.frames[0].variables.update(frame.variables)
-        sub.functions = self.functions
-        sub.classes   = self.classes
-        sub._input_provider = self._input_provider
+            sub.frames[0].variables.update(frame.snapshot())
         sub.run()
         return sub
 
     def _resolve_exception_type(self, exc_type_name):
-        _exc_map = {
-            "Exception": Exception,
-            "ValueError": ValueError,
-            "TypeError": TypeError,
-            "KeyError": KeyError,
-            "IndexError": IndexError,
-            "AttributeError": AttributeError,
-            "NameError": NameError,
-            "RuntimeError": RuntimeError,
-            "StopIteration": StopIteration,
-            "ZeroDivisionError": ZeroDivisionError,
-            "FileNotFoundError": FileNotFoundError,
-            "IOError": IOError,
-            "OSError": OSError,
-            "ImportError": ImportError,
-            "NotImplementedError": NotImplementedError,
-            "AssertionError": AssertionError,
-            "OverflowError": OverflowError,
-            "RecursionError": RecursionError,
-            "MemoryError": MemoryError,
-            "PermissionError": PermissionError,
-            "TimeoutError": TimeoutError,
-            "ArithmeticError": ArithmeticError,
-            "LookupError": LookupError,
-            "UnicodeError": UnicodeError,
-            "UnicodeDecodeError": UnicodeDecodeError,
-            "UnicodeEncodeError": UnicodeEncodeError,
-            "SystemExit": SystemExit,
-            "KeyboardInterrupt": KeyboardInterrupt,
-            "GeneratorExit": GeneratorExit,
-            "BaseException": BaseException,
-        }
         if isinstance(exc_type_name, str):
-            return _exc_map.get(exc_type_name, Exception)
+            return _EXCEPTION_TYPES.get(exc_type_name, Exception)
         return Exception
 
     def _dispatch_call(self, name, args, ip, kwargs=None):
         kwargs = kwargs or {}
         if name == "str":
             obj = args[0] if args else ""
-            if isinstance(obj, dict) and "__class__" in obj:
+            if type(obj) is Instance:
                 self.stack.append(self._instance_str(obj) or str(obj))
             else:
                 self.stack.append(str(obj))
@@ -910,7 +2075,7 @@ class VirtualMachine:
             return ip
 
         if name == "len":
-            self.stack.append(len(args[0]))
+            self.stack.append(self._len(args[0]))
             return ip
 
         if name == "input":
@@ -923,14 +2088,7 @@ class VirtualMachine:
             return ip
 
         if name == "range":
-            if len(args) == 1:
-                self.stack.append(list(range(int(args[0]))))
-            elif len(args) == 2:
-                self.stack.append(list(range(int(args[0]), int(args[1]))))
-            else:
-                self.stack.append(
-                    list(range(int(args[0]), int(args[1]), int(args[2])))
-                )
+            self.stack.append(range(*(int(a) for a in args)))
             return ip
 
         if name == "list":
@@ -950,7 +2108,8 @@ class VirtualMachine:
             return ip
 
         if name == "sorted":
-            self.stack.append(sorted(args[0]))
+            self.stack.append(sorted(args[0], key=self._key(kwargs.get("key")),
+                                     reverse=bool(kwargs.get("reverse", False))))
             return ip
 
         if name == "reversed":
@@ -965,26 +2124,16 @@ class VirtualMachine:
             return ip
 
         if name == "map":
-            fn_ref  = args[0]
-            iterable = args[1]
-            result  = []
-            for item in iterable:
-                if callable(fn_ref):
-                    result.append(fn_ref(item))
-                elif isinstance(fn_ref, str) and fn_ref in self.functions:
-                    func = self.functions[fn_ref]
-                    tmp_frame = Frame()
-                    for param, val in zip(func["params"], [item]):
-                        tmp_frame.variables[param] = val
-                    sub_vm = VirtualMachine(func["instructions"])
-                    sub_vm.frames = [tmp_frame]
-                    sub_vm.functions = self.functions
-                    sub_vm.classes   = self.classes
-                    sub_vm.run()
-                    result.append(sub_vm.stack[-1] if sub_vm.stack else None)
-                else:
-                    result.append(fn_ref)
-            self.stack.append(result)
+            fn_ref = args[0]
+            self.stack.append([self.call(fn_ref, items) for items in zip(*args[1:])])
+            return ip
+
+        if name == "filter":
+            fn_ref = args[0]
+            if fn_ref is None:
+                self.stack.append([item for item in args[1] if item])
+            else:
+                self.stack.append([item for item in args[1] if self.call(fn_ref, (item,))])
             return ip
 
         if name == "zip":
@@ -995,18 +2144,14 @@ class VirtualMachine:
             self.stack.append(sum(args[0]))
             return ip
 
-        if name == "min":
+        if name in ("min", "max"):
+            fn = min if name == "min" else max
+            if "key" in kwargs:
+                kwargs = dict(kwargs, key=self._key(kwargs["key"]))
             if len(args) == 1:
-                self.stack.append(min(args[0]))
+                self.stack.append(fn(args[0], **kwargs))
             else:
-                self.stack.append(min(args))
-            return ip
-
-        if name == "max":
-            if len(args) == 1:
-                self.stack.append(max(args[0]))
-            else:
-                self.stack.append(max(args))
+                self.stack.append(fn(args, **kwargs))
             return ip
 
         if name == "print":
@@ -1017,8 +2162,9 @@ class VirtualMachine:
         if name == "isinstance":
             obj, typ = args[0], args[1]
             if isinstance(typ, str):
+                layout = self.classes.get(obj._cls) if type(obj) is Instance else None
                 result = (
-                    isinstance(obj, dict) and obj.get("__class__") == typ
+                    layout is not None and typ in layout.ancestors
                 ) or isinstance(obj, {
                     "int": int, "float": float, "str": str,
                     "list": list, "bool": bool,
@@ -1030,8 +2176,8 @@ class VirtualMachine:
 
         if name == "hasattr":
             obj, attr = args[0], args[1]
-            if isinstance(obj, dict) and "__attributes__" in obj:
-                result = attr in obj["__attributes__"]
+            if type(obj) is Instance:
+                result = obj.has_attr(attr)
             else:
                 result = hasattr(obj, attr)
             self.stack.append(result)
@@ -1039,8 +2185,8 @@ class VirtualMachine:
 
         if name == "type":
             obj = args[0] if args else None
-            if isinstance(obj, dict) and "__class__" in obj:
-                self.stack.append(obj["__class__"])
+            if type(obj) is Instance:
+                self.stack.append(obj._cls)
             else:
                 self.stack.append(type(obj))
             return ip
@@ -1048,8 +2194,8 @@ class VirtualMachine:
         if name == "getattr":
             obj = args[0]; attr = args[1]
             default = args[2] if len(args) > 2 else None
-            if isinstance(obj, dict) and "__attributes__" in obj:
-                result = obj["__attributes__"].get(attr, default)
+            if type(obj) is Instance:
+                result = self._instance_attr(obj, attr, default)
             else:
                 result = getattr(obj, attr, default)
             self.stack.append(result)
@@ -1057,50 +2203,41 @@ class VirtualMachine:
 
         if name == "setattr":
             obj, attr, val = args
-            if isinstance(obj, dict) and "__attributes__" in obj:
-                obj["__attributes__"][attr] = val
+            if type(obj) is Instance:
+                obj.set_attr(attr, val)
             else:
                 setattr(obj, attr, val)
             self.stack.append(None)
             return ip
 
-        if name in self.classes:
-            instance = {"__class__": name, "__attributes__": {}}
-            init_node, init_class = self._find_method(name, "__init__")
-            if init_node:
-                init_instrs = self._compile_body(init_node.body)
-                new_frame   = Frame()
-                new_frame.variables["self"] = instance
-                new_frame.variables["__current_class__"] = init_class or name
-                init_params = init_node.params[1:]
-                for param, val in zip(init_params, args):
-                    new_frame.variables[param] = val
-                for param in init_params[len(args):]:
-                    if param in kwargs:
-                        new_frame.variables[param] = kwargs[param]
-                init_kwarg = getattr(init_node, "kwarg", None)
-                if init_kwarg:
-                    extra_kwargs = {k: v for k, v in kwargs.items() if k not in init_params}
-                    new_frame.variables[init_kwarg] = extra_kwargs
-                sub_vm = VirtualMachine(init_instrs)
-                sub_vm.frames   = [new_frame]
-                sub_vm.functions = self.functions
-                sub_vm.classes   = self.classes
-                sub_vm._input_provider = self._input_provider
-                sub_vm.run()
-                self.output.extend(sub_vm.output)
-            self.stack.append(instance)
-            return ip
-
-        if name in self.functions:
-            ip = self._call_function(name, args, ip)
-            return ip  
+        if name not in self._rebound:
+            if name in self.classes:
+                self.stack.append(self._construct(name, args, kwargs))
+                return ip
+            if name in self.functions:
+                return self._call_function(name, args, ip, kwargs)
 
         var_val = None
         for frame in reversed(self.frames):
-            if name in frame.variables:
-                var_val = frame.variables[name]
+            value = frame.get(name, _UNBOUND)
+            if value is not _UNBOUND:
+                var_val = value
                 break
+        else:
+            var_val = self.globals.get(name)
+        # A variable holding a user function, class or Closure: an ordinary
+        # call of that definition.
+        if type(var_val) is Closure:
+            return self._call_closure(var_val, args, ip, kwargs)
+        if type(var_val) is BoundMethod:
+            return self._call_method_node(var_val.node, var_val.obj, args, ip,
+                                          class_name=var_val.class_name, kwargs=kwargs)
+        if isinstance(var_val, str):
+            if var_val in self.classes:
+                self.stack.append(self._construct(var_val, args, kwargs))
+                return ip
+            if var_val in self.functions:
+                return self._call_function(var_val, args, ip, kwargs)
         if callable(var_val):
             try:
                 self.stack.append(var_val(*args, **kwargs))
@@ -1112,10 +2249,12 @@ class VirtualMachine:
             self.stack.append(_BUILTIN_CALLABLES[name](*args, **kwargs))
             return ip
 
-        import builtins as _builtins_ns
-        _bi = getattr(_builtins_ns, name, None)
+        _bi = getattr(builtins, name, None)
         if callable(_bi):
             self.stack.append(_bi(*args, **kwargs))
             return ip
 
         raise NameError(f"Unknown function or class: '{name}'")
+
+
+_HANDLERS = tuple(getattr(VirtualMachine, f"_op_{name}") for name in OPCODES)
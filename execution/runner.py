@@ -22,11 +22,14 @@ import subprocess
 import shutil
 import io
 import textwrap
+import queue
 
 from compiler.lexer import tokenize
 from compiler.parser import Parser
 from compiler.bytecode import BytecodeGenerator
 from compiler.vm import VirtualMachine
+from compiler.output_sink import OutputSink, OutputCancelled
+from compiler.budget import BudgetExceeded, ExecutionBudget
 from compiler.semantic import SemanticAnalyzer
 from compiler.optimizer import Optimizer
 from compiler.ir import IRGenerator
@@ -34,6 +37,8 @@ from compiler.ir_to_bytecode import IRToBytecodeConverter
 from compiler.ast_visualizer import ASTVisualizer
 from compiler.cfg import CFGBuilder
 from compiler.disassembler import BytecodeDisassembler
+from compiler.program_cache import CachedProgram, ProgramCache
+from compiler.jit import DEFAULT_JIT_PROFILE, JIT_THRESHOLD, jit_settings
 
 active_processes = {}
 
@@ -370,10 +375,39 @@ def get_debug_info(code):
         }
 
 
-def safe_exec(code, input_data=""):
+# File name safe_exec compiles the user's code under, so its tracer can
+# tell the user's frames from everything else.
+SAFE_EXEC_FILENAME = "<program>"
+
+
+def _budget_tracer(budget):
+    """A sys.settrace hook charging ``budget`` for every line of the user's code run."""
+    def trace_line(frame, event, arg):
+        if event == "line":
+            budget.charge(1)
+        return trace_line
+
+    def trace_call(frame, event, arg):
+        if frame.f_code.co_filename != SAFE_EXEC_FILENAME:
+            return None
+        budget.charge(1)
+        return trace_line
+
+    return trace_call
+
+
+def safe_exec(code, input_data="", budget=None):
+    """Run ``code`` on Python itself with SAFE_BUILTINS.
+
+    With an ExecutionBudget, every line of the user's code run is charged
+    to it, and a run exceeding it is stopped like a VM run: the result has
+    the output so far, with the BudgetExceeded details under ``"timeout"``
+    and as its ``"error"``.
+    """
 
     old_stdout = sys.stdout
     old_stdin = sys.stdin
+    old_trace = sys.gettrace()
 
     sys.stdout = io.StringIO()
     sys.stdin = io.StringIO(input_data)
@@ -381,11 +415,23 @@ def safe_exec(code, input_data=""):
     safe_globals = {"__builtins__": SAFE_BUILTINS, "__name__": "__main__"}
 
     try:
-        exec(code, safe_globals)
+        compiled = compile(code, SAFE_EXEC_FILENAME, "exec")
+        if budget is not None:
+            budget.start()
+            sys.settrace(_budget_tracer(budget))
+        exec(compiled, safe_globals)
         output = sys.stdout.getvalue()
 
         return {"output": output}
 
+    except BudgetExceeded as exceeded:
+
+        return {
+            "output": sys.stdout.getvalue(),
+            "timeout": exceeded.as_dict(),
+            "error": format_error(exceeded),
+        }
+
     except Exception as e:
 
         return {
@@ -396,6 +442,7 @@ def safe_exec(code, input_data=""):
         }
 
     finally:
+        sys.settrace(old_trace)
         sys.stdout = old_stdout
         sys.stdin = old_stdin
 
@@ -492,60 +539,341 @@ def reset_runtime():
 
     active_processes = {}
 
-def run_with_compiler(code, debug=False):
+PROGRAM_CACHE = ProgramCache()
 
-    try:
-        tokens = tokenize(code)
 
-        parser = Parser(tokens)
-        ast = parser.parse()
+def _timed(phases, name, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    phases[name] = time.perf_counter() - start
+    return result
 
-        analyzer = SemanticAnalyzer()
-        analyzer.visit(ast)
 
-        optimizer = Optimizer()
-        ast = optimizer.visit(ast)
+def compile_program(code, phases=None):
+    """The CachedProgram for ``code``, compiled only if no earlier run stored it.
+
+    A cache hit skips tokenizing, parsing, analysis, optimisation and code
+    generation, and brings along the function bodies and JIT code that
+    earlier runs compiled.  The seconds each stage took are added to
+    ``phases``.
+    """
+    phases = {} if phases is None else phases
+    program = _timed(phases, "cache_load", PROGRAM_CACHE.load, code)
+    if program is not None:
+        return program
+    tokens = _timed(phases, "tokenize", tokenize, code)
+    ast = _timed(phases, "parse", Parser(tokens).parse)
+    _timed(phases, "semantic", SemanticAnalyzer().visit, ast)
+    ast = _timed(phases, "optimize", Optimizer().visit, ast)
+    instructions = _timed(phases, "bytecode", BytecodeGenerator().generate, ast)
+    return CachedProgram(PROGRAM_CACHE.key(code), ast, instructions)
+
+
+def save_program(program, vm):
+    """Store what running ``program`` on ``vm`` compiled, if it is new."""
+    if program.absorb(vm):
+        PROGRAM_CACHE.store(program)
+
+
+def debug_views(program):
+    """The AST, CFG, IR and bytecode renderings shown by ``/run``."""
+    if program.debug is None:
+        cfg_builder = CFGBuilder()
+        program.debug = {
+            "ast": ASTVisualizer().render(program.ast),
+            "cfg": cfg_builder.render(cfg_builder.build(program.ast)),
+            "ir": generate_ir_text(program.ast),
+            "bytecode": BytecodeDisassembler().disassemble(program.instructions),
+        }
+    return dict(program.debug)
+
+
+# Limits of one VM run started by run_with_compiler, stream_with_compiler
+# or benchmark_profiles.  They are the defaults and also the most a caller
+# may ask for.
+RUN_MAX_INSTRUCTIONS = 1_000_000_000
+RUN_TIMEOUT_SECONDS = 10.0
 
-        from compiler.bytecode import BytecodeGenerator
-        gen = BytecodeGenerator()
-        instructions = gen.generate(ast)
-        original_instructions = list(instructions) 
 
-        vm = VirtualMachine(instructions)
-        inputs = code.split("__INPUT__")
-        input_buffer = inputs[1].split("\n") if len(inputs) > 1 else []
+def run_budget(max_instructions=None, timeout=None):
+    """ExecutionBudget for one run, with the limits a request asked for.
 
-        def fake_input(prompt=""):
-            if input_buffer:
-                return input_buffer.pop(0)
-            return ""
-        
-        vm._input_provider = fake_input
-        output = vm.run()
+    A limit left as None gets its default; one that is not a positive
+    number up to RUN_MAX_INSTRUCTIONS or RUN_TIMEOUT_SECONDS raises
+    ValueError.
+    """
+    return ExecutionBudget(
+        _run_limit("max_instructions", max_instructions, RUN_MAX_INSTRUCTIONS),
+        _run_limit("timeout", timeout, RUN_TIMEOUT_SECONDS),
+    )
+
+
+def _run_limit(name, value, most):
+    if value is None:
+        return most
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 < value <= most:
+        raise ValueError(f"{name} must be a positive number up to {most}, not {value!r}")
+    return value
+
+
+def _run_vm(vm):
+    """``vm.run()``, and the BudgetExceeded that stopped it early or None.
+
+    A stopped run returns the output printed until then.
+    """
+    try:
+        return vm.run(), None
+    except BudgetExceeded as exceeded:
+        return vm.output.getvalue(), exceeded
+
+
+def run_with_compiler(code, debug=False, profile=DEFAULT_JIT_PROFILE, threshold=None,
+                      max_instructions=None, timeout=None):
+    """Run ``code`` on the VM, falling back to ``safe_exec``.
+
+    ``profile`` and ``threshold`` select the execution profile (see
+    compiler.jit.jit_settings), ``max_instructions`` and ``timeout`` the
+    run's limits (see run_budget); invalid ones raise ValueError.  A run
+    that exceeds a limit is stopped and returns the output so far, with
+    the BudgetExceeded details under ``"timeout"`` and as its ``"error"``.
+
+    Code the compiler rejects falls back to ``safe_exec``, under the same
+    limits, and so does a program the VM fails on before it printed
+    anything: nothing it showed is shown twice.  Once the program has
+    printed, an exception it raises on the VM is reported as the
+    ``"error"``, with the output so far, and it is not run a second time.
+
+    In debug mode the result also has the debug views and, under
+    ``"report"``, the VM's execution report (see VirtualMachine.report)
+    with the profile, the seconds spent per phase and whether the compiled
+    program came from the program cache.
+    """
+    jit_settings(profile, threshold)
+    budget = run_budget(max_instructions, timeout)
+    phases = {}
+    try:
+        program = compile_program(code, phases)
+        cache_hit = program.stored
+
+        vm = _timed(phases, "load", lambda: VirtualMachine(
+            program.instructions, collect_stats=debug,
+            jit_profile=profile, jit_threshold=threshold, budget=budget,
+        ))
+        program.install(vm)
+        vm._input_provider = make_input_provider(code)
 
     except Exception as compiler_error:
-        return safe_exec(code)
+        return safe_exec(code, budget=budget)
 
+    error = None
+    try:
+        output, exceeded = _timed(phases, "execute", _run_vm, vm)
+    except Exception as e:
+        if not vm.output.lines:
+            return safe_exec(code, budget=budget)
+        output, exceeded, error = vm.output.getvalue(), None, e
+
+    if debug:
+        result = _timed(phases, "debug_views", debug_views, program)
+        result["output"] = output
+    else:
+        result = {"output": output}
+    if exceeded is not None:
+        result["timeout"] = exceeded.as_dict()
+        result["error"] = format_error(exceeded)
+    elif error is not None:
+        result["error"] = format_error(error)
+
+    _timed(phases, "cache_store", save_program, program, vm)
     if debug:
+        report = vm.report()
+        report["profile"] = {"name": profile, "threshold": _finite(vm.jit.threshold)}
+        report["cache_hit"] = cache_hit
+        report["phases"] = phases
+        result["report"] = report
+    return result
+
+
+# Profiles compared by benchmark_profiles: (profile, threshold).
+BENCHMARK_PROFILES = (
+    ("interpreter", None),
+    ("jit", 2),
+    ("jit", JIT_THRESHOLD),
+    ("jit", 50),
+    ("eager", None),
+)
 
-        ast_vis = ASTVisualizer()
-        ast_tree = ast_vis.render(ast)
 
-        cfg_builder = CFGBuilder()
-        cfg = cfg_builder.build(ast)
-        cfg_text = cfg_builder.render(cfg)
+def _finite(value):
+    return None if value == float("inf") else value
+
+
+BENCHMARK_MAX_REPEAT = 5
+
+
+def benchmark_profiles(code, repeat=3, max_instructions=None, timeout=None):
+    """Run ``code`` on the VM under each of BENCHMARK_PROFILES and compare them.
+
+    Returns one entry per profile with the best wall time of ``repeat``
+    runs, the speedup over the interpreter, what the JIT compiled and
+    whether the output matched the interpreter's.  Every run starts with a
+    cold JIT: compiled code from the program cache is not used.  Errors
+    propagate instead of falling back to ``safe_exec``.
+
+    ``timeout`` (see run_budget) is one deadline for the whole benchmark,
+    shared by all its runs; ``max_instructions`` limits each run.  A
+    profile whose run exceeds either, or that the deadline leaves no time
+    for, is not repeated; its entry has the BudgetExceeded details under
+    ``"timeout"`` and no time or speedup.  ``repeat`` must be an int from
+    1 to BENCHMARK_MAX_REPEAT, or ValueError is raised.
+    """
+    if isinstance(repeat, bool) or not isinstance(repeat, int) or not 0 < repeat <= BENCHMARK_MAX_REPEAT:
+        raise ValueError(f"repeat must be an int from 1 to {BENCHMARK_MAX_REPEAT}, not {repeat!r}")
+    deadline = run_budget(max_instructions, timeout)
+    deadline.start()
+    program = compile_program(code)
+    results = []
+    for profile, threshold in BENCHMARK_PROFILES:
+        best = None
+        exceeded = None
+        for _ in range(repeat):
+            remaining = deadline.seconds - deadline.elapsed()
+            vm = VirtualMachine(program.instructions, jit_profile=profile, jit_threshold=threshold,
+                                budget=ExecutionBudget(deadline.max_instructions, remaining))
+            vm._input_provider = make_input_provider(code)
+            if remaining <= 0:
+                output = ""
+                exceeded = BudgetExceeded("time", deadline.seconds, 0, deadline.elapsed())
+                break
+            start = time.perf_counter()
+            output, exceeded = _run_vm(vm)
+            elapsed = time.perf_counter() - start
+            if exceeded is not None:
+                if exceeded.kind == "time":
+                    exceeded.limit = deadline.seconds
+                break
+            best = elapsed if best is None else min(best, elapsed)
+        if exceeded is not None:
+            best = None
+        stats = vm.jit.stats
+        results.append({
+            "profile":     profile,
+            "threshold":   _finite(vm.jit.threshold),
+            "seconds":     best,
+            "compiled":    len(stats["compiled"]),
+            "osr":         len(stats["osr"]),
+            "deoptimized": len(stats["deoptimized"]),
+            "output":      output,
+        })
+        if exceeded is not None:
+            results[-1]["timeout"] = exceeded.as_dict()
+    baseline = results[0]
+    baseline_output = None if "timeout" in baseline else baseline["output"]
+    for result in results:
+        result["speedup"] = (baseline["seconds"] / result["seconds"]
+                             if baseline["seconds"] and result["seconds"] else None)
+        output = result.pop("output")
+        result["same_output"] = (None if baseline_output is None or "timeout" in result
+                                 else output == baseline_output)
+    return results
+
+
+def make_input_provider(code):
+    """input() replacement fed from the lines after an ``__INPUT__`` marker."""
+    inputs = code.split("__INPUT__")
+    input_buffer = inputs[1].split("\n") if len(inputs) > 1 else []
+
+    def fake_input(prompt=""):
+        if input_buffer:
+            return input_buffer.pop(0)
+        return ""
 
-        ir_text = generate_ir_text(ast)
+    return fake_input
 
-        dis = BytecodeDisassembler()
-        bytecode_text = dis.disassemble(original_instructions)
 
-        return {
-            "ast": ast_tree,
-            "cfg": cfg_text,
-            "ir": ir_text,
-            "bytecode": bytecode_text,
-            "output": output
-        }
+STREAM_CHUNK_SIZE = 4096
+STREAM_QUEUE_SIZE = 16
+
+
+def stream_with_compiler(code, chunk_size=STREAM_CHUNK_SIZE, max_instructions=None, timeout=None):
+    """Run ``code`` on the VM and yield its output while it executes.
 
-    return {"output": output}
\ No newline at end of file
+    Yields ``{"output": text}`` events as the VM's sink fills, then one
+    final ``{"done": True, "runtime_seconds": ...}`` event, carrying an
+    ``"error"`` entry if the program raised, and also a ``"timeout"`` one
+    if it exceeded ``max_instructions`` or ``timeout`` (see run_budget).
+    Invalid limits make that final event the only one.  The VM runs on a worker
+    thread that blocks when the consumer falls behind, so at most
+    ``STREAM_QUEUE_SIZE`` chunks are ever held in memory.  Closing the
+    generator early (e.g. the HTTP client went away) cancels the run.
+
+    Code the compiler cannot handle, or that the VM fails on before it
+    printed anything, falls back to ``safe_exec`` under the same limits, as
+    in ``run_with_compiler``; its result is reported in the final event.
+    """
+    try:
+        budget = run_budget(max_instructions, timeout)
+    except ValueError as e:
+        yield {"done": True, "error": format_error(e)}
+        return
+    start_time = time.perf_counter()
+    try:
+        program = compile_program(code)
+    except Exception:
+        result = safe_exec(code, budget=budget)
+        result["done"] = True
+        result["runtime_seconds"] = time.perf_counter() - start_time
+        yield result
+        return
+
+    events = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    cancelled = threading.Event()
+
+    def put(event):
+        while True:
+            if cancelled.is_set():
+                raise OutputCancelled()
+            try:
+                events.put(event, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def worker():
+        final = {"done": True}
+        try:
+            sink = OutputSink(lambda chunk: put({"output": chunk}), chunk_size)
+            vm = VirtualMachine(program.instructions, output=sink, budget=budget)
+            program.install(vm)
+            vm._input_provider = make_input_provider(code)
+            try:
+                vm.run()
+            except BudgetExceeded as exceeded:
+                final["timeout"] = exceeded.as_dict()
+                final["error"] = format_error(exceeded)
+            except Exception:
+                if sink.lines:
+                    raise
+                final.update(safe_exec(code, budget=budget))
+            finally:
+                sink.flush()
+            save_program(program, vm)
+        except OutputCancelled:
+            return
+        except Exception as e:
+            final["error"] = format_error(e)
+        final["runtime_seconds"] = time.perf_counter() - start_time
+        try:
+            put(final)
+        except OutputCancelled:
+            pass
+
+    threading.Thread(target=worker, daemon=True).start()
+    try:
+        while True:
+            event = events.get()
+            yield event
+            if event.get("done"):
+                return
+    finally:
+        cancelled.set()
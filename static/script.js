@@ -598,6 +598,136 @@ function switchTab(tab) {
   });
 }
 
+// The Stats tab runs the editor's code through /run on the PyFlux VM (the
+// Run button executes it with Python) when its "Run on VM" button is pressed,
+// and shows that run's output together with the VM's execution report.
+// Switching tabs or pressing Run never executes the code again.
+let statsRun = 0;
+
+function runStats() {
+  const code = editor.getValue();
+  const run = ++statsRun;
+  showBuildingAnimation("stats-report", "VM report");
+
+  fetch("/run", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ code: code }),
+  })
+    .then((res) => res.json())
+    .then((data) => {
+      if (statsRun !== run) return;
+      stopBuildingAnimation("stats-report");
+      document.getElementById("stats-report").innerText =
+        "Output\n" + (data.output || "-") + "\n\n" + formatReport(data);
+    })
+    .catch(() => {
+      if (statsRun !== run) return;
+      stopBuildingAnimation("stats-report");
+      document.getElementById("stats-report").innerText =
+        "Error communicating with server.";
+    });
+}
+
+function resetStats() {
+  statsRun++;
+  stopBuildingAnimation("stats-report");
+  document.getElementById("stats-report").innerText = "";
+}
+
+function formatMs(seconds) {
+  return (seconds * 1000).toFixed(2) + " ms";
+}
+
+function formatReport(data) {
+  const report = data.report;
+  if (!report) {
+    return (
+      "No VM report: the PyFlux VM could not run this program, so it ran on " +
+      "the Python fallback." +
+      (data.error ? "\n\n" + formatErrorText(data.error) : "")
+    );
+  }
+
+  const pad = (value, width) => String(value).padEnd(width);
+  const lines = ["Program cache: " + (report.cache_hit ? "hit" : "miss"), ""];
+  if (data.timeout) {
+    lines.push(
+      "Stopped: " + data.timeout.kind + " limit of " + data.timeout.limit + " exceeded after " +
+        data.timeout.instructions.toLocaleString() + " instructions (charged) and " +
+        formatMs(data.timeout.seconds),
+      "",
+    );
+  } else if (data.error) {
+    // The program raised on the VM after printing, so the report covers
+    // the run up to the error.
+    lines.push("Error: " + formatErrorText(data.error), "");
+  }
+
+  lines.push("Phases");
+  let total = 0;
+  Object.entries(report.phases).forEach(([phase, seconds]) => {
+    total += seconds;
+    lines.push("  " + pad(phase, 14) + formatMs(seconds));
+  });
+  lines.push("  " + pad("total", 14) + formatMs(total), "");
+
+  lines.push("Instructions executed: " + report.instructions.toLocaleString());
+  Object.entries(report.opcodes)
+    .slice(0, 15)
+    .forEach(([opcode, count]) => {
+      const share = ((100 * count) / report.instructions).toFixed(1);
+      lines.push("  " + pad(opcode, 22) + pad(count.toLocaleString(), 12) + share + "%");
+    });
+  lines.push("");
+
+  lines.push("Calls made by the interpreter");
+  const calls = Object.entries(report.calls);
+  if (!calls.length) lines.push("  -");
+  calls.slice(0, 20).forEach(([name, count]) => {
+    lines.push("  " + pad(name, 22) + count.toLocaleString());
+  });
+  lines.push("");
+
+  const jit = report.jit;
+  const list = (names) => names.join(", ") || "-";
+  const compiled = jit.compiled.map(
+    (name) => name + " (tier " + (jit.tiers[name] || "-") + ")",
+  );
+  const bailouts = Object.entries(jit.bailouts).map(
+    ([name, count]) => name + " x" + count,
+  );
+  lines.push("JIT");
+  lines.push("  compiled     " + list(compiled));
+  lines.push("  osr loops    " + list(jit.osr));
+  lines.push("  failed       " + list(jit.failed));
+  lines.push("  deoptimized  " + list(jit.deoptimized));
+  lines.push("  bailouts     " + list(bailouts));
+
+  if (jit.events.length) {
+    lines.push("", "JIT events");
+    jit.events.forEach((event) => {
+      let detail = "";
+      if (event.event === "compile") {
+        detail = "tier " + event.tier + " after " + event.calls + " calls";
+      }
+      if (event.event === "compile" || event.event === "osr") {
+        detail += event.seconds == null ? " (from cache)" : " in " + formatMs(event.seconds);
+      }
+      if (event.event === "bailout") {
+        detail = "#" + event.count;
+      }
+      lines.push(
+        "  " + pad(formatMs(event.at), 12) + pad(event.event, 9) + pad(event.name, 22) + detail,
+      );
+    });
+    if (jit.events_dropped) {
+      lines.push("  ... and " + jit.events_dropped + " more");
+    }
+  }
+  return lines.join("\n");
+}
+
 function ensureOutputLayout() {
   if (!outputBoxEl) return;
   if (!outputTextEl) {
@@ -704,6 +834,8 @@ function runCode() {
   showBuildingAnimation("ir", "IR");
   showBuildingAnimation("bytecode", "Bytecode");
 
+  resetStats();
+
   fetch("/start", {
     method: "POST",
     headers: { "Content-Type": "application/json" },
@@ -908,6 +1040,7 @@ function resetCompiler() {
   document.getElementById("cfg").innerText = "";
   document.getElementById("ir").innerText = "";
   document.getElementById("bytecode").innerText = "";
+  resetStats();
 
   stopAllBuildingAnimations();
 
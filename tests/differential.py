@@ -0,0 +1,45 @@
+"""Run one program under CPython and under the VM and compare the output.
+
+Every test program is run with ``exec()``, on the interpreter (the
+``interpreter`` profile, nothing compiles) and with the ``eager`` profile,
+which compiles every function, method, lambda and module-level loop at
+first use, synchronously.
+"""
+import contextlib
+import io
+
+from benchmarks._common import compile_source
+from compiler.vm import VirtualMachine
+
+
+def exec_output(code):
+    """What ``code`` prints under CPython."""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        exec(code, {"__name__": "__main__"})
+    return out.getvalue().rstrip("\n")
+
+
+def run_vm(code, profile="interpreter", **options):
+    """Run ``code`` on a VirtualMachine; return the VM and its output."""
+    vm = VirtualMachine(compile_source(code), collect_stats=True,
+                        jit_profile=profile, **options)
+    return vm, vm.run().rstrip("\n")
+
+
+def assert_same_output(code, compiled=()):
+    """Check that the interpreter and compiled code print what CPython prints.
+
+    ``compiled`` names functions (as in ``VirtualMachine.report``) the
+    eager run must have compiled, so the check covers compiled code and
+    not an interpreter fallback.  Returns the eager run's JIT report.
+    """
+    expected = exec_output(code)
+    _, output = run_vm(code, "interpreter")
+    assert output == expected, "interpreter"
+    vm, output = run_vm(code, "eager")
+    assert output == expected, "eager"
+    report = vm.report()["jit"]
+    for name in compiled:
+        assert name in report["compiled"], f"{name} was not compiled"
+    return report
@@ -0,0 +1,129 @@
+"""Execution budgets: the VM, compiled code and the runner's fallback."""
+import time
+
+import pytest
+
+from compiler.budget import BudgetExceeded, ExecutionBudget
+from compiler.program_cache import ProgramCache
+from execution import runner
+from tests.differential import run_vm
+
+
+LOOPS = {
+    "while": "i = 0\nwhile True:\n    i += 1\n",
+    "function": "def f():\n    x = 0\n    while True:\n        x += 1\n    return x\nprint(f())\n",
+    "recursion": "def f(n):\n    return f(n + 1) if n >= 0 else 0\nprint(f(0))\n",
+    "swallowed": "i = 0\nwhile True:\n    try:\n        i += 1\n    except:\n        pass\n",
+    "generator": "def g():\n    while True:\n        yield 1\nfor x in g():\n    pass\n",
+}
+
+
+@pytest.fixture(autouse=True)
+def program_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(runner, "PROGRAM_CACHE", ProgramCache(str(tmp_path)))
+
+
+@pytest.mark.parametrize("profile", ["interpreter", "eager"])
+@pytest.mark.parametrize("name", sorted(LOOPS))
+def test_instruction_limit_stops_the_vm(name, profile):
+    budget = ExecutionBudget(max_instructions=50_000)
+    with pytest.raises(BudgetExceeded) as stopped:
+        run_vm(LOOPS[name], profile, budget=budget)
+    assert stopped.value.kind == "instructions"
+
+
+def test_time_limit_stops_the_vm():
+    start = time.monotonic()
+    with pytest.raises(BudgetExceeded) as stopped:
+        run_vm(LOOPS["while"], "eager", budget=ExecutionBudget(seconds=0.2))
+    assert stopped.value.kind == "time"
+    assert time.monotonic() - start < 2
+
+
+# Loops whose iterations turn slow once they are hot enough to compile.
+SLOW_LOOPS = {
+    "while": "import time\ni = 0\nwhile True:\n    i += 1\n    if i > 500:\n        time.sleep(0.01)\n",
+    "function": (
+        "import time\n"
+        "def spin(clock, n):\n"
+        "    i = 0\n"
+        "    while i < n:\n"
+        "        i += 1\n"
+        "        if i > 500:\n"
+        "            clock.sleep(0.01)\n"
+        "    return i\n"
+        "for k in range(50):\n"
+        "    spin(time, 10)\n"
+        "spin(time, 10 ** 9)\n"
+    ),
+}
+
+
+@pytest.mark.parametrize("profile, threshold", runner.BENCHMARK_PROFILES)
+@pytest.mark.parametrize("name", sorted(SLOW_LOOPS))
+def test_time_limit_stops_slow_loops(name, profile, threshold):
+    start = time.monotonic()
+    result = runner.run_with_compiler(SLOW_LOOPS[name], debug=True, profile=profile,
+                                      threshold=threshold, timeout=0.3)
+    assert time.monotonic() - start < 1
+    assert result["timeout"]["kind"] == "time"
+    if profile == "eager":
+        jit = result["report"]["jit"]
+        assert jit["osr"] or jit["compiled"], "the slow loop ran compiled"
+
+
+def test_budget_leaves_output_unchanged():
+    code = "total = 0\nfor i in range(1000):\n    total += i\nprint(total)\n"
+    _, output = run_vm(code, "eager", budget=ExecutionBudget(max_instructions=10**7))
+    assert output == "499500"
+
+
+def test_runner_reports_the_output_so_far():
+    result = runner.run_with_compiler(
+        "print('start')\n" + LOOPS["while"], max_instructions=50_000,
+    )
+    assert result["output"].startswith("start")
+    assert result["timeout"]["kind"] == "instructions"
+    assert result["error"]["type"] == "BudgetExceeded"
+
+
+def test_fallback_keeps_the_limits():
+    # The front end rejects ord(), so this runs on safe_exec.
+    code = 'while True:\n    x = ord("a")\n'
+    start = time.monotonic()
+    result = runner.run_with_compiler(code, timeout=0.3)
+    assert time.monotonic() - start < 3
+    assert result["timeout"]["kind"] == "time"
+    result = runner.run_with_compiler(code, max_instructions=1000)
+    assert result["timeout"]["kind"] == "instructions"
+
+
+def test_streamed_fallback_keeps_the_limits():
+    events = list(runner.stream_with_compiler('while True:\n    x = ord("a")\n', timeout=0.3))
+    assert events[-1]["done"] and events[-1]["timeout"]["kind"] == "time"
+
+
+def test_runtime_error_is_not_run_again():
+    result = runner.run_with_compiler("print('once')\nx = 1 // 0\n")
+    assert result["output"] == "once"
+    assert result["error"]["type"] == "ZeroDivisionError"
+
+
+def test_benchmark_shares_one_deadline():
+    start = time.monotonic()
+    results = runner.benchmark_profiles(LOOPS["while"], timeout=0.5)
+    assert time.monotonic() - start < 2
+    assert len(results) == len(runner.BENCHMARK_PROFILES)
+    assert all(result["timeout"]["kind"] == "time" and result["timeout"]["limit"] == 0.5
+               for result in results)
+
+
+@pytest.mark.parametrize("repeat", [0, runner.BENCHMARK_MAX_REPEAT + 1, True, 2.0])
+def test_benchmark_rejects_repeat(repeat):
+    with pytest.raises(ValueError):
+        runner.benchmark_profiles("print(1)\n", repeat=repeat)
+
+
+def test_benchmark_rejects_long_timeouts():
+    with pytest.raises(ValueError):
+        runner.benchmark_profiles("print(1)\n", timeout=runner.RUN_TIMEOUT_SECONDS * 2)
@@ -0,0 +1,191 @@
+"""VirtualMachine.call: builtins calling back into user code."""
+from compiler.vm import VirtualMachine
+from tests.differential import assert_same_output, run_vm
+
+
+def test_builtin_key_functions():
+    assert_same_output("""
+words = ["ccc", "aa", "B", "dddd"]
+print(min(["aa", "b"], key=len), max(words, key=len))
+print(sorted(words, key=len), sorted(words, key=str.lower))
+print(sorted(words, key=len, reverse=True))
+print(list(map(len, words)), list(map(str, [1, 2])))
+""")
+
+
+def test_user_callbacks():
+    assert_same_output("""
+def sq(v):
+    return v * v
+def odd(v):
+    return v % 2 == 1
+def add(a, b):
+    return a + b
+print(list(map(sq, [1, 2, 3])), list(map(add, [1, 2], [10, 20])))
+print(list(filter(odd, [1, 2, 3, 4, 5])), list(filter(None, [0, 1, 2, 0])))
+print(sorted([3, -5, 1], key=sq), sorted([3, -5, 1], key=lambda v: -v, reverse=True))
+print(min([3, -5, 1], key=sq), max([3, -5, 1], key=sq), max(3, -5, key=sq))
+""", compiled=("sq", "odd", "add"))
+
+
+def test_function_values():
+    assert_same_output("""
+def sq(v):
+    return v * v
+def apply(f, v):
+    return f(v)
+class P:
+    def __init__(self, n):
+        self.n = n
+g = sq
+print(apply(sq, 3), g(4), apply(lambda z: z * 3, 7))
+print([p.n for p in map(P, [1, 2])])
+""", compiled=("apply",))
+
+
+def test_callbacks_nest_and_recurse():
+    assert_same_output("""
+def tree(n):
+    if n == 0:
+        return 1
+    return sum(map(tree, [n - 1, n - 1])) + 1
+def gen(n):
+    for i in range(n):
+        yield max([i, -i - 1], key=lambda q: q * q)
+print(tree(6), list(gen(4)))
+total = 0
+for i in range(300):
+    total += sum(map(lambda v: v + i, [1, 2]))
+print(total)
+""")
+
+
+def test_exception_from_callback():
+    assert_same_output("""
+def boom(v):
+    if v == 3:
+        return [][v]
+    return v * 2
+def wrap(xs):
+    try:
+        return list(map(boom, xs))
+    except IndexError:
+        return "caught"
+print(wrap([1, 2]), wrap([1, 3]), wrap([2]))
+""")
+
+
+def test_callbacks_run_without_sub_vms(monkeypatch):
+    def spawn(self, instructions, frame):
+        raise AssertionError("callback ran on a sub-VM")
+    monkeypatch.setattr(VirtualMachine, "_spawn", spawn)
+    _, output = run_vm("""
+class P:
+    def __init__(self, n):
+        self.n = n
+def sq(v):
+    return v * v
+scale = lambda v: v * 3
+print(list(map(sq, [1, 2])), sorted([2, -3], key=sq), scale(2), P(5).n)
+""")
+    assert output == "[1, 4] [2, -3] 6 5"
+
+
+def test_call_from_outside_a_run():
+    vm, _ = run_vm("""
+def sq(v):
+    return v * v
+""")
+    assert vm.call("sq", (7,)) == 49
+    assert vm.call(len, ("abc",)) == 3
+    assert (len(vm.stack), vm._running) == (0, 0)
+
+
+def test_decorators_returning_wrappers():
+    assert_same_output("""
+def twice(f):
+    def wrapper(x):
+        return f(f(x))
+    return wrapper
+
+def memo(fn):
+    cache = {}
+    def inner(n):
+        if n not in cache:
+            cache[n] = fn(n)
+        return cache[n]
+    return inner
+
+def counted(f):
+    calls = [0]
+    def wrapper(*args):
+        calls[0] += 1
+        return f(*args)
+    return wrapper
+
+@twice
+def inc(x):
+    return x + 1
+
+@memo
+def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+
+@counted
+@twice
+def dbl(x):
+    return x * 2
+
+print(inc(5), fib(80), dbl(3), list(map(inc, [1, 2])))
+""")
+
+
+def test_decorators_returning_the_definition():
+    assert_same_output("""
+registry = []
+def register(f):
+    registry.append(f)
+    return f
+
+@register
+def hello():
+    return "hi"
+
+@register
+class A:
+    def __init__(self, v):
+        self.v = v
+
+print(hello(), A(3).v, len(registry))
+""")
+
+
+def test_class_decorator_returning_a_callable():
+    assert_same_output("""
+def single(cls):
+    inst = cls(7)
+    return lambda: inst
+
+@single
+class B:
+    def __init__(self, v):
+        self.v = v
+
+print(B().v, B() is B())
+""")
+
+
+def test_nested_function_as_value():
+    assert_same_output("""
+def outer():
+    x = 5
+    def inner(y):
+        return x + y
+    print(inner(1))
+    return inner
+
+h = outer()
+print(h(10), list(map(h, [1, 2])))
+""")
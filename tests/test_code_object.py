@@ -0,0 +1,89 @@
+"""CodeObject: programs stored with dumps() and loaded back run unchanged."""
+import pytest
+
+from compiler.code_object import CodeFormatError, assemble, dumps, loads
+from compiler.vm import VirtualMachine
+from tests.differential import compile_source, exec_output
+
+
+PROGRAMS = {
+    "functions": """
+def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+def greet(name, punct="!"):
+    return "hi " + name + punct
+print(fib(15), greet("a"), greet("b", punct="?"))
+""",
+    "classes": """
+class Animal:
+    def __init__(self, name):
+        self.name = name
+    def speak(self):
+        return self.name + " makes a sound"
+class Dog(Animal):
+    def speak(self):
+        return self.name + " barks"
+for a in [Animal("cat"), Dog("rex")]:
+    print(a.speak())
+""",
+    "closures": """
+def outer(k):
+    def inner(v):
+        return v * k
+    return inner
+scale = lambda v, k=2: v * k
+print(list(map(outer(3), [1, 2])), scale(4), sorted([3, -5, 1], key=lambda v: -v))
+""",
+    "generators": """
+def count(n):
+    i = 0
+    while i < n:
+        yield i
+        i += 1
+print(list(count(4)), sum(x * x for x in range(5)), [c for c in "ab"])
+""",
+    "exceptions": """
+def div(a, b):
+    try:
+        return a // b
+    except ZeroDivisionError:
+        return "zero"
+    finally:
+        print("done", a)
+print(div(7, 2), div(1, 0))
+""",
+}
+
+
+@pytest.mark.parametrize("name", sorted(PROGRAMS))
+def test_round_trip_runs_the_same(name):
+    code = PROGRAMS[name]
+    instructions = compile_source(code)
+    data = dumps(assemble(instructions))
+    loaded = loads(data)
+    vm = VirtualMachine(loaded.instructions(), jit_profile="interpreter")
+    loaded.install(vm)
+    output = vm.run()
+    assert output == VirtualMachine(instructions, jit_profile="interpreter").run()
+    assert output.rstrip("\n") == exec_output(code)
+    assert dumps(loads(data)) == data
+
+
+@pytest.mark.parametrize("name", ["classes", "generators", "exceptions"])
+def test_loaded_bodies_are_not_compiled_again(name):
+    # Default values are compiled at run time (see assemble); these
+    # programs have none.
+    loaded = loads(dumps(assemble(compile_source(PROGRAMS[name]))))
+    vm = VirtualMachine(loaded.instructions(), jit_profile="interpreter")
+    loaded.install(vm)
+    vm.run()
+    assert vm.code_cache.misses == 0
+
+
+def test_corrupt_data_is_refused():
+    data = dumps(assemble(compile_source(PROGRAMS["functions"])))
+    for bad in (b"", data[:4], data[:-3], data[:50], data + b"\0"):
+        with pytest.raises(CodeFormatError):
+            loads(bad)
@@ -0,0 +1,120 @@
+"""The inline exception table: try/except/finally and unwinding across calls."""
+from tests.differential import assert_same_output
+
+
+def test_finally_runs_on_break_and_continue():
+    assert_same_output("""
+log = []
+for i in range(5):
+    try:
+        if i == 3:
+            break
+        if i == 1:
+            continue
+        log.append(i)
+    finally:
+        log.append(-i)
+print(log)
+i = 0
+out = []
+while True:
+    i += 1
+    try:
+        try:
+            if i % 2 == 0:
+                continue
+            if i > 7:
+                break
+            out.append(i)
+        finally:
+            out.append("in")
+    finally:
+        out.append("out")
+print(out, i)
+""")
+
+
+def test_finally_runs_on_return():
+    assert_same_output("""
+def sign(n):
+    try:
+        if n > 0:
+            return "pos"
+        return "neg"
+    finally:
+        print("cleanup", n)
+def first():
+    for i in range(3):
+        try:
+            return i * 10
+        finally:
+            print("first finally", i)
+def find(grid, target):
+    for r in range(len(grid)):
+        for c in range(len(grid[r])):
+            try:
+                if grid[r][c] == target:
+                    return [r, c]
+            finally:
+                pass
+    return None
+print(sign(1), sign(-1), first())
+print(find([[1, 2], [3, 4]], 4), find([[1]], 9))
+""")
+
+
+def test_except_and_finally_together():
+    assert_same_output("""
+def risky(n):
+    try:
+        if n == 0:
+            int("zero")
+        return 10 // n
+    except ValueError as e:
+        print("caught", str(e)[:7])
+        return -1
+    finally:
+        print("done", n)
+for n in [2, 0, 5]:
+    print(risky(n))
+try:
+    try:
+        x = 1 // 0
+    finally:
+        print("inner finally")
+except ZeroDivisionError:
+    print("outer caught")
+""")
+
+
+def test_exceptions_unwind_through_calls_and_loops():
+    assert_same_output("""
+def inner(n):
+    total = 0
+    for i in range(n):
+        total += 10 // (3 - i)
+    return total
+def outer(n):
+    try:
+        return inner(n)
+    except ZeroDivisionError:
+        return "div"
+def scan(items):
+    seen = []
+    for item in items:
+        try:
+            try:
+                seen.append(10 // item)
+            finally:
+                seen.append("f")
+        except ZeroDivisionError:
+            seen.append("z")
+            continue
+        finally:
+            seen.append("o")
+        if item == 5:
+            break
+    return seen
+print(outer(2), outer(5))
+print(scan([1, 0, 2, 5, 9]))
+""")
@@ -0,0 +1,74 @@
+"""Slot-indexed locals of function, method and generator bodies."""
+from tests.differential import assert_same_output
+
+
+def test_locals_globals_and_parameters():
+    assert_same_output("""
+scale = 10
+def f(a, b=2, *rest, **named):
+    total = a * b + scale
+    for x in rest:
+        total += x
+    return [total, sorted(named)]
+def g():
+    global scale
+    scale = 3
+    return scale
+print(f(1), f(1, 3, 4, 5, k=1), g(), f(2))
+""")
+
+
+def test_reading_an_unassigned_local_raises():
+    assert_same_output("""
+def f(n):
+    if n > 5:
+        y = 1
+    return y
+class C:
+    def m(self, n):
+        if n:
+            z = n
+        return z
+y = "global"
+z = "global"
+for n in (9, 0):
+    try:
+        print(f(n))
+    except UnboundLocalError:
+        print("unbound")
+    try:
+        print(C().m(n))
+    except UnboundLocalError:
+        print("unbound")
+""")
+
+
+def test_generator_reading_an_unassigned_local_raises():
+    assert_same_output("""
+def g(n):
+    if n > 5:
+        y = 1
+    yield y
+def h(n):
+    total = 0
+    for i in range(n):
+        total += i
+        yield total
+    if n > 9:
+        last = total
+    yield last
+y = "global"
+last = "global"
+print(list(g(9)))
+for gen in (g(1), h(3)):
+    try:
+        print(list(gen))
+    except UnboundLocalError:
+        print("unbound")
+try:
+    print({}["k"])
+except UnboundLocalError:
+    print("wrong handler")
+except KeyError:
+    print("key")
+""")
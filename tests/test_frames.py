@@ -0,0 +1,74 @@
+"""Pooled call frames: reuse across calls, exception unwinding and generators."""
+from compiler.vm import FRAME_POOL_SIZE
+from tests.differential import assert_same_output, run_vm
+
+
+def _assert_pool_clean(vm):
+    assert 0 < len(vm._free_frames) <= FRAME_POOL_SIZE
+    for frame in vm._free_frames:
+        assert frame not in vm.frames
+        assert not frame.variables
+        assert (frame.profile, frame.return_code) == (None, None)
+
+
+def test_frames_return_to_the_pool_on_exception_unwind():
+    code = """
+def leaf(n):
+    return 10 // n
+def middle(n):
+    local = [n]
+    return leaf(n) + len(local)
+def top(n):
+    try:
+        return middle(n)
+    except ZeroDivisionError:
+        return "div"
+out = []
+for n in [2, 0, 5, 0]:
+    out.append(top(n))
+print(out)
+"""
+    assert_same_output(code)
+    vm, _ = run_vm(code)
+    _assert_pool_clean(vm)
+    # One frame per level of the deepest call chain is enough.
+    assert len(vm._free_frames) == 3
+
+
+def test_generator_frames_taken_from_the_pool():
+    assert_same_output("""
+def add(a, b):
+    return a + b
+def deep(n):
+    if n == 0:
+        return 0
+    return add(deep(n - 1), 1)
+def gen():
+    for i in range(3):
+        try:
+            yield 10 // (1 - i)
+        except ZeroDivisionError:
+            yield "z"
+print(deep(5), [add(i, i) for i in range(3)])
+print(list(gen()))
+""")
+
+
+def test_calls_between_generator_resumes():
+    code = """
+def double(v):
+    return v * 2
+def counter(limit):
+    total = 0
+    for i in range(limit):
+        total += double(i)
+        yield total
+g = counter(4)
+h = counter(3)
+print(next(g), next(h))
+print(double(10), [double(k) for k in range(3)])
+print(next(g), next(h), list(g), list(h))
+"""
+    assert_same_output(code)
+    vm, _ = run_vm(code)
+    _assert_pool_clean(vm)
@@ -0,0 +1,86 @@
+"""Generators on suspended sub-VMs: finally blocks, close() and exceptions."""
+from tests.differential import assert_same_output
+
+
+def test_close_runs_finally_blocks():
+    assert_same_output("""
+def ticker(name):
+    try:
+        n = 0
+        while True:
+            yield name + str(n)
+            n += 1
+    finally:
+        print("closed", name)
+t = ticker("a")
+print(next(t), next(t))
+t.close()
+t.close()
+print(list(t))
+u = ticker("b")
+u.close()
+print(list(u))
+def guarded():
+    try:
+        yield 1
+        yield 2
+    except GeneratorExit:
+        print("exit seen")
+        raise
+g = guarded()
+print(next(g))
+g.close()
+""")
+
+
+def test_finally_inside_generators():
+    assert_same_output("""
+def numbers(limit):
+    try:
+        for i in range(limit):
+            try:
+                yield i
+            finally:
+                print("after", i)
+    finally:
+        print("done")
+for v in numbers(3):
+    print("got", v)
+print(list(numbers(2)))
+def early():
+    try:
+        yield "x"
+        return
+        yield "never"
+    finally:
+        print("early finally")
+print(list(early()))
+""")
+
+
+def test_exceptions_inside_generators():
+    assert_same_output("""
+def careful(items):
+    for item in items:
+        try:
+            yield 10 // item
+        except ZeroDivisionError:
+            yield "div"
+        finally:
+            print("f", item)
+print(list(careful([1, 0, 5])))
+def failing():
+    try:
+        yield 1
+        x = 1 // 0
+        yield 2
+    finally:
+        print("cleanup")
+g = failing()
+print(next(g))
+try:
+    next(g)
+except ZeroDivisionError:
+    print("raised")
+print(list(g))
+""")
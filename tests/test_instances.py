@@ -0,0 +1,104 @@
+"""User class instances: shapes, attributes and the dunders the VM runs."""
+from tests.differential import assert_same_output
+
+
+def test_eq_and_ne_run_user_methods():
+    assert_same_output("""
+class P:
+    def __init__(self, x):
+        self.x = x
+    def __eq__(self, other):
+        return self.x == other.x
+class Q:
+    def __init__(self, x):
+        self.x = x
+    def __eq__(self, other):
+        return self.x == other.x
+    def __ne__(self, other):
+        return "ne"
+class Plain:
+    pass
+a = Plain()
+print(P(1) == P(1), P(1) == P(2), P(1) != P(1), P(1) != P(2))
+print(Q(1) != Q(1), Q(1) == Q(2), a == a, a == Plain(), a != Plain())
+if P(3) == P(3):
+    print("same")
+""")
+
+
+def test_len_runs_user_method():
+    assert_same_output("""
+class Bag:
+    def __init__(self, items):
+        self.items = items
+    def __len__(self):
+        return len(self.items)
+b = Bag([1, 2, 3])
+print(len(b), len(Bag([])), len([1, 2]), len("abc"))
+""")
+
+
+def test_compiled_code_runs_eq_and_len():
+    assert_same_output("""
+class P:
+    def __init__(self, x):
+        self.x = x
+    def __eq__(self, other):
+        return self.x % 3 == other.x % 3
+    def __len__(self):
+        return self.x
+def matches(a, b):
+    return a == b
+def differs(a, b):
+    return a != b
+def size(p):
+    return len(p)
+same = 0
+total = 0
+for i in range(100):
+    if matches(P(i), P(0)):
+        same += 1
+    if differs(P(i), P(1)):
+        total += size(P(i))
+print(same, total)
+""", compiled=("matches", "differs", "size"))
+
+
+def test_bound_method_aliases():
+    assert_same_output("""
+class C:
+    def __init__(self, n):
+        self.n = n
+    def add(self, k):
+        self.n += k
+        return self.n
+def run(c):
+    f = c.add
+    t = 0
+    for i in range(20):
+        t = f(i)
+    return t
+c = C(1)
+g = c.add
+h = getattr(c, "add")
+print(run(c), g(5), h(1), c.n)
+""", compiled=("run",))
+
+
+def test_user_context_managers():
+    assert_same_output("""
+class Ctx:
+    def __init__(self, name):
+        self.name = name
+    def __enter__(self):
+        print("enter", self.name)
+        return self
+    def __exit__(self, kind, value, tb):
+        print("exit", self.name, kind is None)
+        return self.name == "b"
+with Ctx("a") as c:
+    print("body", c.name)
+with Ctx("b"):
+    x = 1 // 0
+print("after")
+""")
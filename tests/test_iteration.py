@@ -0,0 +1,95 @@
+"""Lazy iteration: GET_ITER/FOR_ITER over exhausted, infinite and empty iterators."""
+from tests.differential import assert_same_output
+
+
+def test_exhausted_iterators_stay_exhausted():
+    assert_same_output("""
+it = iter([1, 2, 3])
+first = []
+for x in it:
+    first.append(x)
+second = []
+for x in it:
+    second.append(x)
+print(first, second, next(it, "end"))
+def gen(n):
+    for i in range(n):
+        yield i * i
+g = gen(4)
+print(list(g), list(g), [v for v in g])
+it = iter("abcdef")
+for ch in it:
+    if ch == "c":
+        break
+rest = [ch for ch in it]
+print(rest)
+""")
+
+
+def test_infinite_iterators_stop_at_break():
+    assert_same_output("""
+import itertools
+total = 0
+for n in itertools.count(1):
+    if n > 100:
+        break
+    total += n
+print(total)
+def naturals():
+    n = 0
+    while True:
+        yield n
+        n += 1
+squares = []
+for v in naturals():
+    if v * v > 50:
+        break
+    squares.append(v * v)
+print(squares)
+evens = []
+for v in naturals():
+    if v % 2:
+        continue
+    evens.append(v)
+    if len(evens) == 5:
+        break
+print(evens)
+""")
+
+
+def test_break_out_of_nested_loops():
+    assert_same_output("""
+def pairs(limit):
+    found = []
+    for a in range(limit):
+        for b in range(limit):
+            if a + b == 4:
+                found.append([a, b])
+                break
+            if b > a:
+                break
+    return found
+print(pairs(6))
+count = 0
+for i in range(3):
+    for j in range(100000):
+        count += 1
+        if j == 2:
+            break
+print(count)
+""")
+
+
+def test_empty_iterables():
+    assert_same_output("""
+for x in []:
+    print("never")
+for x in range(0):
+    print("never")
+def nothing():
+    return
+    yield 1
+for x in nothing():
+    print("never")
+print([x for x in range(5, 0)], [x for x in []])
+""")
@@ -0,0 +1,112 @@
+"""The type-specialised JIT tier: guards, deoptimisation and escapes."""
+import time
+
+import pytest
+
+from compiler.semantic import SemanticError
+from tests.differential import assert_same_output, compile_source, run_vm
+
+
+def test_str_of_instances_runs_str_method():
+    report = assert_same_output("""
+class P:
+    def __init__(self, n):
+        self.n = n
+    def __str__(self):
+        return "P" + str(self.n)
+def show(p):
+    return str(p)
+s = ""
+for i in range(200):
+    s = show(P(i))
+print(s)
+t = ""
+for i in range(200):
+    t = str(P(i)) + str(i)
+print(t)
+""", compiled=("show", "P.__str__"))
+    assert report["osr"]
+
+
+def test_guards_deoptimise_on_new_types():
+    assert_same_output("""
+def add(a, b):
+    return a + b
+total = 0
+for i in range(200):
+    total = add(total, i)
+print(total, add("a", "b"), add(1.5, 2), add([1], [2]))
+""", compiled=("add",))
+
+
+MUTUAL_RECURSION = """
+def is_even(n):
+    if n == 0:
+        return True
+    return is_odd(n - 1)
+def is_odd(n):
+    if n == 0:
+        return False
+    return is_even(n - 1)
+total = 0
+for i in range(300):
+    if is_even(i % 50):
+        total += i
+print(total, is_odd(7), is_even(7))
+"""
+
+
+def test_mutually_recursive_functions_call_each_other_compiled():
+    report = assert_same_output(MUTUAL_RECURSION, compiled=("is_even", "is_odd"))
+    assert not report["deoptimized"]
+    vm, _ = run_vm(MUTUAL_RECURSION, "eager")
+    # The interpreter only sees the call that compiled each of them and
+    # the one in the last line; the loop's recursive calls all go from
+    # compiled code to compiled code through the shared namespace.
+    for name in ("is_even", "is_odd"):
+        assert vm.jit.namespace[name] is vm.jit.try_get_compiled(name)
+        assert vm.report()["calls"][name] == 2
+
+
+def test_module_level_calls_need_a_definition_first():
+    with pytest.raises(SemanticError):
+        compile_source("f()\ndef f():\n    return 1\n")
+
+
+def _wait_for_worker(jit):
+    deadline = time.monotonic() + 10
+    while jit._worker_running:
+        assert time.monotonic() < deadline, "background compile did not finish"
+        time.sleep(0.001)
+
+
+def test_background_compile_is_installed_at_the_next_call():
+    vm, output = run_vm("def sq(v):\n    return v * v\nprint(sq(3))\n", "jit", jit_threshold=1)
+    jit = vm.jit
+    assert output == "9"
+    # The first call queued the job and ran in the interpreter; nothing
+    # has called into the JIT since, so the result is not installed yet.
+    assert "sq" in jit._pending and "sq" not in jit.stats["compiled"]
+    assert jit.stats["queue_depth"] == jit.stats["max_queue_depth"] == 1
+    _wait_for_worker(jit)
+    compiled = jit.try_get_compiled("sq")
+    assert callable(compiled) and jit.namespace["sq"] is compiled
+    assert not jit._pending and jit.stats["queue_depth"] == 0
+    assert jit.stats["compiled"] == ["sq"]
+    assert vm.call("sq", (7,)) == 49
+
+
+def test_background_compile_of_a_redefined_function_is_dropped():
+    vm, output = run_vm("""
+def sq(v):
+    return v * v
+print(sq(3))
+def sq(v):
+    return v + 1
+""", "jit", jit_threshold=1)
+    jit = vm.jit
+    assert output == "9" and not jit._pending
+    _wait_for_worker(jit)
+    assert jit.try_get_compiled("sq") is None
+    assert jit.stats["compiled"] == []
+    assert vm.call("sq", (7,)) == 8
@@ -0,0 +1,56 @@
+"""Compiled methods, constructors, lambdas and keyword calls."""
+from tests.differential import assert_same_output
+
+
+def test_method_defaults_and_keywords():
+    assert_same_output("""
+class Counter:
+    step = 2
+    def __init__(self, n=0):
+        self.n = n
+    def add(self, by=1, times=1):
+        self.n = self.n + by * times
+        return self.n
+
+c = Counter()
+for i in range(200):
+    c.add()
+    c.add(2, times=2)
+print(c.n, Counter(5).add(by=1), Counter(n=1).add(times=3))
+""", compiled=("Counter.__init__", "Counter.add"))
+
+
+def test_overridden_methods_keep_their_defaults():
+    assert_same_output("""
+class Shape:
+    def __init__(self, name, scale=2, tags=None):
+        self.name = name
+        self.scale = scale
+        self.tags = tags
+    def area(self, base=3, extra=0):
+        return base * self.scale + extra
+    def label(self, prefix="shape", sep=": "):
+        return prefix + sep + self.name
+
+class Square(Shape):
+    def area(self, base=4):
+        return base * base * self.scale
+
+total = 0
+for i in range(300):
+    s = Square("sq", i % 3 + 1)
+    total += s.area() + s.area(i % 5) + Shape("x").area(extra=i)
+print(total, Shape("t").label(), Shape("t", 5).label("p", sep="-"), Shape("u").tags)
+""", compiled=("Shape.__init__", "Shape.area", "Square.area", "Shape.label"))
+
+
+def test_keyword_calls_into_compiled_code():
+    assert_same_output("""
+scale = lambda v, k=3: v * k
+def weigh(v, k=1, bias=0):
+    return v * k + bias
+total = 0
+for i in range(100):
+    total += scale(i) + scale(i, k=2) + weigh(i, bias=i) + weigh(i, 2, 3)
+print(total, scale(4, k=5), weigh(k=2, v=3))
+""", compiled=("<lambda>", "weigh"))
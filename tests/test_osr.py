@@ -0,0 +1,43 @@
+"""On-stack replacement of hot module-level loops."""
+from compiler.program_cache import ProgramCache
+from execution import runner
+from tests.differential import assert_same_output, exec_output
+
+TYPE_PROGRAM = """
+q = None
+r = None
+for i in range(2000):
+    q = type(i)
+print(q, q == int)
+def f(n):
+    return type(n)
+for i in range(300):
+    r = f(i)
+print(r, type("s"), type([]))
+"""
+
+
+def test_type_in_loops_and_functions():
+    report = assert_same_output(TYPE_PROGRAM, compiled=("f",))
+    assert report["osr"]
+
+
+def test_type_through_the_runner(tmp_path, monkeypatch):
+    monkeypatch.setattr(runner, "PROGRAM_CACHE", ProgramCache(str(tmp_path)))
+    result = runner.run_with_compiler(TYPE_PROGRAM, True, "eager")
+    assert "error" not in result and result["report"]["jit"]["osr"]
+    assert result["output"].rstrip("\n") == exec_output(TYPE_PROGRAM)
+
+
+def test_loop_state_survives_osr():
+    assert_same_output("""
+total = 0
+names = []
+last = 0
+for i in range(500):
+    total += i * 2
+    if i % 100 == 0:
+        names.append(str(i))
+    last = i
+print(total, names, last)
+""")
@@ -0,0 +1,126 @@
+"""The peephole pass: COMPARE_JUMP, INC_VAR/INC_FAST and jump threading."""
+import pytest
+
+from compiler.peephole import PeepholeOptimizer
+from tests.differential import assert_same_output, compile_source, exec_output, run_vm
+
+
+COMPARES = """
+def classify(a, b):
+    out = []
+    if a == b:
+        out.append("eq")
+    if a != b:
+        out.append("ne")
+    if a is b:
+        out.append("is")
+    if a is not b:
+        out.append("isnot")
+    return out
+def order(a, b):
+    if a < b:
+        return "lt"
+    if a >= b:
+        return "ge"
+    return "nan"
+print(classify("ab", "ab"), classify(None, None), classify(1, 1.0), classify([1], [1]))
+print(order("apple", "banana"), order(2.5, 2), order((1, 2), (1, 3)), order([2], [1, 5]))
+nan = float("nan")
+print(order(nan, 1), classify(nan, nan))
+words = ["x", "yy", "zzz"]
+hits = 0
+for w in ["yy", "q", "zzz", ""]:
+    if w in words:
+        hits += 1
+    if w not in "xyz":
+        hits += 10
+print(hits)
+try:
+    if "a" < 1:
+        print("never")
+except TypeError:
+    print("type error")
+"""
+
+LOOP_COMPARES = """
+s = ""
+while s != "aaaa":
+    s = s + "a"
+print(s)
+x = 0.0
+while x < 1.0:
+    x += 0.25
+print(str(x))
+n = None
+steps = 0
+while n is None:
+    steps += 1
+    if steps > 3:
+        n = steps
+print(n)
+"""
+
+INCREMENTS = """
+total = 0.5
+for i in range(10):
+    total += 1
+    total = total - 0.25
+print(str(total))
+flag = True
+flag += 1
+print(flag)
+count = 0
+def bump():
+    global count
+    count += 2
+    count = count - 1
+for i in range(5):
+    bump()
+print(count)
+def local_inc(n):
+    acc = 0
+    k = 1.5
+    for i in range(n):
+        acc += 3
+        k = k + 1
+    return [acc, k]
+print(local_inc(4))
+s = "a"
+try:
+    s += 1
+except TypeError:
+    print("str + int")
+print(s)
+"""
+
+
+def _ran(code, *opcodes):
+    """Check the interpreter ran ``opcodes``, i.e. the peephole pass fused them."""
+    vm, _ = run_vm(code)
+    executed = vm.report()["opcodes"]
+    for opcode in opcodes:
+        assert opcode in executed, f"{opcode} was not executed"
+
+
+def test_compare_jumps_on_other_operands():
+    assert_same_output(COMPARES)
+    _ran(COMPARES, "COMPARE_JUMP")
+    optimizer = PeepholeOptimizer()
+    optimizer.optimize(compile_source(COMPARES))
+    assert optimizer.threaded, "the if/else chains in the loop thread their jumps"
+
+
+def test_loop_conditions_on_other_operands():
+    assert_same_output(LOOP_COMPARES)
+    _ran(LOOP_COMPARES, "COMPARE_JUMP", "INC_VAR")
+
+
+def test_increments_on_floats_bools_strs_and_globals():
+    assert_same_output(INCREMENTS)
+    _ran(INCREMENTS, "INC_VAR", "INC_FAST")
+
+
+@pytest.mark.parametrize("code", [COMPARES, LOOP_COMPARES, INCREMENTS])
+def test_same_output_without_the_pass(code):
+    _, output = run_vm(code, peephole=False)
+    assert output == exec_output(code)
@@ -0,0 +1,102 @@
+"""The on-disk ProgramCache: keys, eviction, damaged entries and sharing."""
+import os
+import threading
+
+from compiler import program_cache
+from compiler.program_cache import ProgramCache
+from execution import runner
+
+SOURCES = [f"def f(n):\n    return n * {i}\nprint(f({i}))\n" for i in range(6)]
+
+
+def _program(monkeypatch, source):
+    # Compiled with the cache disabled, so no test cache counts a miss.
+    monkeypatch.setattr(runner, "PROGRAM_CACHE", ProgramCache(max_bytes=0))
+    return runner.compile_program(source)
+
+
+def _stored(cache, monkeypatch, source):
+    program = _program(monkeypatch, source)
+    assert cache.store(program)
+    return cache._path(program.key)
+
+
+def test_runs_reuse_the_stored_program(tmp_path, monkeypatch):
+    cache = ProgramCache(str(tmp_path))
+    monkeypatch.setattr(runner, "PROGRAM_CACHE", cache)
+    first = runner.run_with_compiler(SOURCES[1], False, "eager")
+    second = runner.run_with_compiler(SOURCES[1], False, "eager")
+    assert first["output"] == second["output"] == "1"
+    assert (cache.hits, cache.misses, cache.stats()["entries"]) == (1, 1, 1)
+
+
+def test_format_bump_invalidates_entries(tmp_path, monkeypatch):
+    cache = ProgramCache(str(tmp_path))
+    _stored(cache, monkeypatch, SOURCES[0])
+    assert cache.load(SOURCES[0]) is not None
+    monkeypatch.setattr(program_cache, "CACHE_FORMAT", program_cache.CACHE_FORMAT + 1)
+    assert cache.load(SOURCES[0]) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    cache = ProgramCache(str(tmp_path))
+    paths = [_stored(cache, monkeypatch, source) for source in SOURCES[:3]]
+    # Give the entries distinct ages, oldest first, then use the oldest.
+    for second, path in enumerate(paths, 1):
+        os.utime(path, ns=(0, second * 10**9))
+    assert cache.load(SOURCES[0]) is not None
+    cache.max_bytes = sum(os.path.getsize(path) for path in paths)
+    _stored(cache, monkeypatch, SOURCES[3])
+    assert [os.path.exists(path) for path in paths] == [True, False, True]
+    assert cache.evictions == 1
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_damaged_entries_are_removed(tmp_path, monkeypatch):
+    cache = ProgramCache(str(tmp_path))
+    truncated = _stored(cache, monkeypatch, SOURCES[0])
+    with open(truncated, "rb") as f:
+        data = f.read()
+    with open(truncated, "wb") as f:
+        f.write(data[: len(data) // 2])
+    garbage = _stored(cache, monkeypatch, SOURCES[1])
+    with open(garbage, "wb") as f:
+        f.write(b"not a pickle")
+    assert cache.load(SOURCES[0]) is None and cache.load(SOURCES[1]) is None
+    assert not os.path.exists(truncated) and not os.path.exists(garbage)
+    assert cache.misses == 2
+    # The next run compiles the program again and stores it afresh.
+    monkeypatch.setattr(runner, "PROGRAM_CACHE", cache)
+    assert runner.run_with_compiler(SOURCES[0], False, "eager")["output"] == "0"
+    assert cache.load(SOURCES[0]) is not None
+
+
+def test_concurrent_writers_share_the_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYFLUX_CACHE_DIR", str(tmp_path))
+    programs = [_program(monkeypatch, source) for source in SOURCES]
+    errors = []
+
+    def writer(offset):
+        # Each writer is its own cache, as in another process.
+        cache = ProgramCache()
+        try:
+            for i in range(30):
+                cache.store(programs[(offset + i) % len(programs)])
+                cache.load(SOURCES[(offset * i) % len(SOURCES)])
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    cache = ProgramCache()
+    assert cache.directory == str(tmp_path)
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        cache.key(source) + ProgramCache.SUFFIX for source in SOURCES)
+    for source in SOURCES:
+        assert cache.load(source).instructions
+    assert cache.misses == 0
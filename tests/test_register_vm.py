@@ -0,0 +1,127 @@
+"""RegisterVM against VirtualMachine and CPython on the same programs."""
+import pytest
+
+from compiler.lexer import tokenize
+from compiler.parser import Parser
+from compiler.semantic import SemanticAnalyzer
+from compiler.optimizer import Optimizer
+from compiler.register_vm import RegisterVM, UnsupportedIR, generate_ir
+from tests.differential import exec_output, run_vm
+
+
+PROGRAMS = {
+    "arith": """
+total = 0
+i = 0
+while i < 1000:
+    total = total + i * i % 7
+    i += 1
+print(total, i)
+""",
+    "forrange": """
+s = 0
+for i in range(10):
+    if i == 3:
+        continue
+    if i == 8:
+        break
+    s += i
+    i = 100
+print(s, i)
+for j in range(10, 0, -3):
+    print(j)
+for k in range(0):
+    print("never")
+""",
+    "fib": """
+def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+print(fib(15))
+""",
+    "globals": """
+scale = 3
+def f(x):
+    y = x * scale
+    return y
+acc = 0
+for i in range(5):
+    acc = acc + f(i)
+print(acc)
+""",
+    "lists": """
+xs = [1, 2, 3]
+print(xs[1], len(xs), max(xs), min(4, 2), sum(xs))
+print(xs)
+""",
+    "floats": """
+a = 7 / 2
+b = 10 / 4
+print(a, b, -a, not a, 2 ** 10, 7 // 2, -7 % 3)
+print(a > 3 and b < 3, a < 3 or 0)
+x = True
+print(x, None)
+def g():
+    return
+print(g())
+""",
+    "nested_while": """
+count = 0
+n = 2
+while n < 200:
+    d = 2
+    prime = True
+    while d * d <= n:
+        if n % d == 0:
+            prime = False
+            break
+        d += 1
+    if prime:
+        count += 1
+    n += 1
+print("primes", count)
+""",
+    "short_circuit": """
+xs = []
+ys = [1, 2, 7, 3]
+i = 0
+while i < len(ys) and ys[i] < 5:
+    i += 1
+if len(xs) > 0 and xs[0] > 1:
+    print("big")
+def safe_div(a, b):
+    return b != 0 and a // b
+print(i, 0 or 5, 3 and 0, safe_div(7, 2), safe_div(7, 0), 1 or ys[9])
+""",
+}
+
+UNSUPPORTED = {
+    "comprehension": """
+xs = [x for x in range(3)]
+print(xs)
+""",
+    "temp name": """
+t1 = 5
+print(t1)
+""",
+}
+
+
+def front_end(code):
+    ast = Parser(tokenize(code)).parse()
+    SemanticAnalyzer().visit(ast)
+    return Optimizer().visit(ast)
+
+
+@pytest.mark.parametrize("name", sorted(PROGRAMS))
+def test_register_vm_matches(name):
+    code = PROGRAMS[name]
+    output = RegisterVM(generate_ir(front_end(code).statements)).run()
+    assert output.rstrip("\n") == run_vm(code)[1] == exec_output(code)
+
+
+@pytest.mark.parametrize("name", sorted(UNSUPPORTED))
+def test_unsupported_code_is_refused(name):
+    with pytest.raises(UnsupportedIR):
+        RegisterVM(generate_ir(front_end(UNSUPPORTED[name]).statements))
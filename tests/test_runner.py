@@ -0,0 +1,76 @@
+"""execution.runner: running programs on the VM and falling back to Python."""
+import pytest
+
+from compiler.program_cache import ProgramCache
+import compiler.vm as vm_module
+from compiler.bytecode import OPCODES
+from compiler.jit import JIT_PROFILES
+from execution import runner
+from tests.differential import exec_output
+from tests.test_short_circuit import IDIOMS
+
+
+@pytest.fixture(autouse=True)
+def program_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(runner, "PROGRAM_CACHE", ProgramCache(str(tmp_path)))
+
+
+# Programs the VM once failed on, which /run then reported as errors.
+VM_REGRESSIONS = {
+    "with": ('import io\nwith io.StringIO("abc") as f:\n    print(f.read())\n', "abc"),
+    "bound method": (
+        "class C:\n    def f(self):\n        return 7\nc = C()\ng = c.f\nprint(g())\n", "7",
+    ),
+    "len": ("class B:\n    def __len__(self):\n        return 4\nprint(len(B()))\n", "4"),
+}
+
+
+@pytest.mark.parametrize("name", sorted(VM_REGRESSIONS))
+def test_vm_runs_it(name):
+    code, expected = VM_REGRESSIONS[name]
+    # Only a run that finished on the VM has a report.
+    result = runner.run_with_compiler(code, debug=True)
+    assert "error" not in result
+    assert result["output"] == expected
+    assert "report" in result
+
+
+@pytest.fixture
+def with_unsupported(monkeypatch):
+    """Make the VM fail on ``with`` statements, as on a construct it lacks."""
+    def unsupported(vm, instr, ip):
+        raise AttributeError("not supported by the VM")
+    handlers = list(vm_module._HANDLERS)
+    handlers[OPCODES.index("EXEC_WITH")] = unsupported
+    monkeypatch.setattr(vm_module, "_HANDLERS", tuple(handlers))
+
+
+WITH_PROGRAM = 'import io\nwith io.StringIO("abc") as f:\n    print(f.read())\n'
+
+
+def test_vm_failure_before_output_falls_back(with_unsupported):
+    assert runner.run_with_compiler(WITH_PROGRAM) == {"output": "abc\n"}
+
+
+def test_streamed_vm_failure_before_output_falls_back(with_unsupported):
+    events = list(runner.stream_with_compiler(WITH_PROGRAM))
+    assert len(events) == 1
+    assert events[0]["done"] and events[0]["output"] == "abc\n"
+    assert "error" not in events[0]
+
+
+def test_vm_failure_after_output_is_reported(with_unsupported):
+    result = runner.run_with_compiler("print('once')\n" + WITH_PROGRAM)
+    assert result["output"] == "once"
+    assert result["error"]["type"] == "AttributeError"
+
+
+@pytest.mark.parametrize("profile", JIT_PROFILES)
+def test_short_circuit_idioms_after_output(profile):
+    # Printing first rules out the fallback, so the VM must get them right.
+    result = runner.run_with_compiler(IDIOMS, debug=True, profile=profile)
+    assert "error" not in result and "report" in result
+    assert result["output"] == exec_output(IDIOMS)
+    events = list(runner.stream_with_compiler(IDIOMS))
+    assert "".join(event.get("output", "") for event in events[:-1]) == exec_output(IDIOMS)
+    assert "error" not in events[-1]
@@ -0,0 +1,49 @@
+"""``and``/``or`` only evaluate their right operand when it decides the result."""
+from tests.differential import assert_same_output
+
+IDIOMS = """
+print("start")
+xs = []
+if xs and xs[0] > 1:
+    print("big")
+i = 0
+ys = [1, 2, 7, 3]
+while i < len(ys) and ys[i] < 5:
+    i += 1
+d = {}
+x = None
+print(i, 1 or d["k"], x is not None and x.bit_length(), 0 and d["k"], [] or "empty")
+"""
+
+
+def test_right_operand_is_skipped():
+    assert_same_output(IDIOMS)
+
+
+def test_compiled_code_short_circuits():
+    assert_same_output("""
+def first_big(items):
+    return len(items) > 0 and items[0] > 1
+def pick(d, k):
+    return k in d and d[k] or "missing"
+def scan(ys):
+    i = 0
+    while i < len(ys) and ys[i] < 5:
+        i += 1
+    return i
+for n in range(3):
+    print(first_big([]), first_big([n]), pick({"a": n}, "a"), pick({}, "a"), scan([n, 9]))
+""", compiled=("first_big", "pick", "scan"))
+
+
+def test_operands_run_once_in_order():
+    assert_same_output("""
+log = []
+def note(v):
+    log.append(v)
+    return v
+r = note(0) or note("") or note(3) and note(4) or note(5)
+s = note(1) and note(0) and note(9)
+print(r, s, log)
+print(0 or None, 0 and None, "" or [] or 0, 2 and 3 and 4)
+""")
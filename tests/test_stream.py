@@ -0,0 +1,98 @@
+"""Streaming output: OutputSink chunks, stream_with_compiler and /run/stream."""
+import json
+import threading
+import time
+
+import pytest
+
+from compiler.output_sink import OutputCancelled, OutputSink
+from compiler.program_cache import ProgramCache
+from compiler.vm import VirtualMachine
+from execution import runner
+from tests.differential import compile_source
+
+PRINTS = "for i in range(300):\n    print('line', i)\n"
+EXPECTED = "\n".join(f"line {i}" for i in range(300))
+
+
+@pytest.fixture(autouse=True)
+def program_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(runner, "PROGRAM_CACHE", ProgramCache(str(tmp_path)))
+
+
+def _split(events):
+    *chunks, final = events
+    assert all(set(event) == {"output"} for event in chunks)
+    assert final["done"] and "runtime_seconds" in final
+    return "".join(event["output"] for event in chunks), final
+
+
+def test_sink_chunks_join_to_the_output():
+    chunks = []
+    sink = OutputSink(chunks.append, buffer_size=64)
+    vm = VirtualMachine(compile_source(PRINTS), output=sink)
+    vm.run()
+    sink.flush()
+    assert len(chunks) > 1 and all(len(chunk) < 100 for chunk in chunks)
+    assert "".join(chunks) == EXPECTED and sink.getvalue() == ""
+
+
+def test_cancelling_sink_stops_the_program():
+    def cancel(chunk):
+        raise OutputCancelled()
+    code = "while True:\n    try:\n        print('x')\n    except:\n        pass\n"
+    vm = VirtualMachine(compile_source(code), output=OutputSink(cancel, buffer_size=1))
+    with pytest.raises(OutputCancelled):
+        vm.run()
+
+
+def test_stream_events_carry_the_output_in_chunks():
+    events = list(runner.stream_with_compiler(PRINTS, chunk_size=256))
+    output, final = _split(events)
+    assert len(events) > 2
+    assert output == EXPECTED
+    assert "error" not in final
+
+
+def test_stream_reports_the_error_after_partial_output():
+    code = "print('before')\nprint(1 // 0)\nprint('after')\n"
+    output, final = _split(list(runner.stream_with_compiler(code)))
+    assert output == "before"
+    assert final["error"]["type"] == "ZeroDivisionError"
+
+
+@pytest.mark.parametrize("limits, kind", [
+    ({"max_instructions": 5000}, "instructions"),
+    ({"timeout": 0.2}, "time"),
+])
+def test_stream_reports_the_timeout_after_partial_output(limits, kind):
+    code = "i = 0\nwhile True:\n    print(i)\n    i += 1\n"
+    output, final = _split(list(runner.stream_with_compiler(code, chunk_size=16, **limits)))
+    lines = output.split("\n")
+    assert len(lines) > 1 and lines == [str(i) for i in range(len(lines))]
+    assert final["timeout"]["kind"] == kind
+
+
+def test_closing_the_stream_cancels_the_run():
+    before = set(threading.enumerate())
+    stream = runner.stream_with_compiler("while True:\n    print('x')\n", chunk_size=16)
+    assert next(stream)["output"].startswith("x")
+    workers = set(threading.enumerate()) - before
+    assert workers
+    # The client went away; the run has no limits that would end it.
+    stream.close()
+    deadline = time.monotonic() + 5
+    while any(worker.is_alive() for worker in workers):
+        assert time.monotonic() < deadline, "the run went on after the stream closed"
+        time.sleep(0.01)
+
+
+def test_run_stream_sends_ndjson():
+    pytest.importorskip("flask")
+    from app import app
+    response = app.test_client().post("/run/stream", json={"code": PRINTS})
+    assert response.mimetype == "application/x-ndjson"
+    body = response.get_data(as_text=True)
+    assert body.endswith("\n")
+    output, final = _split([json.loads(line) for line in body.splitlines()])
+    assert output == EXPECTED and "error" not in final